@@ -0,0 +1,219 @@
+"""
+Priority-aware admission control for telemetry ingest.
+
+Every reading is classified at the edge of ingest as ``critical`` (a safety
+signal: coliform, motor overheating, leaks, faulty valves, tank at an extreme)
+or ``routine``. Critical readings are always processed immediately. Routine
+readings are admitted while their sender's token bucket has tokens and the
+number of readings being processed stays under MAX_INFLIGHT; otherwise they
+are coalesced - only the latest reading per node is kept - and a background
+drainer feeds them through once there is room again. When the coalescing
+table is full the reading is shed and the gateway told to retry later.
+
+Buckets are keyed by sender: the gateway name a gateway token was issued
+for, the node of a device key, or the client address when auth is off.
+
+Admission itself is a few dict operations under one lock, so the ingest
+handler calls it on the event loop before the reading takes a worker thread.
+A critical reading is not queued here; the handler runs it on a pool of
+CRITICAL_WORKERS threads reserved for critical readings, so it never waits
+for a thread behind routine ones. Routine work in progress is bounded by
+MAX_INFLIGHT.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+import logs
+import metrics
+
+GATEWAY_RATE = 20.0      # sustained routine readings per second per sender
+GATEWAY_BURST = 100.0    # bucket size, absorbs reconnect bursts
+MAX_INFLIGHT = 16        # routine readings processed concurrently
+CRITICAL_WORKERS = 4     # threads reserved for critical readings
+MAX_COALESCED = 5000     # nodes with a deferred reading
+DRAIN_INTERVAL = 0.1     # seconds between drainer passes
+DRAIN_BATCH = 50         # deferred readings processed per pass
+
+CRITICAL = "critical"
+ROUTINE = "routine"
+
+ADMITTED = "admitted"
+COALESCED = "coalesced"
+SHED = "shed"
+
+# node type -> metric -> predicate that marks the reading safety-critical
+CRITICAL_SIGNALS: Dict[str, Dict[str, Callable[[float], bool]]] = {
+    "pump": {
+        "motorTemperature": lambda v: v > 75,
+        "flowDropIndicator": lambda v: v == 1,
+        "leakProbabilityScore": lambda v: v > 70,
+    },
+    "tank": {
+        "tankLevel": lambda v: v < 15 or v > 95,
+        "tankOverflow": lambda v: v == 1,
+    },
+    "valve": {
+        "faultyValveDetection": lambda v: v == 1,
+        "valveLeakage": lambda v: v > 5,
+    },
+    "tap": {
+        "coliformPresent": lambda v: v == 1,
+    },
+}
+
+log = logs.get_logger("admission")
+
+ADMISSION_DECISIONS = metrics.counter(
+    "gjj_ingest_admission_total", "Ingest admission decisions", ("priority", "decision")
+)
+INGEST_SHED = metrics.counter(
+    "gjj_ingest_shed_total", "Routine readings not processed on arrival", ("reason",)
+)
+
+
+def classify(node_type: str, readings: Mapping[str, float]) -> str:
+    for name, is_critical in CRITICAL_SIGNALS.get(node_type, {}).items():
+        value = readings.get(name)
+        if value is not None and is_critical(value):
+            return CRITICAL
+    return ROUTINE
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        process: Callable[[Any], None],
+        rate: float = GATEWAY_RATE,
+        burst: float = GATEWAY_BURST,
+        max_inflight: int = MAX_INFLIGHT,
+        max_coalesced: int = MAX_COALESCED,
+    ):
+        self.process = process
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.max_coalesced = max_coalesced
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._deferred: "OrderedDict[str, Any]" = OrderedDict()   # node id -> latest payload
+        self._inflight = 0
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        metrics.QUEUE_DEPTH.labels("ingest_coalesced").set_function(lambda: len(self._deferred))
+        metrics.QUEUE_DEPTH.labels("ingest_inflight").set_function(lambda: self._inflight)
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-drainer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    # ---------- admission ----------
+
+    def admit(self, gateway: str, node_id: str, priority: str, payload: Any) -> str:
+        """
+        Decide what happens to a reading. ADMITTED readings must be processed
+        by the caller and followed by release(); COALESCED ones are processed
+        later by the drainer; SHED ones are dropped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(gateway)
+            if bucket is None:
+                bucket = self._buckets[gateway] = TokenBucket(self.rate, self.burst, now)
+            has_token = bucket.take(now)
+            if priority == CRITICAL or (has_token and self._inflight < self.max_inflight):
+                # a newer reading supersedes anything deferred for the node
+                if self._deferred.pop(node_id, None) is not None:
+                    INGEST_SHED.labels("superseded").inc()
+                self._inflight += 1
+                decision = ADMITTED
+            elif node_id in self._deferred or len(self._deferred) < self.max_coalesced:
+                if self._deferred.pop(node_id, None) is not None:
+                    INGEST_SHED.labels("superseded").inc()
+                self._deferred[node_id] = payload
+                decision = COALESCED
+            else:
+                decision = SHED
+            key = (priority, decision)
+            self._counts[key] = self._counts.get(key, 0) + 1
+        ADMISSION_DECISIONS.labels(priority, decision).inc()
+        if decision == COALESCED:
+            INGEST_SHED.labels("rate_limited" if not has_token else "overloaded").inc()
+        elif decision == SHED:
+            INGEST_SHED.labels("dropped").inc()
+            log.warning("shedding reading from %s for %s", gateway, node_id,
+                        extra={"rate_key": ("shed", gateway)})
+        return decision
+
+    def release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+            return {
+                "inflight": self._inflight,
+                "deferred": len(self._deferred),
+                "gateways": len(self._buckets),
+                "limits": {
+                    "rate_per_gateway": self.rate,
+                    "burst": self.burst,
+                    "max_inflight": self.max_inflight,
+                    "max_coalesced": self.max_coalesced,
+                },
+                "decisions": {
+                    f"{priority}.{decision}": n for (priority, decision), n in sorted(counts.items())
+                },
+            }
+
+    # ---------- drainer ----------
+
+    def _take_batch(self):
+        batch = []
+        with self._lock:
+            while self._deferred and self._inflight < self.max_inflight and len(batch) < DRAIN_BATCH:
+                _, payload = self._deferred.popitem(last=False)
+                self._inflight += 1
+                batch.append(payload)
+        return batch
+
+    def _run(self):
+        while not self._stop.wait(DRAIN_INTERVAL):
+            for payload in self._take_batch():
+                try:
+                    self.process(payload)
+                except Exception:
+                    log.exception("deferred reading failed")
+                finally:
+                    self.release()
@@ -0,0 +1,309 @@
+"""
+Tiered alert retention for the Jalsense backend.
+
+Hot tier: alerts live in memory keyed by id, in creation order, so listing is
+a walk over live alerts only and ack is a dict lookup.
+
+Cold tier: a background compactor moves alerts out of memory once they are
+acknowledged and older than RETENTION_DAYS into gzip-compressed JSON-lines
+segments, one partition per UTC day of creation. Open alerts stay hot however
+old they are - they still need an operator, and the KPIs count them as open:
+
+    <archive dir>/alerts-<YYYYMMDD>-<first id>-<last id>.jsonl.gz
+
+The segment name is the index entry - the in-memory day -> segments index is
+rebuilt from a directory listing on startup, with no sidecar to keep in sync.
+Each compaction pass writes at most one new segment per day and then merges
+days that have accumulated several segments into one. Archive queries bisect
+the sorted day list, so they only open segments for the requested time range.
+All file I/O happens on the compactor thread or the querying request, never
+while the hot-tier lock is held.
+"""
+
+import bisect
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import logs
+import metrics
+
+RETENTION_DAYS = float(os.environ.get("GJJ_ALERT_RETENTION_DAYS", "7"))
+ARCHIVE_DIR = os.environ.get(
+    "GJJ_ALERT_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "alerts")
+)
+COMPACT_INTERVAL = 3600.0   # seconds between background passes
+MAX_ARCHIVE_RESULTS = 1000
+
+_SEGMENT_RE = re.compile(r"^alerts-(\d{8})-(\d+)-(\d+)\.jsonl\.gz$")
+
+log = logs.get_logger("alert_store")
+
+ALERTS_ARCHIVED = metrics.counter("gjj_alerts_archived_total", "Alerts moved to the archive tier")
+COMPACTION_SECONDS = metrics.histogram(
+    "gjj_alert_compaction_seconds", "Duration of a retention/compaction pass",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+class Segment:
+    __slots__ = ("day", "first_id", "last_id", "path")
+
+    def __init__(self, day: str, first_id: int, last_id: int, path: str):
+        self.day = day
+        self.first_id = first_id
+        self.last_id = last_id
+        self.path = path
+
+
+def _day_key(ts: datetime) -> str:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.strftime("%Y%m%d")
+
+
+class AlertArchive:
+    """Day-partitioned gzip segments plus the in-memory index over them."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self._days: List[str] = []                    # sorted partition keys
+        self._segments: Dict[str, List[Segment]] = {}
+        self._lock = threading.Lock()
+        self.max_id = 0
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_RE.match(name)
+            if match is None:
+                continue  # leftover .tmp files from an interrupted write
+            day, first, last = match.group(1), int(match.group(2)), int(match.group(3))
+            self._add_locked(Segment(day, first, last, os.path.join(self.directory, name)))
+            self.max_id = max(self.max_id, last)
+
+    def _add_locked(self, segment: Segment):
+        segments = self._segments.get(segment.day)
+        if segments is None:
+            bisect.insort(self._days, segment.day)
+            segments = self._segments[segment.day] = []
+        segments.append(segment)
+        segments.sort(key=lambda s: s.first_id)
+
+    def _write(self, day: str, lines: List[str], first_id: int, last_id: int) -> Segment:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"alerts-{day}-{first_id}-{last_id}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line)
+                f.write("\n")
+        os.replace(tmp, path)
+        return Segment(day, first_id, last_id, path)
+
+    def append(self, day: str, records: List[Tuple[int, str]]):
+        """Write one segment of (id, json) records belonging to one day."""
+        segment = self._write(day, [line for _, line in records], records[0][0], records[-1][0])
+        with self._lock:
+            self._add_locked(segment)
+            self.max_id = max(self.max_id, segment.last_id)
+
+    def merge(self) -> int:
+        """Fold every day with several segments into a single one. Returns days merged."""
+        with self._lock:
+            targets = [list(segs) for segs in self._segments.values() if len(segs) > 1]
+        for segments in targets:
+            lines = []
+            for segment in segments:
+                with gzip.open(segment.path, "rt", encoding="utf-8") as f:
+                    lines.extend(line.rstrip("\n") for line in f)
+            lines.sort(key=lambda line: json.loads(line)["id"])
+            merged = self._write(segments[0].day, lines,
+                                 min(s.first_id for s in segments), max(s.last_id for s in segments))
+            with self._lock:
+                remaining = [s for s in self._segments[merged.day] if s not in segments]
+                self._segments[merged.day] = remaining
+                self._add_locked(merged)
+            for segment in segments:
+                if segment.path != merged.path:
+                    os.remove(segment.path)
+        return len(targets)
+
+    def _day_segments(self, day: str) -> List[Segment]:
+        with self._lock:
+            return list(self._segments.get(day, ()))
+
+    def query(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        predicate: Optional[Callable[[Dict], bool]] = None,
+        limit: int = MAX_ARCHIVE_RESULTS,
+    ) -> Iterator[Dict]:
+        """Archived alerts created in [start, end), oldest first."""
+        with self._lock:
+            lo = bisect.bisect_left(self._days, _day_key(start)) if start else 0
+            hi = bisect.bisect_right(self._days, _day_key(end)) if end else len(self._days)
+            days = self._days[lo:hi]
+        emitted = 0
+        for day in days:
+            seen = set()
+            for attempt in range(2):
+                try:
+                    for segment in self._day_segments(day):
+                        with gzip.open(segment.path, "rt", encoding="utf-8") as f:
+                            for line in f:
+                                record = json.loads(line)
+                                if record["id"] in seen:
+                                    continue
+                                seen.add(record["id"])
+                                created = datetime.fromisoformat(record["created_at"])
+                                if start and created < start:
+                                    continue
+                                if end and created >= end:
+                                    continue
+                                if predicate and not predicate(record):
+                                    continue
+                                yield record
+                                emitted += 1
+                                if emitted >= limit:
+                                    return
+                    break
+                except FileNotFoundError:
+                    # a merge replaced the day's segments under us; re-read the index once
+                    if attempt:
+                        raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            segments = [s for segs in self._segments.values() for s in segs]
+        return {
+            "days": len(self._days),
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(s.path) for s in segments if os.path.exists(s.path)),
+            "oldest_day": self._days[0] if self._days else None,
+            "newest_day": self._days[-1] if self._days else None,
+        }
+
+
+class AlertStore:
+    def __init__(
+        self,
+        archive: AlertArchive,
+        retention_days: float = RETENTION_DAYS,
+    ):
+        self.archive = archive
+        self.retention = timedelta(days=retention_days)
+        self._hot: Dict[int, Any] = {}   # id -> alert, insertion (= id) order
+        self._next_id = archive.max_id + 1
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_pass: Optional[Dict] = None
+
+    # ---------- hot tier ----------
+
+    def next_id(self) -> int:
+        with self._lock:
+            aid = self._next_id
+            self._next_id += 1
+            return aid
+
+    def add(self, alert):
+        with self._lock:
+            self._hot[alert.id] = alert
+
+    def get(self, alert_id: int):
+        return self._hot.get(alert_id)
+
+    def acknowledge(self, alert) -> bool:
+        """Mark an alert acknowledged; False if it already was. Under the lock compaction serializes under."""
+        with self._lock:
+            if alert.acknowledged:
+                return False
+            alert.acknowledged = True
+            return True
+
+    def values(self, only_open: bool = False) -> List[Any]:
+        with self._lock:
+            alerts = list(self._hot.values())
+        if only_open:
+            alerts = [a for a in alerts if not a.acknowledged]
+        return alerts
+
+    def __len__(self):
+        return len(self._hot)
+
+    # ---------- compaction ----------
+
+    def _expired_locked(self, now: datetime) -> List[Tuple[Any, str]]:
+        """(alert, json) for acknowledged alerts past retention; open alerts never expire."""
+        cutoff = now - self.retention
+        expired = []
+        for alert in self._hot.values():     # creation order
+            if alert.created_at > cutoff:
+                break
+            if alert.acknowledged:
+                expired.append((alert, alert.json()))
+        return expired
+
+    def compact(self, now: Optional[datetime] = None) -> Dict:
+        """Archive expired hot alerts, then merge small segments. Safe to call anytime."""
+        now = now or datetime.now(timezone.utc)
+        with self._compact_lock, COMPACTION_SECONDS.time():
+            with self._lock:
+                expired = self._expired_locked(now)
+            by_day: Dict[str, List[Tuple[int, str]]] = {}
+            for alert, line in expired:
+                by_day.setdefault(_day_key(alert.created_at), []).append((alert.id, line))
+            for day, records in sorted(by_day.items()):
+                self.archive.append(day, records)
+            with self._lock:
+                for alert, _ in expired:
+                    self._hot.pop(alert.id, None)
+            if expired:
+                ALERTS_ARCHIVED.inc(len(expired))
+            merged = self.archive.merge()
+        self.last_pass = {
+            "at": now.isoformat(),
+            "archived": len(expired),
+            "days_merged": merged,
+            "hot": len(self._hot),
+        }
+        if expired:
+            log.info("archived %d alerts, merged %d day partitions", len(expired), merged)
+        return self.last_pass
+
+    def start(self, interval: float = COMPACT_INTERVAL):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="alert-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.compact()
+            except Exception:
+                log.exception("alert compaction failed")
+
+    def stats(self) -> Dict:
+        return {
+            "hot": len(self._hot),
+            "retention_days": self.retention.total_seconds() / 86400,
+            "archive": self.archive.stats(),
+            "last_pass": self.last_pass,
+        }
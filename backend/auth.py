@@ -0,0 +1,197 @@
+"""
+Stateless token auth for the Jalsense backend.
+
+Tokens are ``base64url(claims).base64url(HMAC-SHA256(secret, claims))`` - no
+session table. Verified tokens and their claims are kept in an LRU cache, so
+the per-request cost on a hit is a dict lookup, an expiry comparison and an
+O(1) revocation-set check; the HMAC is only computed on a miss.
+
+Devices authenticate with per-device ingest keys of the form
+``<nodeId>.<base64url(HMAC(secret, "device:<nodeId>"))>`` (header
+``X-Device-Key``), which are derived from the secret and need no storage.
+Gateways that forward for many nodes (the MQTT listener, simulators) use a
+long-lived token with role ``gateway``, issued per gateway name - the name is
+the token's subject, which ingest admission control rate-limits by. Metrics
+scrapers get a long-lived token with role ``monitor``, which only reads
+``/metrics``.
+
+    python auth.py device-key pump-1            # print an ingest key for a node
+    python auth.py gateway-token mqtt-pune-01   # print a token for a named gateway
+    python auth.py monitor-token prometheus     # print a token for a metrics scraper
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+AUTH_ENABLED = os.environ.get("GJJ_AUTH_DISABLED") != "1"
+ACCESS_TOKEN_TTL = 8 * 3600            # seconds
+GATEWAY_TOKEN_TTL = 365 * 24 * 3600
+CACHE_SIZE = 10000
+
+ROLES = ("guest", "technician", "researcher", "admin", "gateway", "monitor")
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password: str, salt: Optional[bytes] = None) -> str:
+    salt = salt or secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, 100_000)
+    return f"{_b64encode(salt)}${_b64encode(digest)}"
+
+
+def check_password(password: str, stored: str) -> bool:
+    salt, _ = stored.split("$", 1)
+    return hmac.compare_digest(hash_password(password, _b64decode(salt)), stored)
+
+
+class AuthError(Exception):
+    pass
+
+
+class TokenAuthority:
+    def __init__(self, secret: bytes, cache_size: int = CACHE_SIZE):
+        self._secret = secret
+        self._cache_size = cache_size
+        # token -> claims (claims carry "exp"); most recently used last
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        # revoked jti -> exp, pruned once entries could no longer verify anyway
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    # ---------- issuing ----------
+
+    def _sign(self, body: str) -> str:
+        return _b64encode(hmac.new(self._secret, body.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, subject: str, role: str, ttl: float = ACCESS_TOKEN_TTL, **extra) -> str:
+        now = int(time.time())
+        claims = {"sub": subject, "role": role, "iat": now, "exp": now + int(ttl),
+                  "jti": uuid.uuid4().hex, **extra}
+        body = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        return f"{body}.{self._sign(body)}"
+
+    def device_key(self, node_id: str) -> str:
+        mac = hmac.new(self._secret, f"device:{node_id}".encode(), hashlib.sha256).digest()
+        return f"{node_id}.{_b64encode(mac)}"
+
+    # ---------- verification ----------
+
+    def verify(self, token: str) -> Dict:
+        """Return the token's claims or raise AuthError."""
+        now = time.time()
+        with self._lock:
+            claims = self._cache.get(token)
+            if claims is not None:
+                if claims["exp"] <= now:
+                    del self._cache[token]
+                    raise AuthError("Token expired")
+                if claims["jti"] in self._revoked:
+                    raise AuthError("Token revoked")
+                self._cache.move_to_end(token)
+                return claims
+
+        body, _, signature = token.partition(".")
+        if not signature or not hmac.compare_digest(self._sign(body), signature):
+            raise AuthError("Invalid token")
+        try:
+            claims = json.loads(_b64decode(body))
+        except ValueError:
+            raise AuthError("Invalid token")
+        if claims.get("exp", 0) <= now:
+            raise AuthError("Token expired")
+
+        with self._lock:
+            if claims.get("jti") in self._revoked:
+                raise AuthError("Token revoked")
+            self._cache[token] = claims
+            if len(self._cache) > self._cache_size:
+                self._evict_locked(now)
+        return claims
+
+    def _evict_locked(self, now: float):
+        # drop expired entries first, then fall back to least recently used
+        expired = [t for t, c in self._cache.items() if c["exp"] <= now]
+        for token in expired:
+            del self._cache[token]
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def verify_device_key(self, key: str) -> str:
+        """Return the node id the key was issued for, or raise AuthError."""
+        node_id, _, _ = key.rpartition(".")
+        if not node_id or not hmac.compare_digest(self.device_key(node_id), key):
+            raise AuthError("Invalid device key")
+        return node_id
+
+    def revoke(self, claims: Dict):
+        with self._lock:
+            self._revoked[claims["jti"]] = claims["exp"]
+            if len(self._revoked) > self._cache_size:
+                now = time.time()
+                self._revoked = {j: exp for j, exp in self._revoked.items() if exp > now}
+
+
+# Without GJJ_AUTH_SECRET a random per-process secret is used, so every token
+# and device key becomes invalid on restart.
+SECRET_IS_EPHEMERAL = not os.environ.get("GJJ_AUTH_SECRET")
+AUTHORITY = TokenAuthority(
+    secrets.token_bytes(32) if SECRET_IS_EPHEMERAL else os.environ["GJJ_AUTH_SECRET"].encode()
+)
+
+# Demo accounts, one per dashboard role, sharing the password in
+# GJJ_DEMO_PASSWORD. They exist only when that is set - there is no default
+# password - so a deployment never ships a known admin login. Real
+# deployments should load users from their directory.
+_DEMO_PASSWORD = os.environ.get("GJJ_DEMO_PASSWORD")
+USERS: Dict[str, Dict] = {
+    email: {"id": uid, "email": email, "name": name, "role": role,
+            "password_hash": hash_password(_DEMO_PASSWORD)}
+    for uid, email, name, role in (
+        ("u-admin", "admin@jalsense.local", "Administrator", "admin"),
+        ("u-tech", "technician@jalsense.local", "Field Technician", "technician"),
+        ("u-research", "researcher@jalsense.local", "Researcher", "researcher"),
+        ("u-guest", "guest@jalsense.local", "Guest", "guest"),
+    )
+} if _DEMO_PASSWORD else {}
+
+
+def public_user(user: Dict) -> Dict:
+    return {k: v for k, v in user.items() if k != "password_hash"}
+
+
+def authenticate(email: str, password: str) -> Dict:
+    user = USERS.get(email.lower())
+    if user is None or not check_password(password, user["password_hash"]):
+        raise AuthError("Invalid email or password")
+    return user
+
+
+if __name__ == "__main__":
+    if SECRET_IS_EPHEMERAL:
+        print("Set GJJ_AUTH_SECRET to the backend's secret first")
+        sys.exit(1)
+    if len(sys.argv) == 3 and sys.argv[1] == "device-key":
+        print(AUTHORITY.device_key(sys.argv[2]))
+    elif len(sys.argv) == 3 and sys.argv[1] == "gateway-token":
+        print(AUTHORITY.issue(sys.argv[2], "gateway", ttl=GATEWAY_TOKEN_TTL))
+    elif len(sys.argv) == 3 and sys.argv[1] == "monitor-token":
+        print(AUTHORITY.issue(sys.argv[2], "monitor", ttl=GATEWAY_TOKEN_TTL))
+    else:
+        print("usage: python auth.py device-key <nodeId> | gateway-token <gatewayName> | monitor-token <scraperName>")
+        sys.exit(1)
@@ -0,0 +1,259 @@
+"""
+Rule backtesting over the columnar telemetry archive.
+
+The rules replayed are rules.RULES, the table ``apply_rules`` in main.py
+evaluates live, so a backtest replays exactly the production rules (see
+rules.py for the format). A candidate is that table with rules replaced,
+added or dropped and thresholds changed.
+
+A backtest loads each node's history from the sealed segments as whole
+columns, carries every metric forward the way ``node.latest_metrics`` does,
+and evaluates each rule as one numpy expression over the node's readings -
+no per-reading Python. Counts follow ``create_alert``, which raises one
+alert per matching reading; "episodes" counts runs of consecutive matches.
+
+Server-derived inputs are not reproduced: the tap compliance figure is the
+device-reported value as archived, and forecast/maintenance alerts are not
+part of RULES.
+
+    python backtest.py --set pump.motor_overheat.motorTemperature=72 --days 30
+"""
+
+import argparse
+import copy
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import columnar
+from rules import NODE_TYPES, OPS, RULES, validate_rules  # noqa: F401  (re-exported)
+
+# ---------- rule sets ----------
+
+
+def candidate_rules(
+    overrides: Optional[Dict[str, Optional[Dict]]] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+) -> Dict[str, Dict]:
+    """
+    RULES with whole rules replaced or added (``None`` drops a rule) and
+    thresholds changed by ``"<rule>.<metric>": value`` - every clause of that
+    rule on that metric gets the new value. Raises ValueError for a malformed
+    override before any threshold is applied to it.
+    """
+    rules = copy.deepcopy(RULES)
+    for rule_id, spec in (overrides or {}).items():
+        if spec is None:
+            rules.pop(rule_id, None)
+        else:
+            rules[rule_id] = spec
+    for rule_id, spec in rules.items():
+        if isinstance(spec, dict) and spec.get("unless") not in (None, *rules):
+            spec.pop("unless")      # the suppressing rule was dropped
+    validate_rules(rules)
+    for key, value in (thresholds or {}).items():
+        rule_id, _, metric = key.rpartition(".")
+        spec = rules.get(rule_id)
+        clauses = spec.get("any", spec.get("all", [])) if spec else []
+        hits = [c for c in clauses if c[0] == metric]
+        if not hits:
+            raise ValueError(f"{key}: no clause on {metric!r} in rule {rule_id!r}")
+        for clause in hits:
+            clause[2] = value
+    validate_rules(rules)
+    return rules
+
+
+def rule_metrics(*rule_sets: Dict[str, Dict]) -> List[str]:
+    names = {c[0] for rules in rule_sets for spec in rules.values() for c in spec.get("any", spec.get("all", []))}
+    return sorted(names)
+
+
+# ---------- evaluation ----------
+
+
+def _forward_fill(column: np.ndarray) -> np.ndarray:
+    """Carry the last reported value forward, as node.latest_metrics does."""
+    present = ~np.isnan(column)
+    if present.all() or not present.any():
+        return column
+    idx = np.where(present, np.arange(len(column)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    filled = column[idx]
+    filled[: np.argmax(present)] = np.nan    # before the first report
+    return filled
+
+
+def _load_node(parts: List[columnar.SegmentPart], names: Iterable[str]) -> Tuple[int, Dict[str, np.ndarray]]:
+    rows = sum(len(p.ts) for p in parts)
+    columns = {}
+    for name in names:
+        pieces = [np.asarray(p.columns[name], dtype=np.float64) if name in p.columns
+                  else np.full(len(p.ts), np.nan) for p in parts]
+        columns[name] = _forward_fill(np.concatenate(pieces)) if any(name in p.columns for p in parts) \
+            else np.full(rows, np.nan)
+    return rows, columns
+
+
+def _clause_mask(columns: Dict[str, np.ndarray], clause, rows: int) -> np.ndarray:
+    column = columns.get(clause[0])
+    if column is None:
+        column = np.full(rows, np.nan)
+    if len(clause) == 4:
+        column = np.where(np.isnan(column), clause[3], column)
+    with np.errstate(invalid="ignore"):
+        return OPS[clause[1]](column, clause[2])
+
+
+def _rule_masks(rules: Dict[str, Dict], node_type: str, columns: Dict[str, np.ndarray], rows: int,
+                cache: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    raw = {}
+    for rule_id, spec in rules.items():
+        if spec["type"] != node_type:
+            continue
+        key = json.dumps([spec.get("any"), spec.get("all")])
+        mask = cache.get(key)
+        if mask is None:
+            masks = [_clause_mask(columns, c, rows) for c in spec.get("any", spec.get("all"))]
+            mask = np.logical_or.reduce(masks) if "any" in spec else np.logical_and.reduce(masks)
+            cache[key] = mask
+        raw[rule_id] = mask
+    return {rule_id: mask & ~raw[rules[rule_id]["unless"]] if rules[rule_id].get("unless") in raw else mask
+            for rule_id, mask in raw.items()}
+
+
+def _episodes(mask: np.ndarray) -> int:
+    if not len(mask):
+        return 0
+    return int(mask[0]) + int(np.count_nonzero(mask[1:] & ~mask[:-1]))
+
+
+def _summary(rules: Dict[str, Dict], counts: Dict[str, List]) -> Dict:
+    per_rule = {}
+    for rule_id in rules:
+        alerts, episodes, nodes = counts.get(rule_id, (0, 0, set()))
+        per_rule[rule_id] = {"alerts": alerts, "episodes": episodes, "nodes": sorted(nodes)}
+    return {"total_alerts": sum(r["alerts"] for r in per_rule.values()), "rules": per_rule}
+
+
+def run(
+    candidate: Dict[str, Dict],
+    reader: Optional[columnar.ColumnarReader] = None,
+    node_ids: Optional[Iterable[str]] = None,
+    scheme_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    baseline: Optional[Dict[str, Dict]] = None,
+) -> Dict:
+    """Evaluate ``baseline`` (default RULES) and ``candidate`` over archived history and diff them."""
+    reader = reader or columnar.ColumnarReader()
+    baseline = baseline if baseline is not None else RULES
+    started = time.perf_counter()
+    names = rule_metrics(baseline, candidate)
+
+    by_node: Dict[str, List[columnar.SegmentPart]] = {}
+    for part in reader.scan(names, node_ids=node_ids, scheme_id=scheme_id, start=start, end=end):
+        by_node.setdefault(part.meta.node_id, []).append(part)
+
+    base_counts: Dict[str, List] = {}
+    cand_counts: Dict[str, List] = {}
+    changed: Dict[str, List] = {}      # rule -> [added readings, removed readings, nodes +, nodes -]
+    readings = 0
+    for node_id, parts in by_node.items():
+        node_type = parts[0].meta.node_type
+        rows, columns = _load_node(parts, names)
+        readings += rows
+        cache: Dict[str, np.ndarray] = {}
+        base = _rule_masks(baseline, node_type, columns, rows, cache)
+        cand = _rule_masks(candidate, node_type, columns, rows, cache)
+        for masks, counts in ((base, base_counts), (cand, cand_counts)):
+            for rule_id, mask in masks.items():
+                hits = int(np.count_nonzero(mask))
+                entry = counts.setdefault(rule_id, [0, 0, set()])
+                entry[0] += hits
+                entry[1] += _episodes(mask)
+                if hits:
+                    entry[2].add(node_id)
+        empty = np.zeros(rows, dtype=bool)
+        for rule_id in set(base) | set(cand):
+            b, c = base.get(rule_id, empty), cand.get(rule_id, empty)
+            added, removed = int(np.count_nonzero(c & ~b)), int(np.count_nonzero(b & ~c))
+            if added or removed:
+                entry = changed.setdefault(rule_id, [0, 0, set(), set()])
+                entry[0] += added
+                entry[1] += removed
+                if c.any() and not b.any():
+                    entry[2].add(node_id)
+                if b.any() and not c.any():
+                    entry[3].add(node_id)
+
+    current = _summary(baseline, base_counts)
+    proposed = _summary(candidate, cand_counts)
+    diff = {}
+    for rule_id in sorted(set(baseline) | set(candidate)):
+        before = current["rules"].get(rule_id, {}).get("alerts", 0)
+        after = proposed["rules"].get(rule_id, {}).get("alerts", 0)
+        added, removed, nodes_added, nodes_removed = changed.get(rule_id, (0, 0, set(), set()))
+        if rule_id in baseline and rule_id in candidate and baseline[rule_id] == candidate[rule_id] \
+                and not (added or removed):
+            continue
+        diff[rule_id] = {
+            "status": "added" if rule_id not in baseline else "removed" if rule_id not in candidate else "changed",
+            "alerts_before": before,
+            "alerts_after": after,
+            "alerts_delta": after - before,
+            "new_readings": added,
+            "cleared_readings": removed,
+            "nodes_added": sorted(nodes_added),
+            "nodes_removed": sorted(nodes_removed),
+        }
+    return {
+        "range": {
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "scheme_id": scheme_id,
+        },
+        "nodes_scanned": len(by_node),
+        "readings_scanned": readings,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "current": current,
+        "candidate": proposed,
+        "diff": {"total_alerts_delta": proposed["total_alerts"] - current["total_alerts"], "rules": diff},
+    }
+
+
+def _threshold(text: str) -> Tuple[str, float]:
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected <rule>.<metric>=<value>")
+    return key, float(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest a candidate rule set against archived telemetry.")
+    parser.add_argument("--set", dest="thresholds", action="append", type=_threshold, default=[],
+                        metavar="RULE.METRIC=VALUE", help="change a threshold (repeatable)")
+    parser.add_argument("--rules", help="JSON file of rule overrides (null drops a rule)")
+    parser.add_argument("--scheme", help="only nodes of this scheme")
+    parser.add_argument("--node", action="append", help="only this node (repeatable)")
+    parser.add_argument("--days", type=float, default=30.0, help="history to evaluate (default 30)")
+    parser.add_argument("--root", default=columnar.ROOT, help="telemetry archive directory")
+    args = parser.parse_args()
+
+    overrides = None
+    if args.rules:
+        with open(args.rules, encoding="utf-8") as f:
+            overrides = json.load(f)
+    try:
+        rules = candidate_rules(overrides, dict(args.thresholds))
+    except ValueError as e:
+        print(f"invalid rules: {e}", file=sys.stderr)
+        sys.exit(2)
+    now = datetime.now(timezone.utc)
+    result = run(rules, columnar.ColumnarReader(args.root), node_ids=args.node, scheme_id=args.scheme,
+                 start=now - timedelta(days=args.days), end=now)
+    print(json.dumps(result, indent=2))
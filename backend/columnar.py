@@ -0,0 +1,537 @@
+"""
+Columnar telemetry archive for the Jalsense backend.
+
+Ingested readings are buffered per node and sealed periodically (every
+SEAL_INTERVAL seconds, or once a node has SEAL_ROWS buffered readings) into
+immutable segment directories:
+
+    <root>/<nodeId>/seg-<first ms>-<last ms>-<rows>-<id>/
+        meta.json         node, type, scheme, row count, time range,
+                          per-column dtype and min/max
+        ts.npy            int64 epoch milliseconds, sorted
+        <metric>.npy      one typed column per metric (NaN where absent)
+    <root>/<nodeId>/manifest.jsonl
+
+Column dtypes are chosen per segment: int8 for complete small-integer columns
+(flags, counts), float32 when every value survives the round trip, float64
+otherwise. Columns are opened with ``np.load(mmap_mode="r")`` so a scan maps
+the file instead of reading it into the Python heap, and time ranges are cut
+with ``searchsorted`` views - no copies. The per-segment min/max in meta.json
+lets readers skip whole segments by time or value before touching any column.
+
+Each node has a manifest: an append-only log of {"add": meta} and
+{"remove": [names]} lines. Readers load it once and re-read it only when it
+changes, so listing a node's segments never walks its directory. Sealing
+every few minutes leaves many small segments, so once an hour ``compact``
+merges each finished UTC day of a node into a single segment. The replaced
+directories are deleted COMPACT_GRACE seconds later, which lets scans
+already in flight finish; the manifest is then rewritten without the
+removals. A writer that crashed mid-seal or mid-compaction recovers on the
+node's next use: removed directories are deleted, and segments that never
+reached the manifest are added to it.
+
+    reader = ColumnarReader()
+    for part in reader.scan(["motorTemperature"], scheme_id="Scheme-001", start=t0, end=t1):
+        part.ts, part.columns["motorTemperature"]      # numpy views
+"""
+
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import logs
+import metrics
+
+ROOT = os.environ.get(
+    "GJJ_TELEMETRY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "telemetry")
+)
+SEAL_INTERVAL = 300.0   # seconds
+SEAL_ROWS = 4096        # per node; sealed early once reached
+EXPORT_CHUNK_ROWS = 8192
+COMPACT_INTERVAL = 3600.0   # seconds between compaction passes
+COMPACT_GRACE = 60.0        # replaced segments stay on disk this long for scans in flight
+MANIFEST = "manifest.jsonl"
+DAY_MS = 86_400_000
+
+# metric names become file names; anything else is not archived
+_METRIC_NAME = re.compile(r"^[A-Za-z0-9_]{1,64}$")
+
+log = logs.get_logger("columnar")
+
+ROWS_SEALED = metrics.counter("gjj_columnar_rows_sealed_total", "Readings sealed into columnar segments")
+SEAL_SECONDS = metrics.histogram(
+    "gjj_columnar_seal_seconds", "Time to seal buffered readings into segments",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+SEGMENTS_COMPACTED = metrics.counter(
+    "gjj_columnar_segments_compacted_total", "Sealed segments merged into day segments"
+)
+COMPACT_SECONDS = metrics.histogram(
+    "gjj_columnar_compact_seconds", "Time for one compaction pass over the archive",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0),
+)
+
+
+def _to_ms(ts: datetime) -> int:
+    return int(ts.timestamp() * 1000)
+
+
+def _narrow(column: np.ndarray) -> np.ndarray:
+    """Smallest dtype that stores the column exactly."""
+    finite = column[~np.isnan(column)]
+    if finite.size == column.size and finite.size and np.all(finite == np.round(finite)) \
+            and finite.min() >= -128 and finite.max() <= 127:
+        return column.astype(np.int8)
+    as32 = column.astype(np.float32)
+    if np.array_equal(as32.astype(np.float64), column, equal_nan=True):
+        return as32
+    return column
+
+
+def _read_manifest(node_dir: str) -> Optional[Tuple[Dict[str, Dict], set]]:
+    """(live segment metas by name, names compacted away), or None if there is no manifest."""
+    try:
+        f = open(os.path.join(node_dir, MANIFEST), encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    live: Dict[str, Dict] = {}
+    removed = set()
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break      # torn last line of an interrupted append
+            for name in entry.get("remove", ()):
+                live.pop(name, None)
+                removed.add(name)
+            if "add" in entry:
+                live[entry["add"]["name"]] = entry["add"]
+    return live, removed
+
+
+def _scan_dirs(node_dir: str, skip: Iterable[str] = ()) -> Dict[str, Dict]:
+    """meta.json of every segment directory not in ``skip`` (recovery, manifest-less trees)."""
+    skip = set(skip)
+    found = {}
+    for name in os.listdir(node_dir):
+        if not name.startswith("seg-") or name.endswith(".tmp") or name in skip:
+            continue
+        try:
+            with open(os.path.join(node_dir, name, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            continue
+        meta["name"] = name
+        found[name] = meta
+    return found
+
+
+def _buffer_columns(buf: "_NodeBuffer") -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    ts = np.asarray(buf.ts, dtype=np.int64)
+    order = np.argsort(ts, kind="stable")   # out-of-order arrivals
+    columns = {}
+    for name in buf.names:
+        column = np.fromiter((row.get(name, np.nan) for row in buf.rows), dtype=np.float64, count=len(buf.rows))
+        columns[name] = _narrow(column[order])
+    return ts[order], columns
+
+
+class _NodeBuffer:
+    __slots__ = ("node_type", "scheme_id", "ts", "rows", "names")
+
+    def __init__(self, node_type: str, scheme_id: str):
+        self.node_type = node_type
+        self.scheme_id = scheme_id
+        self.ts: List[int] = []
+        self.rows: List[Dict[str, float]] = []
+        self.names: Dict[str, None] = {}   # insertion-ordered set of metric names
+
+
+class SegmentMeta:
+    __slots__ = ("path", "node_id", "node_type", "scheme_id", "rows", "first_ms", "last_ms", "columns")
+
+    def __init__(self, path: str, meta: Dict):
+        self.path = path
+        self.node_id = meta["node_id"]
+        self.node_type = meta["node_type"]
+        self.scheme_id = meta["scheme_id"]
+        self.rows = meta["rows"]
+        self.first_ms = meta["first_ms"]
+        self.last_ms = meta["last_ms"]
+        self.columns: Dict[str, Dict] = meta["columns"]   # name -> {dtype, min, max}
+
+    def may_match(self, metric: str, low: Optional[float], high: Optional[float]) -> bool:
+        """False when the segment's min/max proves no row has metric in [low, high]."""
+        stats = self.columns.get(metric)
+        if stats is None or stats["min"] is None:
+            return False
+        return (low is None or stats["max"] >= low) and (high is None or stats["min"] <= high)
+
+
+class ColumnarWriter:
+    def __init__(self, root: str = ROOT, seal_rows: int = SEAL_ROWS):
+        self.root = root
+        self.seal_rows = seal_rows
+        self._buffers: Dict[str, _NodeBuffer] = {}
+        self._lock = threading.Lock()
+        self._seal_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._buffered = 0
+        self._sealing: set = set()     # node ids with a size-triggered seal thread pending
+        self._manifests: Dict[str, Dict[str, Dict]] = {}        # node id -> live segment metas
+        self._garbage: List[Tuple[float, str, List[str]]] = []  # (replaced at, node id, segment dirs)
+        metrics.QUEUE_DEPTH.labels("columnar_buffered").set_function(lambda: self._buffered)
+
+    def append(self, node_id: str, node_type: str, scheme_id: str, ts: datetime, values: Dict[str, float]):
+        """O(1) on the ingest path; the columnar work happens when sealing."""
+        with self._lock:
+            buf = self._buffers.get(node_id)
+            if buf is None:
+                buf = self._buffers[node_id] = _NodeBuffer(node_type, scheme_id)
+            buf.ts.append(_to_ms(ts))
+            buf.rows.append(values)
+            for name in values:
+                if name not in buf.names and _METRIC_NAME.match(name):
+                    buf.names[name] = None
+            self._buffered += 1
+            self._seal_if_full(node_id, buf)
+
+    def append_many(self, node_id: str, node_type: str, scheme_id: str, rows: Iterable[Tuple[datetime, Dict[str, float]]]):
+        """Buffer a batch of one node's readings under a single lock (bulk imports)."""
+        with self._lock:
+            buf = self._buffers.get(node_id)
+            if buf is None:
+                buf = self._buffers[node_id] = _NodeBuffer(node_type, scheme_id)
+            count = 0
+            for ts, values in rows:
+                buf.ts.append(_to_ms(ts))
+                buf.rows.append(values)
+                for name in values:
+                    if name not in buf.names and _METRIC_NAME.match(name):
+                        buf.names[name] = None
+                count += 1
+            self._buffered += count
+            self._seal_if_full(node_id, buf)
+
+    def _seal_if_full(self, node_id: str, buf: _NodeBuffer):
+        """Start one seal thread for a full buffer; appends while it is pending don't start more."""
+        if len(buf.ts) < self.seal_rows or node_id in self._sealing:
+            return
+        self._sealing.add(node_id)
+        threading.Thread(target=self._seal_full, args=(node_id,), name="columnar-seal", daemon=True).start()
+
+    def _seal_full(self, node_id: str):
+        try:
+            self.seal(node_id)
+        except Exception:
+            log.exception("sealing telemetry segments failed")
+        finally:
+            with self._lock:
+                self._sealing.discard(node_id)
+
+    def seal(self, node_id: Optional[str] = None) -> int:
+        """Write buffered readings (all nodes, or one) to new segments. Returns rows sealed."""
+        with self._lock:
+            if node_id is None:
+                taken, self._buffers = self._buffers, {}
+            else:
+                buf = self._buffers.pop(node_id, None)
+                taken = {node_id: buf} if buf is not None else {}
+            self._buffered -= sum(len(b.ts) for b in taken.values())
+        rows = 0
+        with self._seal_lock, SEAL_SECONDS.time():
+            for nid, buf in taken.items():
+                if buf.ts:
+                    ts, columns = _buffer_columns(buf)
+                    self._add_segment(nid, buf.node_type, buf.scheme_id, ts, columns)
+                    rows += len(buf.ts)
+        if rows:
+            ROWS_SEALED.inc(rows)
+        return rows
+
+    def _live(self, node_id: str) -> Dict[str, Dict]:
+        """
+        The node's live segments. Loaded from the manifest on first use,
+        finishing whatever an interrupted seal or compaction left behind.
+        """
+        live = self._manifests.get(node_id)
+        if live is not None:
+            return live
+        node_dir = os.path.join(self.root, node_id)
+        loaded = _read_manifest(node_dir)
+        live, removed = loaded if loaded is not None else ({}, set())
+        for name in removed:
+            shutil.rmtree(os.path.join(node_dir, name), ignore_errors=True)
+        if os.path.isdir(node_dir):
+            live.update(_scan_dirs(node_dir, skip=set(live) | removed))
+        self._manifests[node_id] = live
+        self._checkpoint(node_id)
+        return live
+
+    def _checkpoint(self, node_id: str):
+        """Rewrite the manifest as one add line per live segment."""
+        node_dir = os.path.join(self.root, node_id)
+        os.makedirs(node_dir, exist_ok=True)
+        tmp = os.path.join(node_dir, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for meta in self._manifests[node_id].values():
+                f.write(json.dumps({"add": meta}) + "\n")
+        os.replace(tmp, os.path.join(node_dir, MANIFEST))
+
+    def _add_segment(self, node_id: str, node_type: str, scheme_id: str, ts: np.ndarray,
+                     columns: Dict[str, np.ndarray], replaces: Sequence[str] = ()):
+        live = self._live(node_id)
+        meta = self._write_segment(node_id, node_type, scheme_id, ts, columns)
+        entry: Dict = {"add": meta}
+        if replaces:
+            entry["remove"] = list(replaces)
+        with open(os.path.join(self.root, node_id, MANIFEST), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        for name in replaces:
+            live.pop(name, None)
+        live[meta["name"]] = meta
+
+    def _write_segment(self, node_id: str, node_type: str, scheme_id: str, ts: np.ndarray,
+                       columns: Dict[str, np.ndarray]) -> Dict:
+        # the random suffix keeps two seals with the same bounds apart
+        name = f"seg-{ts[0]}-{ts[-1]}-{len(ts)}-{uuid.uuid4().hex[:8]}"
+        final = os.path.join(self.root, node_id, name)
+        tmp = final + ".tmp"
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "ts.npy"), ts)
+        meta_columns = {}
+        for metric, column in columns.items():
+            np.save(os.path.join(tmp, f"{metric}.npy"), column)
+            finite = column[~np.isnan(column)] if column.dtype.kind == "f" else column
+            meta_columns[metric] = {
+                "dtype": column.dtype.name,
+                "min": float(finite.min()) if finite.size else None,
+                "max": float(finite.max()) if finite.size else None,
+            }
+        meta = {
+            "name": name,
+            "node_id": node_id,
+            "node_type": node_type,
+            "scheme_id": scheme_id,
+            "rows": int(len(ts)),
+            "first_ms": int(ts[0]),
+            "last_ms": int(ts[-1]),
+            "columns": meta_columns,
+        }
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.rename(tmp, final)       # fails rather than replace an existing segment
+        return meta
+
+    # ---------- compaction ----------
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """
+        Merge each node's segments of every finished UTC day (by first
+        reading) into one segment. Returns the number of segments merged away.
+        """
+        today = _to_ms(now or datetime.now(timezone.utc)) // DAY_MS
+        merged = 0
+        with self._seal_lock, COMPACT_SECONDS.time():
+            self._collect_garbage()
+            node_ids = sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+            for node_id in node_ids:
+                if not os.path.isdir(os.path.join(self.root, node_id)):
+                    continue
+                days: Dict[int, List[Dict]] = {}
+                for meta in self._live(node_id).values():
+                    day = meta["first_ms"] // DAY_MS
+                    if day < today:
+                        days.setdefault(day, []).append(meta)
+                for group in days.values():
+                    if len(group) > 1:
+                        self._merge(node_id, group)
+                        merged += len(group)
+        if merged:
+            SEGMENTS_COMPACTED.inc(merged)
+        return merged
+
+    def _merge(self, node_id: str, group: List[Dict]):
+        node_dir = os.path.join(self.root, node_id)
+        group.sort(key=lambda m: m["first_ms"])
+        stamps = [np.load(os.path.join(node_dir, m["name"], "ts.npy")) for m in group]
+        ts = np.concatenate(stamps)
+        order = np.argsort(ts, kind="stable")
+        columns = {}
+        for name in dict.fromkeys(c for m in group for c in m["columns"]):
+            pieces = [
+                np.load(os.path.join(node_dir, m["name"], f"{name}.npy")).astype(np.float64)
+                if name in m["columns"] else np.full(len(part), np.nan)
+                for m, part in zip(group, stamps)
+            ]
+            columns[name] = _narrow(np.concatenate(pieces)[order])
+        latest = group[-1]
+        names = [m["name"] for m in group]
+        self._add_segment(node_id, latest["node_type"], latest["scheme_id"], ts[order], columns, replaces=names)
+        self._garbage.append((time.monotonic(), node_id, [os.path.join(node_dir, n) for n in names]))
+
+    def _collect_garbage(self, force: bool = False):
+        """Delete replaced segments past the grace period; drop their removals from the manifest."""
+        now = time.monotonic()
+        keep = []
+        done = set()
+        for replaced_at, node_id, paths in self._garbage:
+            if force or now - replaced_at >= COMPACT_GRACE:
+                for path in paths:
+                    shutil.rmtree(path, ignore_errors=True)
+                done.add(node_id)
+            else:
+                keep.append((replaced_at, node_id, paths))
+        self._garbage = keep
+        for node_id in done - {g[1] for g in keep}:
+            self._checkpoint(node_id)
+
+    def start(self, interval: float = SEAL_INTERVAL):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="columnar-sealer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+        self.seal()
+        with self._seal_lock:
+            self._collect_garbage(force=True)
+
+    def _run(self, interval: float):
+        last_compact = time.monotonic()
+        while not self._stop.wait(interval):
+            try:
+                self.seal()
+                if time.monotonic() - last_compact >= COMPACT_INTERVAL:
+                    last_compact = time.monotonic()
+                    self.compact()
+            except Exception:
+                log.exception("sealing telemetry segments failed")
+
+
+class SegmentPart:
+    """Rows of one segment inside the requested time range, as numpy views."""
+
+    __slots__ = ("meta", "ts", "columns")
+
+    def __init__(self, meta: SegmentMeta, ts: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.meta = meta
+        self.ts = ts
+        self.columns = columns
+
+
+class ColumnarReader:
+    def __init__(self, root: str = ROOT):
+        self.root = root
+        self._cache: Dict[str, Tuple[Tuple[int, int, int], List[SegmentMeta]]] = {}
+
+    def _node_segments(self, node_id: str) -> List[SegmentMeta]:
+        """A node's live segments from its manifest, re-parsed only after it changed."""
+        node_dir = os.path.join(self.root, node_id)
+        try:
+            st = os.stat(os.path.join(node_dir, MANIFEST))
+        except FileNotFoundError:
+            if not os.path.isdir(node_dir):
+                return []
+            # archive written before manifests existed; the writer adds one on its next pass
+            return [SegmentMeta(os.path.join(node_dir, name), meta) for name, meta in _scan_dirs(node_dir).items()]
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self._cache.get(node_id)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        loaded = _read_manifest(node_dir)
+        live = loaded[0] if loaded is not None else {}
+        found = [SegmentMeta(os.path.join(node_dir, name), meta) for name, meta in live.items()]
+        self._cache[node_id] = (stamp, found)
+        return found
+
+    def segments(
+        self,
+        node_ids: Optional[Iterable[str]] = None,
+        scheme_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[SegmentMeta]:
+        """Segment metadata overlapping [start, end), oldest first per node."""
+        if not os.path.isdir(self.root):
+            return []
+        start_ms = _to_ms(start) if start else None
+        end_ms = _to_ms(end) if end else None
+        found = []
+        for node_id in sorted(node_ids) if node_ids is not None else sorted(os.listdir(self.root)):
+            for meta in self._node_segments(node_id):
+                if (end_ms is not None and meta.first_ms >= end_ms) or (start_ms is not None and meta.last_ms < start_ms):
+                    continue
+                if scheme_id is not None and meta.scheme_id != scheme_id:
+                    continue
+                found.append(meta)
+        found.sort(key=lambda m: (m.node_id, m.first_ms))
+        return found
+
+    def scan(
+        self,
+        metrics_wanted: Optional[Sequence[str]] = None,
+        node_ids: Optional[Iterable[str]] = None,
+        scheme_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        where: Optional[Tuple[str, Optional[float], Optional[float]]] = None,
+    ) -> Iterator[SegmentPart]:
+        """
+        Memory-mapped column views per segment. ``where=(metric, low, high)``
+        skips segments whose min/max rule out any match (rows are not filtered).
+        """
+        start_ms = _to_ms(start) if start else None
+        end_ms = _to_ms(end) if end else None
+        for meta in self.segments(node_ids, scheme_id, start, end):
+            if where is not None and not meta.may_match(*where):
+                continue
+            ts = np.load(os.path.join(meta.path, "ts.npy"), mmap_mode="r")
+            lo = int(np.searchsorted(ts, start_ms, "left")) if start_ms is not None else 0
+            hi = int(np.searchsorted(ts, end_ms, "left")) if end_ms is not None else len(ts)
+            if lo >= hi:
+                continue
+            names = metrics_wanted if metrics_wanted is not None else list(meta.columns)
+            columns = {}
+            for name in names:
+                if name in meta.columns:
+                    columns[name] = np.load(os.path.join(meta.path, f"{name}.npy"), mmap_mode="r")[lo:hi]
+            yield SegmentPart(meta, ts[lo:hi], columns)
+
+    def iter_csv(self, metrics_wanted: Sequence[str], **filters) -> Iterator[str]:
+        """CSV text chunks (header first); empty cells where a metric is absent."""
+        yield "timestamp,nodeId," + ",".join(metrics_wanted) + "\n"
+        for part in self.scan(metrics_wanted, **filters):
+            n = len(part.ts)
+            for lo in range(0, n, EXPORT_CHUNK_ROWS):
+                hi = min(n, lo + EXPORT_CHUNK_ROWS)
+                stamps = np.datetime_as_string(part.ts[lo:hi].astype("datetime64[ms]"), unit="ms", timezone="UTC")
+                cells = [stamps, np.full(hi - lo, part.meta.node_id, dtype=object)]
+                for name in metrics_wanted:
+                    column = part.columns.get(name)
+                    if column is None:
+                        cells.append(np.full(hi - lo, "", dtype=object))
+                        continue
+                    text = column[lo:hi].astype(str).astype(object)
+                    if column.dtype.kind == "f":
+                        text[np.isnan(column[lo:hi])] = ""
+                    cells.append(text)
+                out = io.StringIO()
+                for row in zip(*cells):
+                    out.write(",".join(row))
+                    out.write("\n")
+                yield out.getvalue()
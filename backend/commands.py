@@ -0,0 +1,314 @@
+"""
+Pump / valve / MCU command dispatch for the Jalsense backend.
+
+Commands are published to ``jalsense/commands/{nodeId}`` and acknowledged by the
+device on ``jalsense/acks/{nodeId}`` (or over HTTP). The HTTP handler only
+registers the command and hands it to the MQTT client's network thread, so it
+never waits on the device. A single timer thread owns retries and timeouts:
+pending deadlines live in a heap and stale heap entries (already acked
+commands) are skipped lazily, so each submit/ack/expiry is O(log n) regardless
+of how many commands are in flight.
+
+Ack payload: {"commandId": "...", "status": "EXECUTED" | "REJECTED" | "FAILED", "reason": "..."}
+
+Any other status a device reports (TIMEOUT is set by the server only) settles
+the command as FAILED, with the reported status kept in its reason.
+
+An ack only settles a command when it comes from the node the command was
+sent to (the node id in the ack topic); acks naming another node's command are
+counted and ignored.
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+import logs
+import metrics
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:  # the API still works, commands just time out
+    mqtt = None
+
+COMMAND_TOPIC_PREFIX = "jalsense/commands"
+ACK_TOPIC_PREFIX = "jalsense/acks"
+
+ACK_TIMEOUT = 5.0      # seconds before a command is re-sent
+MAX_ATTEMPTS = 3       # total publishes before giving up
+BACKOFF_FACTOR = 2.0   # each retry waits ACK_TIMEOUT * BACKOFF_FACTOR**n
+HISTORY_SIZE = 1000    # finished commands kept for status lookups
+RTT_SAMPLES = 2048     # recent round-trips used for percentiles
+
+PENDING = "PENDING"
+SENT = "SENT"
+ACK_STATES = ("EXECUTED", "REJECTED", "FAILED")   # outcomes a device may report
+FINISHED_STATES = {*ACK_STATES, "TIMEOUT"}
+
+log = logs.get_logger("commands")
+
+COMMANDS = metrics.counter(
+    "gjj_commands_total", "Device commands by final outcome", ("device", "outcome")
+)
+ACKS_MISMATCHED = metrics.counter(
+    "gjj_command_acks_mismatched_total", "Acks ignored because they came from another node", ("device",)
+)
+COMMAND_RETRIES = metrics.counter("gjj_command_retries_total", "Command re-sends", ("device",))
+COMMAND_RTT = metrics.histogram(
+    "gjj_command_rtt_seconds",
+    "Time from first publish to device ack",
+    ("device",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0),
+)
+
+
+class Command(BaseModel):
+    id: str
+    node_id: str
+    device: str   # PUMP | VALVE | TANK_INLET | TANK_OUTLET
+    action: str
+    params: Dict[str, Any] = {}
+    status: str = PENDING
+    attempts: int = 0
+    created_at: datetime
+    acked_at: Optional[datetime] = None
+    rtt_ms: Optional[float] = None
+    reason: Optional[str] = None
+
+
+class MQTTCommandTransport:
+    """Publishes commands and feeds acks back to the dispatcher."""
+
+    def __init__(self, broker: str, port: int):
+        self.broker = broker
+        self.port = port
+        self.on_ack: Optional[Callable[[str, Dict], None]] = None
+        self.client = None
+
+    def start(self):
+        if mqtt is None:
+            log.warning("paho-mqtt not installed; device commands will not be delivered")
+            return
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        else:
+            self.client = mqtt.Client()
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        # connect_async + loop_start: never blocks startup if the broker is down
+        self.client.connect_async(self.broker, self.port, keepalive=60)
+        self.client.loop_start()
+
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(f"{ACK_TOPIC_PREFIX}/#", qos=1)
+            log.info("command transport connected to %s:%s", self.broker, self.port)
+        else:
+            log.error("command transport failed to connect, return code %s", rc)
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            payload = json.loads(msg.payload.decode())
+        except (ValueError, UnicodeDecodeError):
+            log.warning("invalid ack payload on %s", msg.topic)
+            return
+        if self.on_ack is not None:
+            self.on_ack(msg.topic.rsplit("/", 1)[-1], payload)
+
+    def publish(self, command: Command) -> bool:
+        if self.client is None or not self.client.is_connected():
+            return False
+        body = json.dumps({
+            "commandId": command.id,
+            "device": command.device,
+            "action": command.action,
+            "params": command.params,
+            "attempt": command.attempts,
+        })
+        result = self.client.publish(f"{COMMAND_TOPIC_PREFIX}/{command.node_id}", body, qos=1)
+        return result.rc == mqtt.MQTT_ERR_SUCCESS
+
+
+class CommandDispatcher:
+    def __init__(self, transport, ack_timeout: float = ACK_TIMEOUT, max_attempts: int = MAX_ATTEMPTS):
+        self.transport = transport
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        self._pending: Dict[str, Command] = {}
+        self._first_sent: Dict[str, float] = {}
+        self._history: "OrderedDict[str, Command]" = OrderedDict()
+        self._deadlines: List = []  # heap of (deadline, seq, command_id)
+        self._seq = itertools.count()
+        self._rtts: deque = deque(maxlen=RTT_SAMPLES)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        transport.on_ack = self._on_transport_ack
+        metrics.QUEUE_DEPTH.labels("commands_pending").set_function(lambda: len(self._pending))
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.transport.start()
+        self._thread = threading.Thread(target=self._run, name="command-timer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.transport.stop()
+
+    # ---------- API ----------
+
+    def submit(self, node_id: str, device: str, action: str, params: Optional[Dict] = None) -> Command:
+        command = Command(
+            id=f"CMD-{uuid.uuid4().hex[:12]}",
+            node_id=node_id,
+            device=device,
+            action=action,
+            params=params or {},
+            created_at=datetime.now(timezone.utc),
+        )
+        with self._cond:
+            self._pending[command.id] = command
+            self._first_sent[command.id] = time.monotonic()
+            self._arm_locked(command)
+        self._publish(command)
+        return command
+
+    def acknowledge(
+        self,
+        command_id: str,
+        status: str = "EXECUTED",
+        reason: Optional[str] = None,
+        node_id: Optional[str] = None,
+    ) -> Optional[Command]:
+        """
+        Match a device ack to its pending command. Returns None if unknown,
+        finished, or ``node_id`` is given and is not the command's target.
+        """
+        status = str(status).upper()
+        if status not in ACK_STATES:
+            reason = f"device reported status {status!r}" + (f": {reason}" if reason else "")
+            status = "FAILED"
+        with self._cond:
+            command = self._pending.get(command_id)
+            if command is None:
+                return None
+            if node_id is not None and node_id != command.node_id:
+                ACKS_MISMATCHED.labels(command.device).inc()
+                log.warning("ignoring ack for %s from %s; it was sent to %s", command_id, node_id,
+                            command.node_id, extra={"rate_key": ("ack_mismatch", node_id)})
+                return None
+            del self._pending[command_id]
+            rtt = time.monotonic() - self._first_sent.pop(command_id)
+            command.status = status
+            command.reason = reason
+            command.acked_at = datetime.now(timezone.utc)
+            command.rtt_ms = round(rtt * 1000.0, 2)
+            self._rtts.append(rtt)
+            self._remember_locked(command)
+        COMMAND_RTT.labels(command.device).observe(rtt)
+        COMMANDS.labels(command.device, status).inc()
+        log.debug("command %s acked: %s", command_id, status)
+        return command
+
+    def get(self, command_id: str) -> Optional[Command]:
+        with self._cond:
+            return self._pending.get(command_id) or self._history.get(command_id)
+
+    def pending(self, node_id: Optional[str] = None) -> List[Command]:
+        with self._cond:
+            commands = list(self._pending.values())
+        if node_id is not None:
+            commands = [c for c in commands if c.node_id == node_id]
+        return commands
+
+    def stats(self) -> Dict:
+        with self._cond:
+            rtts = sorted(self._rtts)
+            pending = len(self._pending)
+        def pct(p):
+            if not rtts:
+                return None
+            return round(rtts[min(len(rtts) - 1, int(p * len(rtts)))] * 1000.0, 2)
+        return {
+            "pending": pending,
+            "samples": len(rtts),
+            "rtt_ms": {"p50": pct(0.50), "p90": pct(0.90), "p99": pct(0.99)},
+        }
+
+    # ---------- internals ----------
+
+    def _on_transport_ack(self, node_id: str, payload: Dict):
+        command_id = payload.get("commandId")
+        if not command_id:
+            return
+        if self.acknowledge(command_id, payload.get("status", "EXECUTED"), payload.get("reason"), node_id) is None:
+            log.debug("ack for unknown or finished command %s from %s", command_id, node_id)
+
+    def _arm_locked(self, command: Command):
+        command.attempts += 1
+        delay = self.ack_timeout * (BACKOFF_FACTOR ** (command.attempts - 1))
+        heapq.heappush(self._deadlines, (time.monotonic() + delay, next(self._seq), command.id))
+        self._cond.notify()
+
+    def _publish(self, command: Command):
+        # Called without holding our lock: the MQTT client takes its own locks
+        # and delivers acks from its network thread.
+        if self.transport.publish(command):
+            with self._cond:
+                if command.id in self._pending:
+                    command.status = SENT
+
+    def _remember_locked(self, command: Command):
+        self._history[command.id] = command
+        if len(self._history) > HISTORY_SIZE:
+            self._history.popitem(last=False)
+
+    def _run(self):
+        while True:
+            resend = []
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _, _, command_id = heapq.heappop(self._deadlines)
+                    command = self._pending.get(command_id)
+                    if command is None:
+                        continue  # already acked
+                    if command.attempts < self.max_attempts:
+                        COMMAND_RETRIES.labels(command.device).inc()
+                        self._arm_locked(command)
+                        resend.append(command)
+                    else:
+                        del self._pending[command_id]
+                        self._first_sent.pop(command_id, None)
+                        command.status = "TIMEOUT"
+                        command.reason = f"No ack after {command.attempts} attempts"
+                        self._remember_locked(command)
+                        COMMANDS.labels(command.device, "TIMEOUT").inc()
+                        log.warning("command %s to %s timed out", command_id, command.node_id)
+                if not resend:
+                    timeout = self._deadlines[0][0] - now if self._deadlines else None
+                    self._cond.wait(timeout)
+            for command in resend:
+                self._publish(command)
@@ -0,0 +1,180 @@
+"""
+Online tank-level forecasting for the Jalsense backend.
+
+Each tank keeps a fixed-size sliding window of (time, level) samples in two
+preallocated ``array('d')`` ring buffers together with the running sums of a
+least-squares fit (n, Σt, Σy, Σt², Σty, Σy²). A new reading replaces the oldest
+sample and adjusts the sums, so the fill/drain rate and the time-to-empty /
+time-to-overflow estimates are O(1) per reading. Sums are rebuilt from the
+ring every WINDOW updates (rebasing t to the oldest sample) so floating-point
+drift cannot accumulate.
+
+A trend is only extrapolated when the window spans at least MIN_SPAN seconds
+and the line explains the samples (R² of at least MIN_R2). A burst of readings
+milliseconds apart, or a noisy level with no real trend, reports its rate but
+no time-to-empty/overflow, and never raises a warning.
+"""
+
+import threading
+from array import array
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+WINDOW = 64                 # samples in the regression window (~5 min at 5s reports)
+MIN_SAMPLES = 5
+MIN_SPAN = 120.0            # seconds between the oldest and newest sample before forecasting
+MIN_R2 = 0.5                # fit quality below which the trend is not extrapolated
+CRITICAL_LEVEL = 15.0       # % - same threshold as the tank.level_critical rule
+OVERFLOW_LEVEL = 95.0       # % - same threshold as the tank.near_overflow rule
+EMPTY_WARNING_HOURS = 2.0   # raise an early warning when critical is this close
+OVERFLOW_WARNING_HOURS = 0.5
+MIN_RATE = 0.01             # %/hour; flatter trends are treated as steady
+
+
+class TankForecaster:
+    __slots__ = ("_t", "_y", "_head", "_n", "_t0", "_st", "_sy", "_stt", "_sty", "_syy",
+                 "_updates", "_last_ts", "warning")
+
+    def __init__(self):
+        self._t = array("d", bytes(8 * WINDOW))
+        self._y = array("d", bytes(8 * WINDOW))
+        self._head = 0   # next slot to write
+        self._n = 0
+        self._t0: Optional[float] = None
+        self._st = self._sy = self._stt = self._sty = self._syy = 0.0
+        self._updates = 0
+        self._last_ts: Optional[float] = None
+        self.warning: Optional[str] = None   # "empty" | "overflow" | None
+
+    def add(self, ts: float, level: float) -> bool:
+        """Add a reading; returns False for out-of-order samples."""
+        if self._last_ts is not None and ts <= self._last_ts:
+            return False
+        self._last_ts = ts
+        if self._t0 is None:
+            self._t0 = ts
+        t = ts - self._t0
+
+        if self._n == WINDOW:
+            old_t, old_y = self._t[self._head], self._y[self._head]
+            self._st -= old_t
+            self._sy -= old_y
+            self._stt -= old_t * old_t
+            self._sty -= old_t * old_y
+            self._syy -= old_y * old_y
+        else:
+            self._n += 1
+        self._t[self._head] = t
+        self._y[self._head] = level
+        self._head = (self._head + 1) % WINDOW
+        self._st += t
+        self._sy += level
+        self._stt += t * t
+        self._sty += t * level
+        self._syy += level * level
+
+        self._updates += 1
+        if self._updates % WINDOW == 0:
+            self._rebuild()
+        return True
+
+    def _rebuild(self):
+        oldest = self._head if self._n == WINDOW else 0
+        shift = self._t[oldest]
+        self._t0 += shift
+        self._st = self._sy = self._stt = self._sty = self._syy = 0.0
+        for i in range(self._n):
+            t = self._t[i] - shift
+            y = self._y[i]
+            self._t[i] = t
+            self._st += t
+            self._sy += y
+            self._stt += t * t
+            self._sty += t * y
+            self._syy += y * y
+
+    def span(self) -> float:
+        """Seconds between the oldest and the newest sample in the window."""
+        if self._n == 0:
+            return 0.0
+        oldest = self._head if self._n == WINDOW else 0
+        return self._last_ts - self._t0 - self._t[oldest]
+
+    def fit(self) -> Optional[Tuple[float, float, float]]:
+        """(slope in %/s, fitted level at the latest sample, R²) or None."""
+        n = self._n
+        if n < MIN_SAMPLES:
+            return None
+        denom = n * self._stt - self._st * self._st
+        if denom <= 0:
+            return None
+        cov = n * self._sty - self._st * self._sy
+        slope = cov / denom
+        t_last = self._last_ts - self._t0
+        level = (self._sy + slope * (n * t_last - self._st)) / n
+        var_y = n * self._syy - self._sy * self._sy
+        # a flat level is fitted exactly (and has no trend to extrapolate)
+        r2 = 1.0 if var_y <= 1e-9 * n * self._syy else min(1.0, cov * cov / (denom * var_y))
+        return slope, level, r2
+
+    def forecast(self) -> Dict:
+        fitted = self.fit()
+        result = {
+            "samples": self._n,
+            "span_minutes": round(self.span() / 60.0, 2),
+            "r_squared": None,
+            "rate_pct_per_hour": None,
+            "fitted_level": None,
+            "time_to_critical_hours": None,
+            "time_to_empty_hours": None,
+            "time_to_overflow_hours": None,
+        }
+        if fitted is None:
+            self.warning = None
+            return result
+        slope, level, r2 = fitted
+        rate = slope * 3600.0
+        result["r_squared"] = round(r2, 3)
+        result["rate_pct_per_hour"] = round(rate, 3)
+        result["fitted_level"] = round(level, 2)
+        warning = None
+        if self.span() < MIN_SPAN or r2 < MIN_R2:
+            pass                    # too short or too noisy to extrapolate
+        elif rate < -MIN_RATE:
+            result["time_to_empty_hours"] = round(max(level, 0.0) / -rate, 2)
+            if level > CRITICAL_LEVEL:
+                hours = (level - CRITICAL_LEVEL) / -rate
+                result["time_to_critical_hours"] = round(hours, 2)
+                if hours <= EMPTY_WARNING_HOURS:
+                    warning = "empty"
+        elif rate > MIN_RATE and level < OVERFLOW_LEVEL:
+            hours = (OVERFLOW_LEVEL - level) / rate
+            result["time_to_overflow_hours"] = round(hours, 2)
+            if hours <= OVERFLOW_WARNING_HOURS:
+                warning = "overflow"
+        self.warning = warning
+        return result
+
+
+class ForecastRegistry:
+    def __init__(self):
+        self._tanks: Dict[str, TankForecaster] = {}
+        self._lock = threading.Lock()
+
+    def update(self, node_id: str, ts: datetime, level: float) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Feed a reading. Returns (forecast, new_warning) where new_warning is
+        "empty"/"overflow" only on the reading that first crosses into it.
+        """
+        with self._lock:
+            tank = self._tanks.get(node_id)
+            if tank is None:
+                tank = self._tanks[node_id] = TankForecaster()
+            if not tank.add(ts.timestamp(), level):
+                return None, None
+            previous = tank.warning
+            result = tank.forecast()
+            result["updated_at"] = ts.isoformat()
+            result["warning"] = tank.warning
+            new_warning = tank.warning if tank.warning and tank.warning != previous else None
+            return result, new_warning
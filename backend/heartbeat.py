@@ -0,0 +1,149 @@
+"""
+Offline / stale node detection for the Jalsense backend.
+
+Every node has an expected-next-report deadline kept in a hashed timer wheel.
+``touch()`` (called from ingest) moves the node's entry to a new slot and a
+background thread advances the wheel once per tick, firing ``on_expire`` for
+nodes whose deadline passed. Arming, re-arming and expiring are all O(1), so
+the cost does not grow with fleet size; only the slot under the cursor is
+visited on each tick.
+
+A node that reports between expiring and its ``on_expire`` call is re-armed by
+then; each expiry is re-checked against the wheel, under the same lock as
+``touch()``, right before ``on_expire`` runs, so such a node is not flipped.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+import logs
+import metrics
+
+TICK_SECONDS = 1.0
+WHEEL_SLOTS = 512          # one revolution = 512 ticks; longer timeouts wrap around
+DEFAULT_TIMEOUT = 60.0     # seconds without a report before a node is OFFLINE
+
+log = logs.get_logger("heartbeat")
+
+NODES_EXPIRED = metrics.counter(
+    "gjj_nodes_offline_total", "Nodes marked offline after missing their report deadline", ("node_type",)
+)
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel. Each slot maps key -> absolute deadline tick; a key
+    lives in exactly one slot, so re-arming is a dict delete plus insert.
+    Entries more than one revolution away stay in their slot until their
+    round comes up.
+    """
+
+    def __init__(self, tick: float = TICK_SECONDS, slots: int = WHEEL_SLOTS, now: Optional[float] = None):
+        self.tick = tick
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._where: Dict[Hashable, int] = {}
+        self._cursor = self._tick_of(time.monotonic() if now is None else now)
+
+    def _tick_of(self, t: float) -> int:
+        return int(t // self.tick)
+
+    def __len__(self):
+        return len(self._where)
+
+    def arm(self, key: Hashable, delay: float, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        # never schedule into a slot the cursor has already passed
+        deadline = max(self._tick_of(now) + math.ceil(delay / self.tick), self._cursor + 1)
+        self.cancel(key)
+        slot = deadline % len(self._slots)
+        self._slots[slot][key] = deadline
+        self._where[key] = slot
+
+    def armed(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def cancel(self, key: Hashable):
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Move the cursor up to ``now`` and return the keys that expired."""
+        target = self._tick_of(time.monotonic() if now is None else now)
+        expired = []
+        while self._cursor < target:
+            self._cursor += 1
+            bucket = self._slots[self._cursor % len(self._slots)]
+            if not bucket:
+                continue
+            due = [k for k, deadline in bucket.items() if deadline <= self._cursor]
+            for key in due:
+                del bucket[key]
+                del self._where[key]
+            expired.extend(due)
+        return expired
+
+
+class HeartbeatMonitor:
+    def __init__(
+        self,
+        on_expire: Callable[[str], None],
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = DEFAULT_TIMEOUT,
+        tick: float = TICK_SECONDS,
+    ):
+        self.on_expire = on_expire
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self._wheel = TimerWheel(tick=tick)
+        self._types: Dict[str, str] = {}
+        self._lock = threading.RLock()   # on_expire runs under it and may touch()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        metrics.QUEUE_DEPTH.labels("heartbeat_armed").set_function(lambda: len(self._wheel))
+
+    def touch(self, node_id: str, node_type: str, now: Optional[float] = None):
+        """Re-arm the node's deadline; call on every report."""
+        timeout = self.timeouts.get(node_type, self.default_timeout)
+        with self._lock:
+            self._types[node_id] = node_type
+            self._wheel.arm(node_id, timeout, now)
+
+    def forget(self, node_id: str):
+        with self._lock:
+            self._wheel.cancel(node_id)
+            self._types.pop(node_id, None)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="heartbeat-wheel", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """Advance the wheel and run on_expire for nodes still past their deadline."""
+        with self._lock:
+            expired = self._wheel.advance(now)
+        fired = []
+        for node_id in expired:
+            with self._lock:
+                if self._wheel.armed(node_id):
+                    continue        # reported again since it expired
+                NODES_EXPIRED.labels(self._types.get(node_id, "unknown")).inc()
+                try:
+                    self.on_expire(node_id)
+                except Exception:
+                    log.exception("offline handler failed for %s", node_id)
+                fired.append(node_id)
+        return fired
+
+    def _run(self):
+        while not self._stop.wait(self._wheel.tick):
+            self.expire()
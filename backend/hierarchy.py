@@ -0,0 +1,178 @@
+"""
+Administrative hierarchy and KPI rollups for the Jalsense backend.
+
+Schemes sit under a village, villages under a block, blocks under a district:
+
+    state -> district -> block -> village -> scheme -> nodes
+
+Every level keeps running counters - nodes by status, open alerts by
+severity, and per-UTC-day supply hours and water production. Nothing is
+recomputed on read: a node status change, an alert opening or closing, or a
+pump's usage increment is applied as a delta to the five counters on its path
+(scheme up to state), so both updates and reads of any level are O(1).
+
+Supply hours are pump running hours summed over the pumps below a level, and
+water production is the litres they pumped; both come from the maintenance
+engine's integration of each pump's readings.
+
+The scheme -> village/block/district mapping is read from the JSON file named
+by GJJ_HIERARCHY_CONFIG:
+
+    {"schemes": {"Scheme-001": {"district": "...", "block": "...", "village": "..."}}}
+
+Schemes missing from it are filed under UNASSIGNED at every level.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.environ.get("GJJ_HIERARCHY_CONFIG", os.path.join(_HERE, "hierarchy.json"))
+UNASSIGNED = "Unassigned"
+LEVELS = ("state", "district", "block", "village", "scheme")
+STATUSES = ("OK", "WARNING", "CRITICAL", "OFFLINE")
+SEVERITIES = ("low", "medium", "high")
+HISTORY_DAYS = 7
+
+# demo mapping used when no config file is present
+DEFAULT_SCHEMES = {
+    "Scheme-001": {"district": "Pune", "block": "Haveli", "village": "Khed Shivapur"},
+}
+
+
+class Rollup:
+    __slots__ = ("level", "key", "name", "nodes", "alerts", "days", "children")
+
+    def __init__(self, level: str, key: Tuple[str, ...]):
+        self.level = level
+        self.key = key
+        self.name = key[-1] if key else "state"
+        self.nodes = dict.fromkeys(STATUSES, 0)
+        self.alerts = dict.fromkeys(SEVERITIES, 0)
+        self.days: Dict[int, List[float]] = {}   # UTC day ordinal -> [supply hours, litres]
+        self.children: Dict[str, "Rollup"] = {}
+
+    def add_usage(self, day: int, hours: float, litres: float):
+        totals = self.days.get(day)
+        if totals is None:
+            totals = self.days[day] = [0.0, 0.0]
+            if len(self.days) > HISTORY_DAYS:
+                del self.days[min(self.days)]
+        totals[0] += hours
+        totals[1] += litres
+
+    def to_dict(self, today: int) -> Dict:
+        current = self.days.get(today, (0.0, 0.0))
+        week = [v for d, v in self.days.items() if d > today - HISTORY_DAYS]
+        return {
+            "level": self.level,
+            "name": self.name,
+            "path": list(self.key),
+            "nodes": {"total": sum(self.nodes.values()), **self.nodes},
+            "open_alerts": {"total": sum(self.alerts.values()), **self.alerts},
+            "supply_hours_today": round(current[0], 2),
+            "water_production_litres_today": round(current[1], 1),
+            "supply_hours_7d": round(sum((v[0] for v in week), 0.0), 2),
+            "water_production_litres_7d": round(sum((v[1] for v in week), 0.0), 1),
+            "child_count": len(self.children),
+        }
+
+
+def load_schemes(path: str = CONFIG_PATH) -> Dict[str, Dict[str, str]]:
+    if not os.path.exists(path):
+        return dict(DEFAULT_SCHEMES)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("schemes", {})
+
+
+class HierarchyRollups:
+    def __init__(self, schemes: Optional[Dict[str, Dict[str, str]]] = None):
+        self._schemes = schemes if schemes is not None else load_schemes()
+        self._root = Rollup("state", ())
+        self._paths: Dict[str, List[Rollup]] = {}         # scheme id -> rollups, state first
+        self._index: Dict[Tuple[str, ...], Rollup] = {(): self._root}
+        self._node_status: Dict[str, Tuple[str, str]] = {}  # node id -> (scheme id, status)
+        self._usage: Dict[str, Tuple[float, float]] = {}    # pump id -> last (hours, litres)
+        self._lock = threading.Lock()
+
+    def _path(self, scheme_id: str) -> List[Rollup]:
+        path = self._paths.get(scheme_id)
+        if path is not None:
+            return path
+        place = self._schemes.get(scheme_id, {})
+        names = tuple(place.get(level, UNASSIGNED) for level in ("district", "block", "village")) + (scheme_id,)
+        path = [self._root]
+        for depth, level in enumerate(LEVELS[1:], 1):
+            key = names[:depth]
+            rollup = self._index.get(key)
+            if rollup is None:
+                rollup = self._index[key] = Rollup(level, key)
+                path[-1].children[key[-1]] = rollup
+            path.append(rollup)
+        self._paths[scheme_id] = path
+        return path
+
+    def place(self, scheme_id: str) -> Dict[str, str]:
+        with self._lock:
+            path = self._path(scheme_id)
+        return {rollup.level: rollup.name for rollup in path[1:]}
+
+    # ---------- deltas ----------
+
+    def node_changed(self, node_id: str, scheme_id: str, status: str):
+        """Record a node's current status; only a change touches the counters."""
+        with self._lock:
+            previous = self._node_status.get(node_id)
+            if previous == (scheme_id, status):
+                return
+            if previous is not None:
+                for rollup in self._path(previous[0]):
+                    rollup.nodes[previous[1]] = rollup.nodes.get(previous[1], 0) - 1
+            for rollup in self._path(scheme_id):
+                rollup.nodes[status] = rollup.nodes.get(status, 0) + 1
+            self._node_status[node_id] = (scheme_id, status)
+
+    def alert_opened(self, scheme_id: str, severity: str):
+        with self._lock:
+            for rollup in self._path(scheme_id):
+                rollup.alerts[severity] = rollup.alerts.get(severity, 0) + 1
+
+    def alert_closed(self, scheme_id: str, severity: str):
+        with self._lock:
+            for rollup in self._path(scheme_id):
+                rollup.alerts[severity] = max(0, rollup.alerts.get(severity, 0) - 1)
+
+    def pump_usage(self, node_id: str, scheme_id: str, ts: datetime, running_hours: float, litres: float):
+        """Add the growth of a pump's cumulative running hours / litres to today's totals."""
+        with self._lock:
+            last = self._usage.get(node_id)
+            self._usage[node_id] = (running_hours, litres)
+            if last is None:
+                return
+            hours, pumped = running_hours - last[0], litres - last[1]
+            if hours <= 0 and pumped <= 0:
+                return
+            day = int(ts.timestamp() // 86400)
+            for rollup in self._path(scheme_id):
+                rollup.add_usage(day, max(0.0, hours), max(0.0, pumped))
+
+    # ---------- reads ----------
+
+    def get(self, path: Tuple[str, ...], today: int, children: bool = False) -> Optional[Dict]:
+        """Rollup at (), (district,), (district, block), ... ; None if unknown."""
+        with self._lock:
+            rollup = self._index.get(tuple(path))
+            if rollup is None:
+                return None
+            result = rollup.to_dict(today)
+            if children:
+                result["children"] = [c.to_dict(today) for c in rollup.children.values()]
+        return result
+
+    def scheme(self, scheme_id: str, today: int) -> Optional[Dict]:
+        with self._lock:
+            path = self._paths.get(scheme_id)
+            return path[-1].to_dict(today) if path is not None else None
@@ -0,0 +1,215 @@
+"""
+Bulk import of laboratory water-quality results for the Jalsense backend.
+
+District labs export results as CSV, one sample per row:
+
+    tapId,sampledAt,ph,turbidity,tds,freeChlorine,...,labId,sampleId
+    tap-1,2026-10-02T09:30:00+05:30,7.1,0.8,410,0.4,...,DL-PUNE,S-000123
+
+The header is resolved once: every column maps to a tap metric through the
+tap schema in telemetry_schema (aliases included), to the tap id or sample
+time, to lab metadata, or is ignored. Rows are then read one at a time from
+the file object with csv.reader and grouped into batches of BATCH_ROWS valid
+samples per tap. The file is never held in memory. Each batch is handed to
+``apply_batch`` as {tap id: [Sample, ...]} so the caller can record it in
+one locked step per tap.
+
+A row with any invalid cell is rejected whole and listed in the error report
+(first MAX_ERRORS rows). Accepted samples are checked against the BIS limits
+in quality.QUALITY_LIMITS and counted as exceedances, not rejected. The
+per-tap summary keeps the newest sample so rules run once per tap after the
+upload, not once per row.
+
+Excel workbooks are not parsed; export them as CSV (UTF-8 with or without a
+BOM; comma, semicolon or tab separated).
+"""
+
+import csv
+import io
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Callable, Dict, List, Mapping, Optional, Tuple
+
+import quality
+import telemetry_schema
+
+BATCH_ROWS = 5000
+MAX_ERRORS = 1000
+MAX_FUTURE = telemetry_schema.MAX_FUTURE
+
+TAP_COLUMNS = ("tapid", "nodeid", "tap")
+TIME_COLUMNS = ("sampledat", "timestamp", "sampletime", "collectedat")
+META_COLUMNS = frozenset({"labid", "sampleid", "qualitysamplingoperator", "remarks", "lab"})
+
+# (sample time, canonical metrics, quality.evaluate() checks)
+Sample = Tuple[datetime, Dict[str, float], List[Tuple[int, bool]]]
+
+
+class UploadError(ValueError):
+    """The file as a whole cannot be imported (bad header, not CSV)."""
+
+
+class TapSummary:
+    __slots__ = ("samples", "failed", "coliform", "failed_parameters", "latest")
+
+    def __init__(self):
+        self.samples = 0
+        self.failed = 0
+        self.coliform = False
+        self.failed_parameters: Counter = Counter()
+        self.latest: Optional[Tuple[datetime, Dict[str, float]]] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "samples": self.samples,
+            "failed": self.failed,
+            "coliform_detected": self.coliform,
+            "failed_parameters": dict(self.failed_parameters),
+            "latest_sample": self.latest[0].isoformat() if self.latest else None,
+        }
+
+
+def _parse_time(text: str) -> datetime:
+    return telemetry_schema.as_utc(datetime.fromisoformat(text.strip().replace("Z", "+00:00")))
+
+
+def _columns(header: List[str]) -> Tuple[int, int, Dict[int, Tuple[str, float]], List[str]]:
+    """(tap column, time column, {index: (metric, scale)}, ignored columns)."""
+    schema = telemetry_schema.COMPILED["tap"]
+    by_lower = {name.lower(): (name, 1.0) for name in schema.ranges}
+    for alias, target in schema.aliases.items():
+        if target is not None:
+            by_lower[alias.lower()] = target
+    tap_col = time_col = None
+    metrics: Dict[int, Tuple[str, float]] = {}
+    ignored = []
+    for i, raw in enumerate(header):
+        name = raw.strip().lower()
+        if name in TAP_COLUMNS and tap_col is None:
+            tap_col = i
+        elif name in TIME_COLUMNS and time_col is None:
+            time_col = i
+        elif name in by_lower:
+            metrics[i] = by_lower[name]
+        elif name not in META_COLUMNS:
+            ignored.append(raw)
+    if tap_col is None or time_col is None:
+        raise UploadError("header needs a tapId and a sampledAt column")
+    if not metrics:
+        raise UploadError("header has no water-quality parameter columns")
+    return tap_col, time_col, metrics, ignored
+
+
+def import_csv(
+    file: BinaryIO,
+    taps: Mapping[str, Any],
+    apply_batch: Callable[[Dict[str, List[Sample]]], None],
+    now: Optional[datetime] = None,
+) -> Tuple[Dict, Dict[str, TapSummary]]:
+    """
+    Stream ``file`` (binary CSV) into ``apply_batch``. ``taps`` holds the tap
+    ids rows may name. Returns (report, per-tap summaries).
+    """
+    started = time.perf_counter()
+    now = now or datetime.now(timezone.utc)
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        first = text.readline()
+        if not first.strip():
+            raise UploadError("file is empty")
+        delimiter = max(",;\t", key=first.count)
+        header = next(csv.reader([first], delimiter=delimiter))
+        return _import_rows(text, header, delimiter, taps, apply_batch, now, started)
+    finally:
+        text.detach()      # leave the caller's file open
+
+
+def _import_rows(text, header, delimiter, taps, apply_batch, now, started) -> Tuple[Dict, Dict[str, TapSummary]]:
+    tap_col, time_col, metric_cols, ignored = _columns(header)
+    ranges = telemetry_schema.COMPILED["tap"].ranges
+    width = max(tap_col, time_col, *metric_cols) + 1
+
+    reader = csv.reader(text, delimiter=delimiter)
+    summaries: Dict[str, TapSummary] = {}
+    exceedances: Counter = Counter()
+    errors: List[Dict] = []
+    rows = accepted = rejected = 0
+    batch: Dict[str, List[Sample]] = {}
+    pending = 0
+
+    for row in reader:
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        rows += 1
+        line = reader.line_num + 1      # the header was read before the reader
+        problems: Dict[str, str] = {}
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        tap_id = row[tap_col].strip()
+        if tap_id not in taps:
+            problems["tapId"] = "unknown tap for this scheme" if tap_id else "missing"
+        try:
+            ts = _parse_time(row[time_col])
+            if ts > now + MAX_FUTURE:
+                problems["sampledAt"] = "in the future"
+        except ValueError:
+            problems["sampledAt"] = "not an ISO-8601 time"
+        metrics: Dict[str, float] = {}
+        for i, (name, scale) in metric_cols.items():
+            cell = row[i].strip()
+            if not cell:
+                continue
+            try:
+                value = float(cell) * scale
+            except ValueError:
+                problems[header[i]] = "not a number"
+                continue
+            low, high = ranges[name]
+            if not low <= value <= high:
+                problems[header[i]] = f"out of range [{low:g}, {high:g}]"
+                continue
+            metrics[name] = value
+        if not metrics and not problems:
+            problems["row"] = "no measurements"
+        if problems:
+            rejected += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({"row": line, "tapId": tap_id or None, "errors": problems})
+            continue
+
+        checks = quality.evaluate(metrics)
+        accepted += 1
+        summary = summaries.get(tap_id)
+        if summary is None:
+            summary = summaries[tap_id] = TapSummary()
+        summary.samples += 1
+        failed = [quality.PARAMETERS[i] for i, passed in checks if not passed]
+        if failed:
+            summary.failed += 1
+            summary.failed_parameters.update(failed)
+            exceedances.update(failed)
+            if "coliformPresent" in failed:
+                summary.coliform = True
+        if summary.latest is None or ts >= summary.latest[0]:
+            summary.latest = (ts, metrics)
+        batch.setdefault(tap_id, []).append((ts, metrics, checks))
+        pending += 1
+        if pending >= BATCH_ROWS:
+            apply_batch(batch)
+            batch, pending = {}, 0
+    if batch:
+        apply_batch(batch)
+
+    report = {
+        "rows": rows,
+        "accepted": accepted,
+        "rejected": rejected,
+        "exceedances": dict(exceedances),
+        "taps": {tap_id: s.to_dict() for tap_id, s in summaries.items()},
+        "ignored_columns": ignored,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return report, summaries
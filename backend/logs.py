@@ -0,0 +1,193 @@
+"""
+Structured, non-blocking logging for the Jalsense backend, listener and simulators.
+
+Records are handed to a bounded queue in the calling thread and written to
+stderr by a background ``QueueListener``; message formatting happens in that
+writer thread, never on the request path. If the queue is full the record is
+dropped and counted rather than blocking the caller.
+
+Configuration (environment):
+    GJJ_LOG_LEVEL   default level for every component (INFO)
+    GJJ_LOG_LEVELS  per-component overrides, e.g. "alerts=WARNING,mqtt=DEBUG"
+    GJJ_LOG_FORMAT  "json" (default) or "text"
+
+Usage:
+    log = logs.get_logger("alerts")
+    log.info("alert raised on %s", node_id, extra={"fields": {"rule": rule}})
+
+Identical messages are rate limited (see ``RateLimitFilter``); pass
+``extra={"rate_key": ...}`` to group messages whose text varies.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+ROOT = "gjj"
+QUEUE_SIZE = 10000
+# At most RATE_LIMIT_BURST identical messages per RATE_LIMIT_WINDOW seconds;
+# the rest are counted and reported on the next one that gets through.
+RATE_LIMIT_WINDOW = 10.0
+RATE_LIMIT_BURST = 5
+
+LOG_DROPPED = metrics.counter("gjj_log_records_dropped_total", "Log records dropped", ("reason",))
+
+
+def get_logger(component: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{component}")
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Suppress bursts of the same message. Messages are the same when logger,
+    line, template and arguments match, or when they carry the same
+    ``rate_key`` (passed via ``extra``).
+    """
+
+    def __init__(self, window: float = RATE_LIMIT_WINDOW, burst: int = RATE_LIMIT_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        # key -> [window start, emitted in window, suppressed in window]
+        self._seen: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            key = (record.name, record.lineno, str(record.msg), record.args)
+            try:
+                hash(key)
+            except TypeError:
+                key = key[:3]
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state is not None and state[2]:
+                    record.suppressed = state[2]
+                if len(self._seen) > 4096:
+                    self._seen.clear()
+                self._seen[key] = [now, 1, 0]
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+        LOG_DROPPED.labels("rate_limited").inc()
+        return False
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is deferred to the writer thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.labels("queue_full").inc()
+
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "component": record.name[len(ROOT) + 1:] or ROOT,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key == "fields" and isinstance(value, dict):
+                entry.update(value)
+            elif key not in _STANDARD_ATTRS and key != "rate_key":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        suppressed = getattr(record, "suppressed", None)
+        if suppressed:
+            line += f" (suppressed {suppressed} similar)"
+        return line
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    levels: Optional[Dict[str, str]] = None,
+    fmt: Optional[str] = None,
+):
+    """
+    Install the queue handler and start the background writer. Safe to call
+    more than once; later calls only update levels.
+    """
+    global _listener
+
+    root = logging.getLogger(ROOT)
+    root.setLevel((level or os.environ.get("GJJ_LOG_LEVEL", "INFO")).upper())
+    root.propagate = False
+    overrides = _parse_levels(os.environ.get("GJJ_LOG_LEVELS", ""))
+    overrides.update(levels or {})
+    for component, component_level in overrides.items():
+        get_logger(component).setLevel(component_level)
+
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    handler = _NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+    root.addHandler(handler)
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(
+        TextFormatter() if (fmt or os.environ.get("GJJ_LOG_FORMAT", "json")) == "text"
+        else JsonFormatter()
+    )
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    metrics.QUEUE_DEPTH.labels("log").set_function(log_queue.qsize)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush pending records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,8 +1,41 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List, Optional
-from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import asyncio
+import contextvars
+import threading
+import time
+
+import admission
+import alert_store
+import auth
+import backtest
+import columnar
+import commands
+import forecasting
+import heartbeat
+import hierarchy
+import lab_results
+import logs
+import maintenance
+import metrics
+import notifications
+import profiling
+import quality
+import rules
+import service_requests as sr
+import water_balance
+import snapshot
+import telemetry_schema
+
+logs.setup_logging()
+alert_log = logs.get_logger("alerts")
 
 app = FastAPI(title="GJJ IoT Water Backend")
 
@@ -20,17 +53,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# opt-in per-stage request timings (see profiling.py)
+app.add_middleware(profiling.ProfilingMiddleware)
+
 # ---------- In-memory data stores (for demo) ----------
 
 
+DEFAULT_SCHEME = "Scheme-001"
+
+
 class Node(BaseModel):
     id: str
     name: str
     type: str  # pump | tap | tank | valve
     location: str
+    scheme_id: str = DEFAULT_SCHEME
     latest_metrics: Dict[str, float] = {}
     last_updated: Optional[datetime] = None
-    status: str = "OK"  # OK | WARNING | CRITICAL
+    status: str = "OK"  # OK | WARNING | CRITICAL | OFFLINE
+    forecast: Optional[Dict[str, Any]] = None  # tanks: level trend + time-to-empty/overflow
 
 
 class Alert(BaseModel):
@@ -42,14 +83,41 @@ class Alert(BaseModel):
     message: str
     created_at: datetime
     acknowledged: bool = False
+    rule: str = "generic"
 
 
 class TelemetryIn(BaseModel):
     nodeId: str
-    metrics: Dict[str, float]
+    metrics: Dict[str, Any]  # checked per node type by telemetry_schema, not here
     timestamp: Optional[datetime] = None
 
 
+class ControlIn(BaseModel):
+    action: str
+    metadata: Dict[str, Any] = {}
+
+
+class LoginIn(BaseModel):
+    email: str
+    password: str
+    language: Optional[str] = None
+
+
+class CommandAckIn(BaseModel):
+    nodeId: str  # node reporting the ack; must be the command's target
+    status: str = "EXECUTED"  # EXECUTED | REJECTED | FAILED
+    reason: Optional[str] = None
+
+
+class BacktestIn(BaseModel):
+    rules: Dict[str, Optional[Dict[str, Any]]] = {}    # rule id -> replacement (null drops it)
+    thresholds: Dict[str, float] = {}                  # "<rule>.<metric>" -> new value
+    scheme_id: Optional[str] = None
+    node_ids: Optional[List[str]] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+
 # some demo nodes you see in the UI
 NODES: Dict[str, Node] = {
     "pump-1": Node(
@@ -61,236 +129,388 @@ NODES: Dict[str, Node] = {
     "tap-1": Node(
         id="tap-1", name="Public Tap – Zone 1", type="tap", location="Street 1"
     ),
+    "valve-1": Node(
+        id="valve-1", name="Main Distribution Valve", type="valve", location="Distribution Network"
+    ),
 }
 
-ALERTS: List[Alert] = []
-ALERT_COUNTER = 1
+# hot alerts in memory; acknowledged ones past retention are compacted to disk archives
+ALERTS = alert_store.AlertStore(alert_store.AlertArchive())
+
+# ---------- Metrics ----------
+
+INGEST_REQUESTS = metrics.counter(
+    "gjj_ingest_requests_total", "Telemetry ingest requests", ("node_type", "outcome")
+)
+INGEST_LATENCY = metrics.histogram(
+    "gjj_ingest_latency_seconds", "Time spent handling a telemetry ingest", ("node_type",)
+)
+RULES_LATENCY = metrics.histogram(
+    "gjj_apply_rules_seconds", "apply_rules evaluation time", ("node_type",)
+)
+ALERTS_FIRED = metrics.counter(
+    "gjj_alerts_fired_total", "Alerts raised by the rule engine", ("rule", "severity")
+)
+SERIALIZATION_LATENCY = metrics.histogram(
+    "gjj_response_serialization_seconds", "Time spent serializing list responses", ("endpoint",)
+)
+metrics.QUEUE_DEPTH.labels("alerts").set_function(lambda: len(ALERTS))
+
+# ---------- Incremental analytics ----------
+
+TANK_FORECASTS = forecasting.ForecastRegistry()
+QUALITY_COMPLIANCE = quality.ComplianceTracker()
+MAINTENANCE = maintenance.MaintenanceEngine()
+HIERARCHY = hierarchy.HierarchyRollups()
+WATER_BALANCE = water_balance.WaterBalance()
+TELEMETRY_ARCHIVE = columnar.ColumnarWriter()
+TELEMETRY_READER = columnar.ColumnarReader()
+SNAPSHOTS = snapshot.SnapshotCache(lambda scheme_id: scheme_quality_report(scheme_id))
+
+# ---------- Ingest admission ----------
+
+INGEST_ADMISSION = admission.AdmissionController(lambda payload: process_telemetry(payload))
+# critical readings run on their own threads: never on the event loop, never behind routine work
+CRITICAL_INGEST = ThreadPoolExecutor(admission.CRITICAL_WORKERS, thread_name_prefix="ingest-critical")
+# a node's readings are applied one at a time, so the timestamp-order check holds
+NODE_LOCKS: Dict[str, threading.Lock] = {node_id: threading.Lock() for node_id in NODES}
+
+# ---------- Device commands ----------
+
+MQTT_BROKER = "localhost"
+MQTT_PORT = 1883
+
+PUMP_ACTIONS = {"START", "STOP"}
+VALVE_ACTIONS = {"OPEN", "CLOSE", "PARTIAL"}
+
+COMMANDS = commands.CommandDispatcher(commands.MQTTCommandTransport(MQTT_BROKER, MQTT_PORT))
+
+# ---------- Notifications ----------
+
+NOTIFIER = notifications.NotificationDispatcher(
+    notifications.default_channels(), notifications.load_subscriptions()
+)
+
+# ---------- Heartbeats ----------
+
+# Seconds of silence before a node is marked OFFLINE (devices report every ~5s).
+HEARTBEAT_TIMEOUTS = {"pump": 60.0, "tank": 60.0, "tap": 120.0, "valve": 120.0}
+
+
+def mark_offline(node_id: str):
+    node = NODES.get(node_id)
+    if node is None:
+        return
+    node.status = "OFFLINE"
+    last = node.last_updated.isoformat() if node.last_updated else "never"
+    create_alert(node, "offline", "high",
+        f"Node stopped reporting (last report: {last})",
+        rule="node.offline")
+    SNAPSHOTS.update_node(node)
+    HIERARCHY.node_changed(node.id, node.scheme_id, node.status)
+
+
+HEARTBEATS = heartbeat.HeartbeatMonitor(mark_offline, timeouts=HEARTBEAT_TIMEOUTS)
+
+
+@app.on_event("startup")
+def start_background_services():
+    if auth.AUTH_ENABLED and auth.SECRET_IS_EPHEMERAL:
+        logs.get_logger("auth").warning(
+            "GJJ_AUTH_SECRET not set; using a random secret (tokens reset on restart)"
+        )
+    if auth.AUTH_ENABLED and not auth.USERS:
+        logs.get_logger("auth").warning(
+            "no dashboard users; set GJJ_DEMO_PASSWORD to enable the demo accounts"
+        )
+    COMMANDS.start()
+    INGEST_ADMISSION.start()
+    ALERTS.start()
+    NOTIFIER.start()
+    TELEMETRY_ARCHIVE.start()
+    # arm every known node so ones that never report are flagged too
+    for node in NODES.values():
+        HEARTBEATS.touch(node.id, node.type)
+        SNAPSHOTS.update_node(node)
+        HIERARCHY.node_changed(node.id, node.scheme_id, node.status)
+    HEARTBEATS.start()
+
+
+@app.on_event("shutdown")
+def stop_background_services():
+    HEARTBEATS.stop()
+    INGEST_ADMISSION.stop()
+    CRITICAL_INGEST.shutdown(wait=False)
+    ALERTS.stop()
+    NOTIFIER.stop()
+    TELEMETRY_ARCHIVE.stop()
+    COMMANDS.stop()
+
+# ---------- Auth dependencies ----------
+
+ANONYMOUS = {"sub": "anonymous", "role": "admin"}  # used when GJJ_AUTH_DISABLED=1
+_BEARER_CHALLENGE = {"WWW-Authenticate": "Bearer"}
+
+
+def current_claims(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    if not auth.AUTH_ENABLED:
+        return ANONYMOUS
+    if not authorization or authorization[:7].lower() != "bearer ":
+        raise HTTPException(status_code=401, detail="Not authenticated", headers=_BEARER_CHALLENGE)
+    try:
+        return auth.AUTHORITY.verify(authorization[7:].strip())
+    except auth.AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers=_BEARER_CHALLENGE)
+
+
+def require_role(*roles: str):
+    def dependency(claims: Dict[str, Any] = Depends(current_claims)) -> Dict[str, Any]:
+        if claims["role"] not in roles:
+            raise HTTPException(status_code=403, detail="Insufficient role")
+        return claims
+    return dependency
+
+
+async def ingest_principal(
+    authorization: Optional[str] = Header(None),
+    x_device_key: Optional[str] = Header(None),
+) -> Dict[str, Any]:
+    """
+    Devices send X-Device-Key; gateways forwarding for many nodes send a
+    Bearer token with role gateway (or admin). Async so that it runs on the
+    event loop, ahead of admission, without taking a worker thread.
+    """
+    if not auth.AUTH_ENABLED:
+        return ANONYMOUS
+    if x_device_key:
+        try:
+            return {"sub": auth.AUTHORITY.verify_device_key(x_device_key), "role": "device"}
+        except auth.AuthError as e:
+            raise HTTPException(status_code=401, detail=str(e))
+    claims = current_claims(authorization)
+    if claims["role"] not in ("gateway", "admin"):
+        raise HTTPException(status_code=403, detail="Not allowed to ingest telemetry")
+    return claims
+
+
+require_operator = require_role("technician", "admin")
+require_admin = require_role("admin")
 
 # ---------- Utility functions ----------
 
 
-def _next_alert_id() -> int:
-    global ALERT_COUNTER
-    aid = ALERT_COUNTER
-    ALERT_COUNTER += 1
-    return aid
+def create_alert(node: Node, alert_type: str, severity: str, message: str,
+                 rule: str = "generic"):
+    with profiling.stage("create_alert", rule):
+        _create_alert(node, alert_type, severity, message, rule)
 
 
-def create_alert(node: Node, alert_type: str, severity: str, message: str):
+def _create_alert(node: Node, alert_type: str, severity: str, message: str, rule: str):
     alert = Alert(
-        id=_next_alert_id(),
+        id=ALERTS.next_id(),
         node_id=node.id,
         node_name=node.name,
         type=alert_type,
         severity=severity,
         message=message,
         created_at=datetime.now(timezone.utc),
+        rule=rule,
     )
-    ALERTS.append(alert)
-    print(
-        f"[ALERT] {alert.type.upper()} ({alert.severity}) on {alert.node_name}: {alert.message}"
+    ALERTS.add(alert)
+    NOTIFIER.submit(alert)
+    SNAPSHOTS.alert_raised(node.scheme_id, alert)
+    HIERARCHY.alert_opened(node.scheme_id, alert.severity)
+    ALERTS_FIRED.labels(rule, severity).inc()
+    alert_log.info(
+        "%s (%s) on %s: %s", alert.type.upper(), alert.severity, alert.node_name, alert.message,
+        extra={
+            "fields": {"alert_id": alert.id, "node_id": alert.node_id, "rule": rule},
+            "rate_key": (alert.node_id, rule),
+        },
     )
 
 
-def apply_rules(node: Node):
-    """
-    Comprehensive rule-based anomaly detection across all 5 categories.
-    """
-    m = node.latest_metrics
-    node.status = "OK"
+def _limit(rule_id: str) -> float:
+    """Threshold of a rule's first clause, for alert messages."""
+    spec = rules.RULES[rule_id]
+    return spec.get("any", spec.get("all"))[0][2]
 
-    # =====================================================
-    # CATEGORY 1 & 2: PUMP RULES (Infrastructure + Operational)
-    # =====================================================
-    if node.type == "pump":
-        flow = m.get("flowRate", 0.0)
-        pressure = m.get("pressure", 0.0)
-        motor_temp = m.get("motorTemperature")
-        voltage = m.get("voltage")
-        efficiency = m.get("pumpEfficiency")
-        discharge = m.get("pumpDischargeRate", 0.0)
-        power = m.get("powerConsumption", 0.0)
-        leak_indicator = m.get("flowDropIndicator", 0)
-        leak_score = m.get("leakProbabilityScore", 0)
-        pump_hours = m.get("pumpRunningHours", 0)
-
-        # 1) Dry run: high power, low discharge
-        if power > 7.5 and discharge < 15:
-            node.status = "CRITICAL"
-            create_alert(node, "pump", "high",
-                f"Possible dry-run: High power ({power:.1f}kW) but low discharge ({discharge:.1f}L/min)")
-
-        # 2) Efficiency drop
-        if efficiency is not None and efficiency < 60:
-            node.status = "WARNING"
-            create_alert(node, "pump", "medium",
-                f"Pump efficiency dropped to {efficiency:.1f}% (normal: 65-85%)")
-
-        # 3) High motor temperature
-        if motor_temp is not None and motor_temp > 75:
-            node.status = "CRITICAL"
-            create_alert(node, "pump", "high",
-                f"Motor overheating: {motor_temp:.1f}°C (critical > 75°C)")
-        elif motor_temp is not None and motor_temp > 65:
-            node.status = "WARNING"
-            create_alert(node, "pump", "medium",
-                f"Motor running hot: {motor_temp:.1f}°C (warning > 65°C)")
-
-        # 4) Voltage issues
-        if voltage is not None and (voltage < 200 or voltage > 250):
-            node.status = "WARNING"
-            create_alert(node, "pump", "medium",
-                f"Abnormal voltage: {voltage:.1f}V (safe: 220-240V)")
-
-        # 5) Leak detection (flow drop + pressure loss)
-        if leak_indicator == 1 or leak_score > 70:
-            node.status = "CRITICAL"
-            create_alert(node, "leak", "high",
-                f"LEAK DETECTED: Score={leak_score:.0f}%, Flow indicator={leak_indicator}")
-
-        # 6) High pump running hours (predictive maintenance)
-        if pump_hours > 450:
-            node.status = "WARNING"
-            create_alert(node, "pump", "medium",
-                f"Pump service due: {pump_hours:.0f} hours (service every 300-400h)")
-
-    # =====================================================
-    # CATEGORY 1 & 2: TANK RULES
-    # =====================================================
-    if node.type == "tank":
-        level = m.get("tankLevel")
-        overflow = m.get("tankOverflow", 0)
-        overflow_count = m.get("overflowAlerts", 0)
-        filling_delays = m.get("unexpectedFillingDelays", 0)
-        emptiness_hours = m.get("tankEmptinessHours", 0)
-
-        # 1) Critically low level
-        if level is not None and level < 15:
-            node.status = "CRITICAL"
-            create_alert(node, "tank", "high",
-                f"CRITICAL: Tank level {level:.1f}% - Risk of supply interruption!")
-
-        # 2) Very low level
-        elif level is not None and level < 25:
-            node.status = "WARNING"
-            create_alert(node, "tank", "medium",
-                f"Tank level low: {level:.1f}% - Monitor closely")
 
-        # 3) Overflow situation
-        if level is not None and level > 95:
-            node.status = "WARNING"
-            create_alert(node, "tank", "medium",
-                f"Tank near overflow: {level:.1f}% - Check intake valve")
+QUALITY_ISSUE_TEXT = {
+    "ph": "pH={:.2f} (normal: 6.5-8.5)",
+    "turbidity": "Turbidity={:.2f} NTU (max: 1-5)",
+    "tds": "TDS={:.0f} mg/L (max: 500-1000)",
+    "freeChlorine": "Chlorine={:.2f} mg/L (safe: 0.2-0.8)",
+    "iron": "Iron={:.3f} mg/L (max: 0.3)",
+    "fluoride": "Fluoride={:.2f} mg/L (max: 1.5)",
+    "nitrate": "Nitrate={:.1f} mg/L (max: 45)",
+    "hardness": "Hardness={:.0f} mg/L (max: 600)",
+}
 
-        # 4) Explicit overflow flag
-        if overflow == 1:
-            node.status = "WARNING"
-            create_alert(node, "tank", "medium",
-                f"OVERFLOW ALERT: Tank overflow detected - {overflow_count} this week")
 
-        # 5) Unexpected filling delays (predictive)
-        if filling_delays > 2:
-            node.status = "WARNING"
-            create_alert(node, "tank", "medium",
-                f"Filling delays detected: {filling_delays} times - Check pump/pipes")
+def _quality_issues(m: Dict[str, float]) -> str:
+    failed = {}
+    for rule_id, _, clauses, _ in rules.LIVE_RULES["tap"]:
+        if rule_id == "tap.quality_failed":
+            failed = {c[0]: None for c in clauses if rules.clause_holds(m, c)}
+    return " | ".join(QUALITY_ISSUE_TEXT.get(name, name + "={:.2f}").format(m[name]) for name in failed)
 
-        # 6) Tank empty for too long
-        if emptiness_hours > 10:
-            node.status = "CRITICAL"
-            create_alert(node, "tank", "high",
-                f"Tank empty for {emptiness_hours:.1f} hours - Supply interrupted!")
 
-    # =====================================================
+# What apply_rules does when a rule of rules.RULES fires: node status, alert type, message.
+RULE_ACTIONS: Dict[str, Tuple[str, str, Callable[[Dict[str, float]], str]]] = {
+    # CATEGORY 1 & 2: PUMP RULES (Infrastructure + Operational)
+    "pump.dry_run": ("CRITICAL", "pump", lambda m:
+        f"Possible dry-run: High power ({m.get('powerConsumption', 0.0):.1f}kW) "
+        f"but low discharge ({m.get('pumpDischargeRate', 0.0):.1f}L/min)"),
+    "pump.efficiency_low": ("WARNING", "pump", lambda m:
+        f"Pump efficiency dropped to {m['pumpEfficiency']:.1f}% (normal: 65-85%)"),
+    "pump.motor_overheat": ("CRITICAL", "pump", lambda m:
+        f"Motor overheating: {m['motorTemperature']:.1f}°C (critical > {_limit('pump.motor_overheat'):g}°C)"),
+    "pump.motor_hot": ("WARNING", "pump", lambda m:
+        f"Motor running hot: {m['motorTemperature']:.1f}°C (warning > {_limit('pump.motor_hot'):g}°C)"),
+    "pump.voltage_abnormal": ("WARNING", "pump", lambda m:
+        f"Abnormal voltage: {m['voltage']:.1f}V (safe: 220-240V)"),
+    "pump.leak": ("CRITICAL", "leak", lambda m:
+        f"LEAK DETECTED: Score={m.get('leakProbabilityScore', 0):.0f}%, "
+        f"Flow indicator={m.get('flowDropIndicator', 0)}"),
+    "pump.service_due": ("WARNING", "pump", lambda m:
+        f"Pump service due: {m['pumpRunningHours']:.0f} hours (service every 300-400h)"),
+    # CATEGORY 1 & 2: TANK RULES
+    "tank.level_critical": ("CRITICAL", "tank", lambda m:
+        f"CRITICAL: Tank level {m['tankLevel']:.1f}% - Risk of supply interruption!"),
+    "tank.level_low": ("WARNING", "tank", lambda m:
+        f"Tank level low: {m['tankLevel']:.1f}% - Monitor closely"),
+    "tank.near_overflow": ("WARNING", "tank", lambda m:
+        f"Tank near overflow: {m['tankLevel']:.1f}% - Check intake valve"),
+    "tank.overflow": ("WARNING", "tank", lambda m:
+        f"OVERFLOW ALERT: Tank overflow detected - {m.get('overflowAlerts', 0)} this week"),
+    "tank.filling_delay": ("WARNING", "tank", lambda m:
+        f"Filling delays detected: {m['unexpectedFillingDelays']} times - Check pump/pipes"),
+    "tank.empty_too_long": ("CRITICAL", "tank", lambda m:
+        f"Tank empty for {m['tankEmptinessHours']:.1f} hours - Supply interrupted!"),
     # CATEGORY 1, 2 & 3: VALVE & PIPE RULES
-    # =====================================================
-    if node.type == "valve":
-        valve_status = m.get("valveOpenClosedStatus", 0)
-        faulty = m.get("faultyValveDetection", 0)
-        leakage = m.get("valveLeakage", 0)
-        operation_count = m.get("valveOperationCount", 0)
-
-        # 1) Faulty valve detection
-        if faulty == 1:
-            node.status = "CRITICAL"
-            create_alert(node, "pump", "high",
-                f"FAULTY VALVE: Increased operations ({operation_count}) - Valve likely jammed")
-
-        # 2) Valve leakage
-        if leakage > 5:
-            node.status = "WARNING"
-            create_alert(node, "leak", "medium",
-                f"Valve leakage: {leakage:.1f} L/h - Replacement recommended")
-
-        # 3) Excessive valve operations (indicating instability)
-        if operation_count > 40:
-            node.status = "WARNING"
-            create_alert(node, "pump", "medium",
-                f"Excessive valve operations: {operation_count}/week - Check control system")
-
-    # =====================================================
+    "valve.faulty": ("CRITICAL", "pump", lambda m:
+        f"FAULTY VALVE: Increased operations ({m.get('valveOperationCount', 0)}) - Valve likely jammed"),
+    "valve.leakage": ("WARNING", "leak", lambda m:
+        f"Valve leakage: {m['valveLeakage']:.1f} L/h - Replacement recommended"),
+    "valve.excessive_operations": ("WARNING", "pump", lambda m:
+        f"Excessive valve operations: {m['valveOperationCount']}/week - Check control system"),
     # CATEGORY 3: WATER QUALITY RULES (Tap/Quality Node)
-    # =====================================================
-    if node.type == "tap":
-        ph = m.get("ph")
-        turbidity = m.get("turbidity")
-        tds = m.get("tds")
-        chlorine = m.get("freeChlorine")
-        iron = m.get("iron")
-        fluoride = m.get("fluoride")
-        nitrate = m.get("nitrate")
-        hardness = m.get("hardness")
-        ec = m.get("EC")
-        compliance = m.get("waterQualityCompliancePercent", 100)
-
-        quality_issues = []
-
-        # CORE PARAMETERS (BIS Standards)
-        if ph is not None and (ph < 6.5 or ph > 8.5):
-            quality_issues.append(f"pH={ph:.2f} (normal: 6.5-8.5)")
-
-        if turbidity is not None and turbidity > 5:
-            quality_issues.append(f"Turbidity={turbidity:.2f} NTU (max: 1-5)")
-
-        if tds is not None and tds > 1000:
-            quality_issues.append(f"TDS={tds:.0f} mg/L (max: 500-1000)")
-
-        if chlorine is not None and (chlorine < 0.2 or chlorine > 0.8):
-            quality_issues.append(f"Chlorine={chlorine:.2f} mg/L (safe: 0.2-0.8)")
-
-        # ADVANCED PARAMETERS
-        if iron is not None and iron > 0.3:
-            quality_issues.append(f"Iron={iron:.3f} mg/L (max: 0.3)")
+    "tap.coliform": ("CRITICAL", "quality", lambda m:
+        "🚨 COLIFORM DETECTED - MICROBIAL CONTAMINATION - WATER NOT SAFE!"),
+    "tap.quality_failed": ("CRITICAL", "quality", lambda m:
+        f"Water quality FAILED: {_quality_issues(m)}"),
+    "tap.compliance_low": ("WARNING", "quality", lambda m:
+        f"Water quality compliance: {m.get('waterQualityCompliancePercent', 100):.0f}% (target: >90%)"),
+}
 
-        if fluoride is not None and fluoride > 1.5:
-            quality_issues.append(f"Fluoride={fluoride:.2f} mg/L (max: 1.5)")
 
-        if nitrate is not None and nitrate > 45:
-            quality_issues.append(f"Nitrate={nitrate:.1f} mg/L (max: 45)")
+def apply_rules(node: Node):
+    """
+    Comprehensive rule-based anomaly detection across all 5 categories.
+    Which rules fire is decided by rules.RULES - the table rule backtests
+    replay - and RULE_ACTIONS says what each one does. As before, the last
+    rule to fire sets the node status.
+    """
+    m = node.latest_metrics
+    node.status = "OK"
+    for rule_id in rules.matching(node.type, m):
+        status, alert_type, message = RULE_ACTIONS[rule_id]
+        node.status = status
+        create_alert(node, alert_type, rules.RULES[rule_id]["severity"], message(m), rule=rule_id)
+
+
+def scheme_quality_report(scheme_id: str) -> Dict[str, Any]:
+    taps = [n for n in NODES.values() if n.scheme_id == scheme_id and n.type == "tap"]
+    now = time.time()
+    return {
+        "schemeId": scheme_id,
+        "limits": quality.QUALITY_LIMITS,
+        "windows": QUALITY_COMPLIANCE.report(("scheme", scheme_id), now),
+        "taps": [
+            {"nodeId": tap.id, "name": tap.name, "windows": QUALITY_COMPLIANCE.report(("tap", tap.id), now)}
+            for tap in taps
+        ],
+    }
+
+
+def record_quality_sample(node: Node, metrics_in: Dict[str, float], ts: datetime):
+    """
+    Count a tap reading towards the server-side compliance windows and replace
+    the device-reported waterQualityCompliancePercent with the 24h figure, so
+    apply_rules (and the dashboard) use the audited number.
+    """
+    compliance = QUALITY_COMPLIANCE.record(node.id, node.scheme_id, metrics_in, ts)
+    if compliance is None:
+        node.latest_metrics.pop("waterQualityCompliancePercent", None)
+    else:
+        node.latest_metrics["waterQualityCompliancePercent"] = compliance
 
-        if hardness is not None and hardness > 600:
-            quality_issues.append(f"Hardness={hardness:.0f} mg/L (max: 600)")
 
-        # MICROBIAL CONTAMINATION (CRITICAL)
-        if coliform is not None and coliform == 1:
-            node.status = "CRITICAL"
-            create_alert(node, "quality", "high",
-                "🚨 COLIFORM DETECTED - MICROBIAL CONTAMINATION - WATER NOT SAFE!")
+def update_derived_state(node: Node, metrics_in: Dict[str, float], ts: datetime):
+    """
+    Feed one reading to the incremental (per-reading O(1)) analytics engines.
+    Runs after apply_rules so it can only raise, never clear, node status.
+    """
+    if node.type == "tank" and "tankLevel" in metrics_in:
+        forecast, new_warning = TANK_FORECASTS.update(node.id, ts, metrics_in["tankLevel"])
+        if forecast is not None:
+            node.forecast = forecast
+        if new_warning == "empty":
+            if node.status == "OK":
+                node.status = "WARNING"
+            create_alert(node, "tank", "medium",
+                f"Forecast: tank falling {-forecast['rate_pct_per_hour']:.1f}%/h, "
+                f"reaches {forecasting.CRITICAL_LEVEL:.0f}% in ~{forecast['time_to_critical_hours']:.1f}h",
+                rule="tank.forecast_empty")
+        elif new_warning == "overflow":
+            if node.status == "OK":
+                node.status = "WARNING"
+            create_alert(node, "tank", "medium",
+                f"Forecast: tank rising {forecast['rate_pct_per_hour']:.1f}%/h, "
+                f"overflows in ~{forecast['time_to_overflow_hours'] * 60:.0f} min",
+                rule="tank.forecast_overflow")
+
+    if node.type in ("pump", "valve"):
+        due = MAINTENANCE.update(node.id, node.type, ts, metrics_in)
+        if due is not None:
+            create_alert(node, node.type, "medium",
+                f"Maintenance due in ~{due['rul_days']:.1f} days (stress x{due['stress']:.2f})",
+                rule=f"{node.type}.maintenance_due")
+
+    # one integration per reading (in the maintenance engine) feeds every pump total
+    usage = MAINTENANCE.usage(node.id) if node.type == "pump" else None
+    if usage is not None:
+        running_hours, litres, energy_kwh = usage
+        HIERARCHY.pump_usage(node.id, node.scheme_id, ts, running_hours, litres)
+        SNAPSHOTS.pump_energy(node.scheme_id, node.id, ts, node.latest_metrics.get("powerConsumption"), energy_kwh)
+
+    if node.type in ("pump", "tank"):
+        events = WATER_BALANCE.update(node.scheme_id, node.id, node.type, ts, metrics_in,
+                                      usage[1] if usage is not None else None)
+        for event in events:
+            if event["kind"] == "nrw_high":
+                create_alert(node, "leak", "high",
+                    f"{event['schemeId']}: non-revenue water {event['nrw_percent']:.0f}% on {event['day']} "
+                    f"({event['nrw_litres']:.0f} L unaccounted)",
+                    rule="scheme.nrw_high")
+            else:
+                create_alert(node, "leak", "medium",
+                    f"{event['schemeId']}: non-revenue water rising - {event['nrw_percent_7d']:.0f}% over 7 days "
+                    f"vs {event['nrw_percent_baseline']:.0f}% before",
+                    rule="scheme.nrw_rising")
 
-        # Report quality issues
-        if quality_issues:
-            node.status = "CRITICAL"
-            msg = " | ".join(quality_issues)
-            create_alert(node, "quality", "high",
-                f"Water quality FAILED: {msg}")
 
-        # Compliance tracking
-        if compliance < 80:
-            node.status = "WARNING"
-            create_alert(node, "quality", "medium",
-                f"Water quality compliance: {compliance:.0f}% (target: >90%)")
+# ---------- API endpoints ----------
 
 
-# ---------- API endpoints ----------
+def _json_list(endpoint: str, items) -> JSONResponse:
+    """
+    A list of models as a JSON response, rendered here so SERIALIZATION_LATENCY
+    times the whole encoding, down to the response body bytes.
+    """
+    with SERIALIZATION_LATENCY.labels(endpoint).time():
+        return JSONResponse(jsonable_encoder([item.model_dump() for item in items]))
 
 
 @app.get("/api/health")
@@ -298,49 +518,792 @@ def health():
     return {"status": "ok", "nodes": len(NODES), "alerts": len(ALERTS)}
 
 
+@app.get("/metrics", dependencies=[Depends(require_role("monitor", "admin"))])
+def get_metrics():
+    """
+    Prometheus scrape endpoint. Scrapers authenticate with a monitor token
+    (``python auth.py monitor-token <name>``).
+    """
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/nodes")
 def get_nodes():
     """
     Used by frontend to display node list and latest metrics.
     """
-    return [n.dict() for n in NODES.values()]
+    with profiling.stage("handler"):
+        return _json_list("nodes", NODES.values())
 
 
 @app.get("/api/alerts")
 def get_alerts(only_open: bool = Query(False, description="Filter only open alerts")):
-    if only_open:
-        data = [a for a in ALERTS if not a.acknowledged]
-    else:
-        data = ALERTS
-    return [a.dict() for a in data]
+    data = ALERTS.values(only_open)
+    with profiling.stage("handler"):
+        return _json_list("alerts", data)
 
 
-@app.post("/api/alerts/{alert_id}/ack")
+@app.post("/api/alerts/{alert_id}/ack", dependencies=[Depends(require_operator)])
 def ack_alert(alert_id: int):
-    for alert in ALERTS:
-        if alert.id == alert_id:
-            alert.acknowledged = True
-            return {"status": "acknowledged"}
-    raise HTTPException(status_code=404, detail="Alert not found")
+    alert = ALERTS.get(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    if ALERTS.acknowledge(alert):
+        node = NODES.get(alert.node_id)
+        if node is not None:
+            SNAPSHOTS.alert_closed(node.scheme_id, alert.id)
+            HIERARCHY.alert_closed(node.scheme_id, alert.severity)
+    return {"status": "acknowledged"}
+
+
+@app.get("/api/alerts/archive", dependencies=[Depends(current_claims)])
+def get_archived_alerts(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    node_id: Optional[str] = None,
+    rule: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=alert_store.MAX_ARCHIVE_RESULTS),
+):
+    """
+    Alerts moved out of memory by the retention policy, oldest first.
+    Only the day partitions overlapping [start, end) are read.
+    """
+    start = start.replace(tzinfo=timezone.utc) if start and start.tzinfo is None else start
+    end = end.replace(tzinfo=timezone.utc) if end and end.tzinfo is None else end
+
+    def matches(record: Dict[str, Any]) -> bool:
+        return (node_id is None or record["node_id"] == node_id) and (rule is None or record["rule"] == rule)
+
+    with profiling.stage("handler"):
+        return list(ALERTS.archive.query(start, end, matches, limit))
+
+
+def _admission_source(principal: Dict[str, Any], request: Request) -> str:
+    """The sender a reading's token bucket belongs to."""
+    if principal is ANONYMOUS:
+        return f"addr:{request.client.host if request.client else 'unknown'}"
+    return f"{principal['role']}:{principal['sub']}"
 
 
 @app.post("/api/telemetry")
-def ingest_telemetry(payload: TelemetryIn):
+async def ingest_telemetry(
+    payload: TelemetryIn, request: Request, principal: Dict[str, Any] = Depends(ingest_principal)
+):
     """
     This is what the simulator (or real IoT gateway) will call.
+
+    Validation and admission run on the event loop, before the reading holds
+    a worker thread. Critical readings are then processed on the reserved
+    CRITICAL_INGEST threads, routine ones in the shared threadpool, so a
+    critical reading never queues for a thread behind routine work and never
+    blocks the event loop on a lock.
     """
-    node = NODES.get(payload.nodeId)
-    if not node:
-        raise HTTPException(status_code=404, detail="Unknown nodeId")
+    with profiling.stage("handler"):
+        if principal["role"] == "device" and principal["sub"] != payload.nodeId:
+            raise HTTPException(status_code=403, detail="Device key does not match nodeId")
+        node = NODES.get(payload.nodeId)
+        if not node:
+            INGEST_REQUESTS.labels("unknown", "unknown_node").inc()
+            raise HTTPException(status_code=404, detail="Unknown nodeId")
+
+        with profiling.stage("validate", node.type):
+            clean, rejected = telemetry_schema.validate(node.type, payload.metrics)
+        if rejected and (telemetry_schema.STRICT or not clean):
+            INGEST_REQUESTS.labels(node.type, "invalid").inc()
+            raise HTTPException(status_code=422, detail={"rejected": rejected})
+        payload.metrics = clean
+
+        # stamp on arrival so deferred readings keep their real time; device
+        # times are UTC and never more than MAX_FUTURE ahead
+        payload.timestamp = telemetry_schema.reading_time(node.type, payload.timestamp, datetime.now(timezone.utc))
+        priority = admission.classify(node.type, payload.metrics)
+        decision = INGEST_ADMISSION.admit(_admission_source(principal, request), node.id, priority, payload)
+        if decision == admission.COALESCED:
+            INGEST_REQUESTS.labels(node.type, "coalesced").inc()
+            return JSONResponse(
+                status_code=202,
+                content={"status": "deferred", "nodeId": node.id, "priority": priority,
+                         **({"rejected": rejected} if rejected else {})},
+            )
+        if decision == admission.SHED:
+            INGEST_REQUESTS.labels(node.type, "shed").inc()
+            raise HTTPException(
+                status_code=429, detail="Ingest overloaded, retry later", headers={"Retry-After": "1"}
+            )
+
+        try:
+            if priority == admission.CRITICAL:
+                # carry the request context (profiling stages) onto the reserved thread
+                await asyncio.get_running_loop().run_in_executor(
+                    CRITICAL_INGEST, contextvars.copy_context().run, process_telemetry, payload
+                )
+            else:
+                await run_in_threadpool(process_telemetry, payload)
+        finally:
+            INGEST_ADMISSION.release()
+        return {
+            "status": "ingested",
+            "nodeId": node.id,
+            "timestamp": payload.timestamp.isoformat(),
+            "priority": priority,
+            **({"rejected": rejected} if rejected else {}),
+        }
+
+
+def process_telemetry(payload: TelemetryIn):
+    """
+    Apply an admitted reading: update the node, run the rules and refresh
+    derived state. Also called by the admission drainer for deferred readings.
+    A reading older than the node's last one - a deferred reading overtaken
+    by a newer one admitted directly - is only archived.
+    """
+    node = NODES[payload.nodeId]
+    with NODE_LOCKS[node.id]:
+        if node.last_updated is not None and payload.timestamp < node.last_updated:
+            HEARTBEATS.touch(node.id, node.type)
+            TELEMETRY_ARCHIVE.append(node.id, node.type, node.scheme_id, payload.timestamp, payload.metrics)
+            INGEST_REQUESTS.labels(node.type, "stale").inc()
+            return
+        _apply_telemetry(node, payload)
 
-    ts = payload.timestamp or datetime.now(timezone.utc)
+
+def _apply_telemetry(node: Node, payload: TelemetryIn):
+    start = time.perf_counter()
+    ts = payload.timestamp
 
     # update node's latest metrics
     node.latest_metrics.update(payload.metrics)
     node.last_updated = ts
+    HEARTBEATS.touch(node.id, node.type)
+    if node.type == "tap":
+        with profiling.stage("quality_compliance"):
+            record_quality_sample(node, payload.metrics, ts)
 
     # run rules / basic anomaly detection
-    apply_rules(node)
+    try:
+        with profiling.stage("apply_rules", node.type), RULES_LATENCY.labels(node.type).time():
+            apply_rules(node)
+        with profiling.stage("derived_state", node.type):
+            update_derived_state(node, payload.metrics, ts)
+        with profiling.stage("snapshot"):
+            SNAPSHOTS.update_node(node)
+        HIERARCHY.node_changed(node.id, node.scheme_id, node.status)
+        TELEMETRY_ARCHIVE.append(node.id, node.type, node.scheme_id, ts, payload.metrics)
+    except Exception:
+        INGEST_REQUESTS.labels(node.type, "error").inc()
+        raise
+
+    INGEST_REQUESTS.labels(node.type, "ingested").inc()
+    INGEST_LATENCY.labels(node.type).observe(time.perf_counter() - start)
+
+
+def _submit_control(node_id: str, node_type: str, device: str, allowed: set, body: ControlIn):
+    node = NODES.get(node_id)
+    if not node or node.type != node_type:
+        raise HTTPException(status_code=404, detail=f"Unknown {node_type}")
+    action = body.action.upper()
+    if action not in allowed:
+        raise HTTPException(
+            status_code=422, detail=f"action must be one of {sorted(allowed)}"
+        )
+    return COMMANDS.submit(node.id, device, action, body.metadata).dict()
+
+
+@app.post("/api/pumps/{pump_id}/control", status_code=202, dependencies=[Depends(require_operator)])
+def control_pump(pump_id: str, body: ControlIn):
+    """
+    Queue a START/STOP command for the pump. Returns immediately; poll
+    /api/commands/{id} for the device acknowledgement.
+    """
+    return _submit_control(pump_id, "pump", "PUMP", PUMP_ACTIONS, body)
+
+
+@app.post("/api/valves/{valve_id}/control", status_code=202, dependencies=[Depends(require_operator)])
+def control_valve(valve_id: str, body: ControlIn):
+    return _submit_control(valve_id, "valve", "VALVE", VALVE_ACTIONS, body)
+
+
+@app.get("/api/commands", dependencies=[Depends(current_claims)])
+def get_pending_commands(node_id: Optional[str] = None):
+    return [c.dict() for c in COMMANDS.pending(node_id)]
+
+
+@app.get("/api/commands/stats")
+def get_command_stats():
+    return COMMANDS.stats()
+
+
+@app.get("/api/commands/{command_id}", dependencies=[Depends(current_claims)])
+def get_command(command_id: str):
+    command = COMMANDS.get(command_id)
+    if command is None:
+        raise HTTPException(status_code=404, detail="Command not found")
+    return command.dict()
+
+
+@app.post(
+    "/api/commands/{command_id}/ack",
+    dependencies=[Depends(require_role("gateway", "technician", "admin"))],
+)
+def ack_command(command_id: str, body: CommandAckIn):
+    """
+    HTTP fallback for gateways that cannot publish acks over MQTT.
+    """
+    if body.status.upper() not in commands.ACK_STATES:
+        raise HTTPException(status_code=422, detail=f"status must be one of {list(commands.ACK_STATES)}")
+    command = COMMANDS.acknowledge(command_id, body.status, body.reason, body.nodeId)
+    if command is None:
+        raise HTTPException(status_code=404, detail="No pending command with that id for that node")
+    return command.dict()
+
+
+@app.get("/api/tanks/{tank_id}/forecast")
+def get_tank_forecast(tank_id: str):
+    """
+    Online level trend for a tank: fill/drain rate and predicted hours until
+    the critical level, empty and overflow.
+    """
+    node = NODES.get(tank_id)
+    if not node or node.type != "tank":
+        raise HTTPException(status_code=404, detail="Unknown tank")
+    if node.forecast is None:
+        raise HTTPException(status_code=404, detail="Not enough readings for a forecast yet")
+    return {"nodeId": node.id, **node.forecast}
+
+
+@app.get("/api/schemes/{scheme_id}/quality")
+def get_scheme_quality(scheme_id: str):
+    """
+    Water-quality compliance for a scheme and each of its taps over the
+    24h / 7d / 30d windows, computed from the individual parameter checks.
+    """
+    if not any(n.scheme_id == scheme_id for n in NODES.values()):
+        raise HTTPException(status_code=404, detail="Unknown scheme")
+    return scheme_quality_report(scheme_id)
+
+
+# ---------- Lab results ----------
+
+
+def _finish_lab_upload(summaries: Dict[str, lab_results.TapSummary], compliance: Dict[str, Optional[float]]):
+    """Run the rules once per tap that received samples, on its newest one."""
+    for tap_id, summary in summaries.items():
+        node = NODES[tap_id]
+        ts, metrics_in = summary.latest
+        with NODE_LOCKS[node.id]:
+            if node.last_updated is None or ts >= node.last_updated:
+                node.latest_metrics.update(metrics_in)
+                node.last_updated = ts
+            if compliance.get(tap_id) is None:
+                node.latest_metrics.pop("waterQualityCompliancePercent", None)
+            else:
+                node.latest_metrics["waterQualityCompliancePercent"] = compliance[tap_id]
+            apply_rules(node)
+            if summary.failed:
+                params = ", ".join(sorted(summary.failed_parameters))
+                create_alert(node, "quality", "high" if summary.coliform else "medium",
+                    f"Lab results: {summary.failed} of {summary.samples} samples outside limits ({params})",
+                    rule="tap.lab_failed")
+            SNAPSHOTS.update_node(node)
+            HIERARCHY.node_changed(node.id, node.scheme_id, node.status)
+
+
+@app.post("/api/schemes/{scheme_id}/quality/upload", dependencies=[Depends(require_operator)])
+def upload_lab_results(scheme_id: str, file: UploadFile = File(...)):
+    """
+    Bulk import of lab test results (CSV: tapId, sampledAt, one column per
+    parameter). The file is streamed row by row; compliance and the archive
+    are updated per batch, the rules once per tap. Returns a row-level
+    error report.
+    """
+    if file.filename and file.filename.lower().endswith((".xlsx", ".xls")):
+        raise HTTPException(status_code=415, detail="Excel workbooks are not supported; export the sheet as CSV")
+    taps = {n.id for n in NODES.values() if n.type == "tap" and n.scheme_id == scheme_id}
+    if not taps:
+        raise HTTPException(status_code=404, detail="Unknown scheme or scheme has no taps")
+    compliance: Dict[str, Optional[float]] = {}
+
+    def apply_batch(batch: Dict[str, List[lab_results.Sample]]):
+        for tap_id, samples in batch.items():
+            node = NODES[tap_id]
+            compliance[tap_id] = QUALITY_COMPLIANCE.record_many(
+                tap_id, node.scheme_id, [(ts.timestamp(), checks) for ts, _, checks in samples])
+            TELEMETRY_ARCHIVE.append_many(
+                node.id, node.type, node.scheme_id, [(ts, values) for ts, values, _ in samples])
+
+    try:
+        report, summaries = lab_results.import_csv(file.file, taps, apply_batch)
+    except lab_results.UploadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    _finish_lab_upload(summaries, compliance)
+    return {"schemeId": scheme_id, **report}
+
+
+@app.get("/api/schemes/{scheme_id}/snapshot")
+def get_scheme_snapshot(
+    scheme_id: str,
+    fields: Optional[str] = Query(
+        None, description=f"Comma-separated sections to include: {','.join(snapshot.SECTIONS)}"
+    ),
+):
+    """
+    Everything a scheme dashboard needs in one round trip, served from the
+    incrementally maintained snapshot view.
+    """
+    selected = None
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(selected) - set(snapshot.SECTIONS)
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown fields: {sorted(unknown)}")
+    body = SNAPSHOTS.render(scheme_id, selected)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Unknown scheme")
+    return Response(content=body, media_type="application/json")
+
+
+def _known_node_ids(node_ids: Optional[List[str]]) -> Optional[List[str]]:
+    """Node ids from a request, which name archive directories: only configured nodes."""
+    unknown = [node_id for node_id in node_ids or () if node_id not in NODES]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown nodeId: {unknown[0]}")
+    return node_ids
+
+
+@app.get("/api/telemetry/export")
+def export_telemetry(
+    scheme_id: Optional[str] = None,
+    node_id: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    metrics_wanted: Optional[str] = Query(None, alias="metrics", description="Comma-separated metric names"),
+    _: Dict[str, Any] = Depends(require_role("researcher", "admin")),
+):
+    """
+    Bulk raw-telemetry export from the sealed columnar segments, streamed as
+    CSV. Readings still in the write buffer (up to SEAL_INTERVAL old) are not
+    included. Without ?metrics= every metric present in the range is exported.
+    """
+    start = start.replace(tzinfo=timezone.utc) if start and start.tzinfo is None else start
+    end = end.replace(tzinfo=timezone.utc) if end and end.tzinfo is None else end
+    filters = {"node_ids": _known_node_ids(node_id), "scheme_id": scheme_id, "start": start, "end": end}
+    if metrics_wanted:
+        names = [name.strip() for name in metrics_wanted.split(",") if name.strip()]
+    else:
+        names = sorted({c for seg in TELEMETRY_READER.segments(**filters) for c in seg.columns})
+    return StreamingResponse(
+        TELEMETRY_READER.iter_csv(names, **filters),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=telemetry.csv"},
+    )
+
+
+@app.get("/api/telemetry/schema/{node_type}")
+def get_telemetry_schema(node_type: str):
+    """
+    Metrics a node type may report, with units, accepted ranges and aliases.
+    """
+    schema = telemetry_schema.describe(node_type)
+    if schema is None:
+        raise HTTPException(status_code=404, detail="Unknown node type")
+    return schema
+
+
+# ---------- Rule backtesting ----------
 
-    return {"status": "ingested", "nodeId": node.id, "timestamp": ts.isoformat()}
 
+@app.get("/api/rules")
+def get_rules():
+    """
+    The live alert rules as data, in the format /api/rules/backtest accepts.
+    """
+    return rules.RULES
+
+
+@app.post("/api/rules/backtest")
+def backtest_rules(
+    body: BacktestIn,
+    _: Dict[str, Any] = Depends(require_role("technician", "researcher", "admin")),
+):
+    """
+    Evaluate a candidate rule set against the archived telemetry (default:
+    the last 30 days) and diff its alerts against the live rules.
+    """
+    try:
+        candidate = backtest.candidate_rules(body.rules, body.thresholds)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    end = body.end or datetime.now(timezone.utc)
+    start = body.start or end - timedelta(days=30)
+    start = start.replace(tzinfo=timezone.utc) if start.tzinfo is None else start
+    end = end.replace(tzinfo=timezone.utc) if end.tzinfo is None else end
+    return backtest.run(candidate, TELEMETRY_READER, node_ids=_known_node_ids(body.node_ids),
+                        scheme_id=body.scheme_id, start=start, end=end)
+
+
+@app.get("/api/water-balance")
+def get_fleet_water_balance():
+    """
+    Produced vs distributed vs stored water for every scheme, worst 7-day
+    non-revenue-water share first.
+    """
+    return WATER_BALANCE.fleet()
+
+
+@app.get("/api/schemes/{scheme_id}/water-balance")
+def get_scheme_water_balance(scheme_id: str):
+    report = WATER_BALANCE.report(scheme_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No water balance for this scheme yet")
+    return report
+
+
+# ---------- Hierarchy rollups ----------
+
+
+def _rollup(path: Tuple[str, ...], children: bool):
+    today = int(time.time() // 86400)
+    rollup = HIERARCHY.get(path, today, children)
+    if rollup is None:
+        raise HTTPException(status_code=404, detail="Unknown " + hierarchy.LEVELS[len(path)])
+    return rollup
+
+
+@app.get("/api/hierarchy")
+def get_state_rollup(children: bool = True):
+    """
+    State-wide KPIs: nodes by status, open alerts by severity, supply hours
+    and water production. With children=true, the same per district.
+    """
+    return _rollup((), children)
+
+
+@app.get("/api/hierarchy/{district}")
+def get_district_rollup(district: str, children: bool = True):
+    return _rollup((district,), children)
+
+
+@app.get("/api/hierarchy/{district}/{block}")
+def get_block_rollup(district: str, block: str, children: bool = True):
+    return _rollup((district, block), children)
+
+
+@app.get("/api/hierarchy/{district}/{block}/{village}")
+def get_village_rollup(district: str, block: str, village: str, children: bool = True):
+    return _rollup((district, block, village), children)
+
+
+@app.get("/api/schemes/{scheme_id}/rollup")
+def get_scheme_rollup(scheme_id: str):
+    rollup = HIERARCHY.scheme(scheme_id, int(time.time() // 86400))
+    if rollup is None:
+        raise HTTPException(status_code=404, detail="Unknown scheme")
+    return rollup
+
+
+# ---------- Maintenance ----------
+
+
+@app.get("/api/maintenance/queue")
+def get_maintenance_queue(
+    limit: int = Query(50, ge=1, le=1000),
+    type: Optional[str] = Query(None, pattern="^(pump|valve)$"),
+):
+    """
+    Pumps and valves ranked by urgency: faulty first, then by estimated
+    remaining useful life in days.
+    """
+    queue = MAINTENANCE.queue(limit, type)
+    for entry in queue:
+        node = NODES.get(entry["nodeId"])
+        if node is not None:
+            entry["name"] = node.name
+            entry["location"] = node.location
+    return queue
+
+
+@app.get("/api/maintenance/{node_id}")
+def get_asset_health(node_id: str):
+    health = MAINTENANCE.get(node_id)
+    if health is None:
+        raise HTTPException(status_code=404, detail="No health data for this node")
+    return health
+
+
+@app.post("/api/maintenance/{node_id}/serviced", dependencies=[Depends(require_operator)])
+def mark_serviced(node_id: str):
+    """
+    Record a completed service: resets accumulated wear for the asset.
+    """
+    health = MAINTENANCE.serviced(node_id)
+    if health is None:
+        raise HTTPException(status_code=404, detail="No health data for this node")
+    return health
+
+
+# ---------- Auth ----------
+
+
+@app.post("/api/auth/login")
+def login(body: LoginIn):
+    try:
+        user = auth.authenticate(body.email, body.password)
+    except auth.AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    token = auth.AUTHORITY.issue(user["email"], user["role"])
+    return {"token": token, "user": auth.public_user(user), "expiresIn": auth.ACCESS_TOKEN_TTL}
+
+
+@app.post("/api/auth/refresh")
+def refresh_token(claims: Dict[str, Any] = Depends(current_claims)):
+    if claims is ANONYMOUS:
+        raise HTTPException(status_code=400, detail="Auth is disabled")
+    auth.AUTHORITY.revoke(claims)
+    token = auth.AUTHORITY.issue(claims["sub"], claims["role"])
+    return {"token": token, "expiresIn": auth.ACCESS_TOKEN_TTL}
+
+
+@app.post("/api/auth/logout")
+def logout(claims: Dict[str, Any] = Depends(current_claims)):
+    if claims is not ANONYMOUS:
+        auth.AUTHORITY.revoke(claims)
+    return {"status": "logged_out"}
+
+
+@app.get("/api/auth/profile")
+def profile(claims: Dict[str, Any] = Depends(current_claims)):
+    user = auth.USERS.get(claims["sub"])
+    if user is None:
+        return {"user": {"id": claims["sub"], "role": claims["role"]}}
+    return {"user": auth.public_user(user)}
+
+
+@app.post("/api/auth/device-keys/{node_id}", dependencies=[Depends(require_admin)])
+def issue_device_key(node_id: str):
+    if node_id not in NODES:
+        raise HTTPException(status_code=404, detail="Unknown nodeId")
+    return {"nodeId": node_id, "deviceKey": auth.AUTHORITY.device_key(node_id)}
+
+
+# ---------- Service requests ----------
+
+SERVICE_REQUESTS = sr.ServiceRequestStore()
+
+
+def _get_request_or_404(request_id: str) -> sr.ServiceRequest:
+    req = SERVICE_REQUESTS.get(request_id)
+    if req is None:
+        raise HTTPException(status_code=404, detail="Service request not found")
+    return req
+
+
+def _check_urgency(urgency: Optional[str]):
+    if urgency is not None and urgency not in sr.URGENCIES:
+        raise HTTPException(status_code=422, detail=f"urgency must be one of {list(sr.URGENCIES)}")
+
+
+def _service_request_filters(
+    status: Optional[str] = None,
+    assignee: Optional[str] = None,
+    node_id: Optional[str] = None,
+    scheme_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    return {
+        "status": status.upper() if status else None,
+        "assignee": assignee,
+        "node_id": node_id,
+        "scheme_id": scheme_id,
+        "created_from": created_from,
+        "created_to": created_to,
+    }
+
+
+@app.post("/api/service-requests", status_code=201, dependencies=[Depends(require_operator)])
+def create_service_request(body: sr.ServiceRequestIn):
+    _check_urgency(body.urgency)
+    return SERVICE_REQUESTS.create(body).dict()
+
+
+@app.get("/api/service-requests", dependencies=[Depends(require_operator)])
+def list_service_requests(
+    filters: Dict[str, Any] = Depends(_service_request_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    return _json_list("service_requests", SERVICE_REQUESTS.query(limit=limit, offset=offset, **filters))
+
+
+@app.get("/api/service-requests/export/csv", dependencies=[Depends(require_operator)])
+def export_service_requests(filters: Dict[str, Any] = Depends(_service_request_filters)):
+    """
+    Streams matching requests as CSV (chunked transfer) without building the
+    file in memory.
+    """
+    return StreamingResponse(
+        SERVICE_REQUESTS.iter_csv(**filters),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=service-requests.csv"},
+    )
+
+
+@app.get("/api/service-requests/statistics")
+def service_request_statistics(
+    scheme_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    verify: bool = Query(False, description="Also compare against a full recompute"),
+):
+    """
+    Dashboard header tiles. Date filters are applied at day granularity.
+    """
+    stats = SERVICE_REQUESTS.statistics(
+        scheme_id=scheme_id,
+        created_from=created_from.date() if created_from else None,
+        created_to=created_to.date() if created_to else None,
+    )
+    if verify:
+        stats["consistency"] = SERVICE_REQUESTS.verify_statistics()
+    return stats
+
+
+@app.get("/api/service-requests/{request_id}", dependencies=[Depends(require_operator)])
+def get_service_request(request_id: str):
+    return _get_request_or_404(request_id).dict()
+
+
+@app.put("/api/service-requests/{request_id}", dependencies=[Depends(require_operator)])
+def update_service_request(request_id: str, body: sr.ServiceRequestUpdate):
+    _check_urgency(body.urgency)
+    return SERVICE_REQUESTS.update(_get_request_or_404(request_id), body).dict()
+
+
+@app.patch("/api/service-requests/{request_id}/status", dependencies=[Depends(require_operator)])
+def update_service_request_status(request_id: str, body: sr.StatusIn):
+    status = body.status.upper()
+    if status not in sr.STATUSES:
+        raise HTTPException(status_code=422, detail=f"status must be one of {list(sr.STATUSES)}")
+    return SERVICE_REQUESTS.set_status(_get_request_or_404(request_id), status, body.notes).dict()
+
+
+@app.post("/api/service-requests/{request_id}/assign", dependencies=[Depends(require_operator)])
+def assign_service_request(request_id: str, body: sr.AssignIn):
+    return SERVICE_REQUESTS.assign(_get_request_or_404(request_id), body.technicianId).dict()
+
+
+@app.post(
+    "/api/service-requests/{request_id}/comments", status_code=201, dependencies=[Depends(require_operator)]
+)
+def comment_service_request(request_id: str, body: sr.CommentIn):
+    return SERVICE_REQUESTS.add_comment(_get_request_or_404(request_id), body.comment, body.author).dict()
+
+
+@app.post("/api/service-requests/{request_id}/rate", dependencies=[Depends(require_operator)])
+def rate_service_request(request_id: str, body: sr.RatingIn):
+    if not 1 <= body.rating <= 5:
+        raise HTTPException(status_code=422, detail="rating must be between 1 and 5")
+    req = _get_request_or_404(request_id)
+    return SERVICE_REQUESTS.rate(req, body.rating, body.feedback).dict()
+
+
+# ---------- Admin: profiling ----------
+
+
+@app.get("/api/admin/profiling", dependencies=[Depends(require_admin)])
+def get_profiling():
+    """
+    Per-route stage aggregates plus the slow-request ring buffer.
+    """
+    return profiling.PROFILER.summary()
+
+
+@app.post("/api/admin/profiling", dependencies=[Depends(require_admin)])
+def configure_profiling(
+    enabled: Optional[bool] = Query(None, description="Turn request profiling on/off"),
+    slow_ms: Optional[float] = Query(None, gt=0, description="Slow-request threshold (ms)"),
+    reset: bool = Query(False, description="Clear collected stats and samples"),
+):
+    profiling.PROFILER.configure(enabled=enabled, slow_ms=slow_ms)
+    if reset:
+        profiling.PROFILER.reset()
+    return {"enabled": profiling.PROFILER.enabled, "slow_ms": profiling.PROFILER.slow_ms}
+
+
+@app.post("/api/admin/profiling/capture", status_code=202, dependencies=[Depends(require_admin)])
+def start_profile_capture(
+    seconds: float = Query(5.0, gt=0, le=profiling.MAX_CAPTURE_SECONDS),
+    interval_ms: float = Query(5.0, ge=1),
+):
+    """
+    Start a short sampling-profiler capture; fetch it with GET when done.
+    """
+    if not profiling.PROFILER.start_capture(seconds, interval_ms):
+        raise HTTPException(status_code=409, detail="A capture is already running")
+    return {"status": "capturing", "seconds": seconds}
+
+
+@app.get("/api/admin/profiling/capture", dependencies=[Depends(require_admin)])
+def get_profile_capture():
+    if profiling.PROFILER.capture_running():
+        return {"status": "capturing"}
+    if profiling.PROFILER.last_capture is None:
+        raise HTTPException(status_code=404, detail="No capture available")
+    return {"status": "done", **profiling.PROFILER.last_capture}
+
+
+# ---------- Admin: ingest admission ----------
+
+
+@app.get("/api/admin/admission", dependencies=[Depends(require_admin)])
+def get_admission_stats():
+    """
+    Ingest admission counters: decisions per priority, deferred and in-flight readings.
+    """
+    return INGEST_ADMISSION.stats()
+
+
+# ---------- Admin: alert retention ----------
+
+
+@app.get("/api/admin/alerts/retention", dependencies=[Depends(require_admin)])
+def get_alert_retention():
+    return ALERTS.stats()
+
+
+@app.post("/api/admin/alerts/compact", dependencies=[Depends(require_admin)])
+def compact_alerts():
+    """
+    Run a retention/compaction pass now instead of waiting for the next one.
+    """
+    return ALERTS.compact()
+
+
+# ---------- Admin: notifications ----------
+
+
+@app.get("/api/admin/notifications", dependencies=[Depends(require_admin)])
+def get_notification_stats():
+    """
+    Subscriptions, queued events, open digests, pending retries and dead-letter count.
+    """
+    return NOTIFIER.stats()
+
+
+# ---------- Admin: telemetry archive ----------
+
+
+@app.post("/api/admin/telemetry/seal", dependencies=[Depends(require_admin)])
+def seal_telemetry():
+    """
+    Seal buffered readings into columnar segments now.
+    """
+    return {"rows_sealed": TELEMETRY_ARCHIVE.seal()}
+
+
+@app.post("/api/admin/telemetry/compact", dependencies=[Depends(require_admin)])
+def compact_telemetry():
+    """
+    Merge each node's sealed segments of finished days into day segments now.
+    """
+    return {"segments_merged": TELEMETRY_ARCHIVE.compact()}
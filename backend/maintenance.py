@@ -0,0 +1,287 @@
+"""
+Predictive maintenance for pumps and valves.
+
+Instead of trusting device counters (pumpRunningHours, valveOperationCount,
+pumpServiceDueDate), each asset's usage is derived from its own readings, one
+reading at a time and in O(1):
+
+- pumps: running hours and start count from the power / discharge signal,
+  energy (kWh) and water pumped (L) by trapezoidal integration, energy per
+  kilolitre, and a fast/slow EWMA of efficiency whose gap is the trend;
+- valves: open/close operations from valveOpenClosedStatus transitions, a
+  7-day ring of daily operation counts, and a leakage EWMA.
+
+Wear accumulates as usage x stress (motor temperature, start frequency and
+efficiency loss for pumps; leakage for valves). Remaining useful life is the
+wear budget left until the service interval divided by the recent wear rate,
+converted to days with the asset's own duty cycle. Each asset's report is
+rebuilt when one of its readings arrives and kept, so ranking the maintenance
+queue only orders the stored reports - no batch job scans raw history.
+"""
+
+import heapq
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+PUMP_SERVICE_HOURS = 500.0     # running hours between services at nominal stress
+VALVE_SERVICE_OPS = 10000.0    # operations between services at nominal stress
+RUNNING_POWER_KW = 0.5         # above this the pump counts as running
+RUNNING_FLOW_LPM = 1.0         # fallback when power is not reported
+MAX_GAP_SECONDS = 600.0        # longer gaps are not integrated (node was offline)
+NOMINAL_STARTS_PER_HOUR = 2.0
+HOT_MOTOR_C = 65.0
+FAST_ALPHA = 0.1
+SLOW_ALPHA = 0.01
+DUE_SOON_DAYS = 7.0            # raise a maintenance alert below this RUL
+
+
+def _ewma(previous: Optional[float], value: float, alpha: float) -> float:
+    return value if previous is None else previous + alpha * (value - previous)
+
+
+class PumpHealth:
+    __slots__ = ("node_id", "last_ts", "first_ts", "running", "power", "discharge",
+                 "running_hours", "starts", "energy_kwh", "litres", "eff_fast", "eff_slow",
+                 "eff_best", "motor_temp", "wear_hours", "stress", "serviced_at")
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.last_ts: Optional[float] = None
+        self.first_ts: Optional[float] = None
+        self.running = False
+        self.power: Optional[float] = None
+        self.discharge: Optional[float] = None
+        self.running_hours = 0.0
+        self.starts = 0
+        self.energy_kwh = 0.0
+        self.litres = 0.0
+        self.eff_fast: Optional[float] = None
+        self.eff_slow: Optional[float] = None
+        self.eff_best: Optional[float] = None
+        self.motor_temp: Optional[float] = None
+        self.wear_hours = 0.0
+        self.stress = 1.0
+        self.serviced_at: Optional[float] = None
+
+    def update(self, ts: float, m: Dict[str, float]):
+        if self.last_ts is not None and ts <= self.last_ts:
+            return
+        power = m.get("powerConsumption", self.power)
+        discharge = m.get("pumpDischargeRate", m.get("flowRate", self.discharge))
+        if power is not None:
+            running = power > RUNNING_POWER_KW
+        else:
+            running = discharge is not None and discharge > RUNNING_FLOW_LPM
+
+        if self.last_ts is None:
+            self.first_ts = ts
+        else:
+            dt = ts - self.last_ts
+            if dt <= MAX_GAP_SECONDS:
+                hours = dt / 3600.0
+                if self.running:
+                    self.running_hours += hours
+                    self.wear_hours += hours * self.stress
+                if power is not None and self.power is not None:
+                    self.energy_kwh += (power + self.power) / 2.0 * hours
+                if discharge is not None and self.discharge is not None:
+                    self.litres += (discharge + self.discharge) / 2.0 * dt / 60.0
+        if running and not self.running:
+            self.starts += 1
+
+        self.running = running
+        self.power = power
+        self.discharge = discharge
+        self.last_ts = ts
+
+        efficiency = m.get("pumpEfficiency")
+        if efficiency is not None:
+            self.eff_fast = _ewma(self.eff_fast, efficiency, FAST_ALPHA)
+            self.eff_slow = _ewma(self.eff_slow, efficiency, SLOW_ALPHA)
+            self.eff_best = self.eff_slow if self.eff_best is None else max(self.eff_best, self.eff_slow)
+        if "motorTemperature" in m:
+            self.motor_temp = _ewma(self.motor_temp, m["motorTemperature"], FAST_ALPHA)
+        self.stress = self._stress()
+
+    def _stress(self) -> float:
+        stress = 1.0
+        if self.motor_temp is not None and self.motor_temp > HOT_MOTOR_C:
+            stress += (self.motor_temp - HOT_MOTOR_C) / 10.0      # +0.1 per degree over
+        if self.running_hours > 1.0:
+            starts_per_hour = self.starts / self.running_hours
+            if starts_per_hour > NOMINAL_STARTS_PER_HOUR:
+                stress += 0.25 * (starts_per_hour / NOMINAL_STARTS_PER_HOUR - 1.0)
+        if self.eff_best and self.eff_fast is not None:
+            stress += max(0.0, (self.eff_best - self.eff_fast) / self.eff_best) * 5.0
+        return stress
+
+    def report(self) -> Dict:
+        elapsed_h = (self.last_ts - self.first_ts) / 3600.0 if self.last_ts and self.first_ts else 0.0
+        duty = self.running_hours / elapsed_h if elapsed_h > 0 else None
+        rul_hours = max(0.0, PUMP_SERVICE_HOURS - self.wear_hours) / self.stress
+        rul_days = rul_hours / (24.0 * duty) if duty else None
+        return {
+            "nodeId": self.node_id,
+            "type": "pump",
+            "running": self.running,
+            "running_hours": round(self.running_hours, 3),
+            "starts": self.starts,
+            "energy_kwh": round(self.energy_kwh, 3),
+            "litres": round(self.litres, 1),
+            "energy_per_kl": round(self.energy_kwh / (self.litres / 1000.0), 4) if self.litres > 0 else None,
+            "efficiency": round(self.eff_fast, 2) if self.eff_fast is not None else None,
+            "efficiency_trend": round(self.eff_fast - self.eff_slow, 3) if self.eff_fast is not None else None,
+            "duty_cycle": round(duty, 3) if duty is not None else None,
+            "stress": round(self.stress, 3),
+            "wear_hours": round(self.wear_hours, 3),
+            "rul_hours": round(rul_hours, 1),
+            "rul_days": round(rul_days, 1) if rul_days is not None else None,
+            "serviced_at": _iso(self.serviced_at),
+        }
+
+    def serviced(self, ts: float):
+        self.wear_hours = 0.0
+        self.eff_best = self.eff_slow
+        self.serviced_at = ts
+
+
+class ValveHealth:
+    __slots__ = ("node_id", "state", "operations", "daily", "day", "first_day", "leakage", "faulty",
+                 "wear_ops", "serviced_at", "last_ts")
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.state: Optional[int] = None
+        self.operations = 0
+        self.daily = [0] * 7       # ring of operations per UTC day
+        self.day: Optional[int] = None
+        self.first_day: Optional[int] = None
+        self.leakage: Optional[float] = None
+        self.faulty = False
+        self.wear_ops = 0.0
+        self.serviced_at: Optional[float] = None
+        self.last_ts: Optional[float] = None
+
+    def _roll(self, day: int):
+        if self.day is None:
+            self.day = self.first_day = day
+        elif day > self.day:
+            for d in range(max(self.day + 1, day - 6), day + 1):
+                self.daily[d % 7] = 0
+            self.day = day
+
+    def update(self, ts: float, m: Dict[str, float]):
+        if self.last_ts is not None and ts <= self.last_ts:
+            return
+        self.last_ts = ts
+        self._roll(int(ts // 86400))
+        if "valveLeakage" in m:
+            self.leakage = _ewma(self.leakage, m["valveLeakage"], FAST_ALPHA)
+        if "faultyValveDetection" in m:
+            self.faulty = m["faultyValveDetection"] == 1
+        state = m.get("valveOpenClosedStatus")
+        if state is not None:
+            state = 1 if state >= 0.5 else 0
+            if self.state is not None and state != self.state:
+                self.operations += 1
+                self.daily[self.day % 7] += 1
+                self.wear_ops += self.stress()
+            self.state = state
+
+    def stress(self) -> float:
+        return 1.0 + (self.leakage / 5.0 if self.leakage else 0.0)
+
+    def report(self) -> Dict:
+        ops_week = sum(self.daily)
+        stress = self.stress()
+        rul_ops = max(0.0, VALVE_SERVICE_OPS - self.wear_ops) / stress
+        # with under a week of history the ring's older days were never observed
+        days = min(7, self.day - self.first_day + 1) if self.day is not None else 7
+        per_day = ops_week / days
+        return {
+            "nodeId": self.node_id,
+            "type": "valve",
+            "operations": self.operations,
+            "operations_7d": ops_week,
+            "leakage": round(self.leakage, 3) if self.leakage is not None else None,
+            "faulty": self.faulty,
+            "stress": round(stress, 3),
+            "wear_ops": round(self.wear_ops, 1),
+            "rul_operations": round(rul_ops, 1),
+            "rul_days": round(rul_ops / per_day, 1) if per_day > 0 else None,
+            "serviced_at": _iso(self.serviced_at),
+        }
+
+    def serviced(self, ts: float):
+        self.wear_ops = 0.0
+        self.leakage = None
+        self.faulty = False
+        self.serviced_at = ts
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts is not None else None
+
+
+def _urgency(report: Dict) -> Tuple:
+    # faulty assets first, then by remaining days (unknown last), then most worn
+    rul = report["rul_days"]
+    return (not report.get("faulty", False), rul if rul is not None else float("inf"), -report["stress"])
+
+
+class MaintenanceEngine:
+    def __init__(self):
+        self._assets: Dict[str, object] = {}
+        self._reports: Dict[str, Dict] = {}   # node id -> report as of its last reading
+        self._due: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def update(self, node_id: str, node_type: str, ts: datetime, metrics_in: Dict[str, float]) -> Optional[Dict]:
+        """
+        Feed one reading. Returns the asset's report when its RUL has just
+        dropped below DUE_SOON_DAYS, else None.
+        """
+        cls = PumpHealth if node_type == "pump" else ValveHealth if node_type == "valve" else None
+        if cls is None:
+            return None
+        with self._lock:
+            asset = self._assets.get(node_id)
+            if asset is None:
+                asset = self._assets[node_id] = cls(node_id)
+            asset.update(ts.timestamp(), metrics_in)
+            report = self._reports[node_id] = asset.report()
+            was_due = self._due.get(node_id, False)
+            self._due[node_id] = due = report["rul_days"] is not None and report["rul_days"] < DUE_SOON_DAYS
+        return dict(report) if due and not was_due else None
+
+    def get(self, node_id: str) -> Optional[Dict]:
+        with self._lock:
+            report = self._reports.get(node_id)
+            return dict(report) if report is not None else None
+
+    def usage(self, node_id: str) -> Optional[Tuple[float, float, float]]:
+        """A pump's cumulative (running hours, litres pumped, kWh)."""
+        with self._lock:
+            asset = self._assets.get(node_id)
+            if not isinstance(asset, PumpHealth):
+                return None
+            return asset.running_hours, asset.litres, asset.energy_kwh
+
+    def serviced(self, node_id: str, ts: Optional[datetime] = None) -> Optional[Dict]:
+        with self._lock:
+            asset = self._assets.get(node_id)
+            if asset is None:
+                return None
+            asset.serviced((ts or datetime.now(timezone.utc)).timestamp())
+            self._due[node_id] = False
+            report = self._reports[node_id] = asset.report()
+            return dict(report)
+
+    def queue(self, limit: int = 50, node_type: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            reports = list(self._reports.values())
+        if node_type is not None:
+            reports = [r for r in reports if r["type"] == node_type]
+        ranked = heapq.nsmallest(limit, reports, key=_urgency)
+        return [dict(report, rank=rank) for rank, report in enumerate(ranked, 1)]
@@ -4,16 +4,33 @@ MQTT Listener for Jalsense - Subscribes to MQTT topics and forwards to FastAPI b
 
 import paho.mqtt.client as mqtt
 import json
+import os
 import requests
 import threading
 import time
 from datetime import datetime
 
+import logs
+import metrics
+
+log = logs.get_logger("mqtt.listener")
+
 MQTT_BROKER = "localhost"
 MQTT_PORT = 1883
 MQTT_TOPIC_PREFIX = "jalsense/nodes"
 BACKEND_URL = "http://localhost:8000"  # FastAPI backend URL
 TELEMETRY_ENDPOINT = f"{BACKEND_URL}/api/telemetry"
+# Gateway token from `python auth.py gateway-token <name>` (backend auth is on by default)
+GATEWAY_TOKEN = os.environ.get("GJJ_GATEWAY_TOKEN")
+AUTH_HEADERS = {"Authorization": f"Bearer {GATEWAY_TOKEN}"} if GATEWAY_TOKEN else {}
+METRICS_PORT = 9101  # Prometheus scrape port for this process
+
+MQTT_MESSAGES = metrics.counter(
+    "gjj_mqtt_messages_total", "MQTT messages handled by the listener", ("outcome",)
+)
+FORWARD_LATENCY = metrics.histogram(
+    "gjj_mqtt_forward_seconds", "Round-trip time of forwarding a message to the backend"
+)
 
 class MQTTListener:
     def __init__(self, broker=MQTT_BROKER, port=MQTT_PORT):
@@ -27,62 +44,83 @@ class MQTTListener:
     
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
-            print(f"✓ Connected to MQTT broker at {self.broker}:{self.port}")
+            log.info("connected to MQTT broker at %s:%s", self.broker, self.port)
             # Subscribe to all nodes
             client.subscribe(f"{MQTT_TOPIC_PREFIX}/#", qos=1)
-            print(f"✓ Subscribed to {MQTT_TOPIC_PREFIX}/#")
+            log.info("subscribed to %s/#", MQTT_TOPIC_PREFIX)
         else:
-            print(f"✗ Failed to connect. Return code: {rc}")
+            log.error("failed to connect, return code %s", rc)
     
     def on_message(self, client, userdata, msg):
+        MQTT_MESSAGES.labels("received").inc()
         try:
             # Decode MQTT message
             payload = json.loads(msg.payload.decode())
-            print(f"📥 Received from {msg.topic}: {payload}")
+            log.debug("received from %s: %s", msg.topic, payload)
             
             # Forward to FastAPI backend
             self.forward_to_backend(payload)
         
         except json.JSONDecodeError:
-            print(f"✗ Invalid JSON received: {msg.payload}")
+            MQTT_MESSAGES.labels("invalid").inc()
+            log.warning("invalid JSON received on %s", msg.topic)
         except Exception as e:
-            print(f"✗ Error processing message: {e}")
+            MQTT_MESSAGES.labels("failed").inc()
+            log.exception("error processing message from %s", msg.topic)
     
     def on_disconnect(self, client, userdata, rc):
         if rc != 0:
-            print(f"⚠ Unexpected disconnection. Return code: {rc}")
+            log.warning("unexpected disconnection, return code %s", rc)
         else:
-            print("✓ Disconnected from MQTT broker")
+            log.info("disconnected from MQTT broker")
     
     def forward_to_backend(self, payload):
         """Send telemetry data to FastAPI backend"""
         try:
-            response = requests.post(
-                TELEMETRY_ENDPOINT,
-                json=payload,
-                timeout=5
-            )
+            with FORWARD_LATENCY.time():
+                response = requests.post(
+                    TELEMETRY_ENDPOINT,
+                    json=payload,
+                    headers=AUTH_HEADERS,
+                    timeout=5
+                )
             
             if response.status_code == 200:
-                print(f"✓ Data forwarded to backend: {response.json()}")
+                MQTT_MESSAGES.labels("forwarded").inc()
+                log.debug("forwarded %s to backend", payload.get("nodeId"))
+            elif response.status_code == 202:
+                # backend is busy and kept this as the node's latest pending reading
+                MQTT_MESSAGES.labels("deferred").inc()
+            elif response.status_code == 429:
+                MQTT_MESSAGES.labels("shed").inc()
+                log.warning("backend shedding load, dropped reading for %s", payload.get("nodeId"),
+                            extra={"rate_key": "shed"})
             else:
-                print(f"✗ Backend returned status {response.status_code}: {response.text}")
+                MQTT_MESSAGES.labels("failed").inc()
+                log.warning(
+                    "backend returned status %s for %s: %.200s",
+                    response.status_code, payload.get("nodeId"), response.text,
+                )
         
         except requests.exceptions.ConnectionError:
-            print(f"✗ Cannot reach backend at {BACKEND_URL}. Make sure FastAPI is running!")
+            MQTT_MESSAGES.labels("failed").inc()
+            log.error("cannot reach backend at %s - is FastAPI running?", BACKEND_URL)
         except Exception as e:
-            print(f"✗ Error forwarding to backend: {e}")
+            MQTT_MESSAGES.labels("failed").inc()
+            log.exception("error forwarding to backend")
     
     def start(self):
         """Start the MQTT listener"""
         try:
-            print("Starting MQTT Listener...")
+            log.info("starting MQTT listener")
+            metrics.start_http_server(METRICS_PORT)
+            log.info("metrics available at http://localhost:%s/metrics", METRICS_PORT)
             self.client.connect(self.broker, self.port, keepalive=60)
             self.running = True
             self.client.loop_forever()
         
         except Exception as e:
-            print(f"✗ Error starting listener: {e}")
+            log.error("error starting listener: %s", e)
             print("\nNote: Make sure you have an MQTT broker running!")
             print("Quick setup options:")
             print("1. Docker: docker run -d -p 1883:1883 eclipse-mosquitto")
@@ -93,7 +131,7 @@ class MQTTListener:
         self.running = False
         self.client.loop_stop()
         self.client.disconnect()
-        print("✓ Listener stopped")
+        log.info("listener stopped")
 
 
 if __name__ == "__main__":
@@ -101,5 +139,6 @@ if __name__ == "__main__":
     print("Jalsense MQTT Listener")
     print("=" * 60)
     
+    logs.setup_logging()
     listener = MQTTListener()
     listener.start()
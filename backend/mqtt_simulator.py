@@ -11,10 +11,16 @@ from datetime import datetime
 import threading
 from typing import Dict
 
+import logs
+
+log = logs.get_logger("mqtt.simulator")
+
 # MQTT Configuration
 MQTT_BROKER = "localhost"  # Change to your MQTT broker IP/hostname
 MQTT_PORT = 1883
 MQTT_TOPIC_PREFIX = "jalsense/nodes"
+COMMAND_TOPIC_PREFIX = "jalsense/commands"
+ACK_TOPIC_PREFIX = "jalsense/acks"
 
 # Simulated Nodes Configuration with Complete Parameter Set
 NODES_CONFIG = {
@@ -148,20 +154,37 @@ class DataSimulator:
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_command
         self.running = False
         self.anomaly_modes = {}  # Track anomalies per node
         
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
-            print(f"✓ Connected to MQTT broker at {self.broker}:{self.port}")
+            log.info("connected to MQTT broker at %s:%s", self.broker, self.port)
+            client.subscribe(f"{COMMAND_TOPIC_PREFIX}/#", qos=1)
         else:
-            print(f"✗ Failed to connect. Return code: {rc}")
+            log.error("failed to connect, return code %s", rc)
     
     def on_disconnect(self, client, userdata, rc):
         if rc != 0:
-            print(f"⚠ Unexpected disconnection. Return code: {rc}")
+            log.warning("unexpected disconnection, return code %s", rc)
+        else:
+            log.info("disconnected from MQTT broker")
+    
+    def on_command(self, client, userdata, msg):
+        """Acknowledge backend commands the way a field MCU would"""
+        node_id = msg.topic.rsplit("/", 1)[-1]
+        try:
+            command = json.loads(msg.payload.decode())
+        except ValueError:
+            log.warning("invalid command payload on %s", msg.topic)
+            return
+        if node_id in NODES_CONFIG:
+            ack = {"commandId": command.get("commandId"), "status": "EXECUTED"}
         else:
-            print("✓ Disconnected from MQTT broker")
+            ack = {"commandId": command.get("commandId"), "status": "REJECTED", "reason": "Unknown node"}
+        client.publish(f"{ACK_TOPIC_PREFIX}/{node_id}", json.dumps(ack), qos=1)
+        log.debug("acked command %s for %s: %s", ack["commandId"], node_id, ack["status"])
     
     def generate_metric_value(self, metric_config):
         """Generate a realistic metric value"""
@@ -267,19 +290,19 @@ class DataSimulator:
                 result = self.client.publish(topic, payload, qos=1)
                 
                 if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                    print(f"📤 Published data for {node_id}: {data['metrics']}")
+                    log.debug("published data for %s: %s", node_id, data["metrics"])
                 else:
-                    print(f"✗ Failed to publish to {topic}: {result.rc}")
+                    log.warning("failed to publish to %s: %s", topic, result.rc)
     
     def run_simulation(self, interval=5):
         """Run continuous data simulation"""
-        print(f"Starting simulation with {interval}s interval...")
+        log.info("starting simulation with %ss interval", interval)
         try:
             while self.running:
                 self.publish_data()
                 time.sleep(interval)
         except KeyboardInterrupt:
-            print("\n⏹ Simulation stopped by user")
+            log.info("simulation stopped by user")
         finally:
             self.stop()
     
@@ -302,7 +325,7 @@ class DataSimulator:
                 self.stop()
         
         except Exception as e:
-            print(f"✗ Error starting simulator: {e}")
+            log.error("error starting simulator: %s", e)
             print("\nNote: Make sure you have an MQTT broker running!")
             print("Quick setup options:")
             print("1. Docker: docker run -d -p 1883:1883 eclipse-mosquitto")
@@ -313,7 +336,7 @@ class DataSimulator:
         self.running = False
         self.client.loop_stop()
         self.client.disconnect()
-        print("✓ Simulator stopped")
+        log.info("simulator stopped")
 
 
 if __name__ == "__main__":
@@ -321,5 +344,6 @@ if __name__ == "__main__":
     print("Jalsense MQTT Data Simulator")
     print("=" * 60)
     
+    logs.setup_logging()
     simulator = DataSimulator()
     simulator.start(interval=5)  # Publish data every 5 seconds
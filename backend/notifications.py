@@ -0,0 +1,554 @@
+"""
+Alert notification fan-out for the Jalsense backend.
+
+create_alert() only drops the alert on an in-memory queue (non-blocking, so
+ingest latency never depends on SMS / webhook / mail endpoints). A dispatcher
+thread matches each alert against the subscriptions, groups matches per
+(recipient, channel) into a digest that is flushed DIGEST_WINDOW seconds after
+its first alert (or once it holds MAX_DIGEST alerts), and hands digests to a
+small worker pool. Channels keep pooled connections. Failed sends are retried
+with exponential backoff from a deadline heap owned by the dispatcher; digests
+that still fail, or fail permanently (4xx), are appended to a dead-letter file.
+On stop() every open digest and scheduled retry gets one last attempt, so a
+shutdown does not silently drop alerts.
+
+Subscriptions are read from the JSON file named by GJJ_NOTIFY_CONFIG
+(default: backend/notifications.json, if present):
+
+    {"subscriptions": [
+        {"recipient": "block-engineer", "channel": "sms", "address": "+9198xxxxxxx",
+         "min_severity": "high"},
+        {"recipient": "ops", "channel": "webhook", "address": "https://ops.example/hook",
+         "rules": ["tap.", "pump.dry_run"], "node_ids": ["tap-1", "pump-1"]}
+    ]}
+
+Channels: "webhook" (POST JSON to address), "sms" (POST to the HTTP SMS
+gateway at GJJ_SMS_GATEWAY_URL), "email" (SMTP at GJJ_SMTP_HOST).
+For local testing run a stand-in endpoint that records what it receives:
+
+    python notifications.py sink 9200 --fail-first 2
+"""
+
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import smtplib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import logs
+import metrics
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # webhook/sms channels unavailable
+    requests = None
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.environ.get("GJJ_NOTIFY_CONFIG", os.path.join(_HERE, "notifications.json"))
+DEAD_LETTER_PATH = os.environ.get(
+    "GJJ_NOTIFY_DEAD_LETTER", os.path.join(_HERE, "data", "notifications-dead-letter.jsonl")
+)
+SMS_GATEWAY_URL = os.environ.get("GJJ_SMS_GATEWAY_URL")
+SMTP_HOST = os.environ.get("GJJ_SMTP_HOST")
+SMTP_PORT = int(os.environ.get("GJJ_SMTP_PORT", "25"))
+SMTP_FROM = os.environ.get("GJJ_SMTP_FROM", "alerts@jalsense.local")
+
+QUEUE_SIZE = 10000
+DIGEST_WINDOW = 10.0     # seconds a digest stays open after its first alert
+MAX_DIGEST = 50          # alerts per digest before it is flushed early
+WORKERS = 8
+SEND_TIMEOUT = 5.0
+MAX_ATTEMPTS = 5
+RETRY_BASE = 2.0         # seconds; attempt n waits RETRY_BASE * 2**(n-1), +/-20% jitter
+SMS_MAX_CHARS = 320
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+log = logs.get_logger("notifications")
+
+NOTIFICATIONS = metrics.counter(
+    "gjj_notifications_total", "Notification digests by channel and outcome", ("channel", "outcome")
+)
+NOTIFY_DROPPED = metrics.counter(
+    "gjj_notification_events_dropped_total", "Alert events dropped because the notification queue was full"
+)
+NOTIFY_LATENCY = metrics.histogram(
+    "gjj_notification_send_seconds", "Time spent in one channel send", ("channel",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+class ChannelError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Channel:
+    """A delivery mechanism. send() raises ChannelError on failure."""
+
+    name = "channel"
+
+    def send(self, address: str, subject: str, text: str, alerts: List[Dict]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WebhookChannel(Channel):
+    name = "webhook"
+
+    def __init__(self, pool_size: int = WORKERS, timeout: float = SEND_TIMEOUT):
+        if requests is None:
+            raise RuntimeError("requests is required for HTTP notification channels")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, url: str, body: Dict):
+        try:
+            response = self.session.post(url, json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ChannelError(str(e))
+        if response.status_code >= 400:
+            retryable = response.status_code >= 500 or response.status_code in (408, 429)
+            raise ChannelError(f"HTTP {response.status_code}", retryable=retryable)
+
+    def send(self, address, subject, text, alerts):
+        self._post(address, {"subject": subject, "text": text, "alerts": alerts})
+
+    def close(self):
+        self.session.close()
+
+
+class SmsChannel(WebhookChannel):
+    """Posts to an HTTP SMS gateway; the subscription address is the phone number."""
+
+    name = "sms"
+
+    def __init__(self, gateway_url: Optional[str] = SMS_GATEWAY_URL, **kwargs):
+        super().__init__(**kwargs)
+        self.gateway_url = gateway_url
+
+    def send(self, address, subject, text, alerts):
+        if not self.gateway_url:
+            raise ChannelError("GJJ_SMS_GATEWAY_URL not configured", retryable=False)
+        message = f"{subject}: {text}"
+        if len(message) > SMS_MAX_CHARS:
+            message = message[:SMS_MAX_CHARS - 3] + "..."
+        self._post(self.gateway_url, {"to": address, "message": message})
+
+
+class EmailChannel(Channel):
+    """
+    SMTP with one reused connection per worker thread. Servers drop idle
+    connections, so a send that finds its pooled connection closed reconnects
+    once before it counts as a failure.
+    """
+
+    name = "email"
+
+    def __init__(self, host: Optional[str] = SMTP_HOST, port: int = SMTP_PORT, sender: str = SMTP_FROM):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self._conns: Dict[int, smtplib.SMTP] = {}    # worker thread ident -> connection
+        self._lock = threading.Lock()
+
+    def _connection(self) -> smtplib.SMTP:
+        key = threading.get_ident()
+        conn = self._conns.get(key)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=SEND_TIMEOUT)
+            with self._lock:
+                self._conns[key] = conn
+        return conn
+
+    def _discard(self):
+        with self._lock:
+            conn = self._conns.pop(threading.get_ident(), None)
+        if conn is not None:
+            conn.close()
+
+    def send(self, address, subject, text, alerts):
+        if not self.host:
+            raise ChannelError("GJJ_SMTP_HOST not configured", retryable=False)
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = address
+        message["Subject"] = subject
+        message.set_content(text)
+        try:
+            try:
+                self._connection().send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._discard()           # idle connection closed by the server
+                self._connection().send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise ChannelError(str(e), retryable=False)
+        except (smtplib.SMTPException, OSError) as e:
+            self._discard()               # reconnect on the next attempt
+            raise ChannelError(str(e))
+
+    def close(self):
+        with self._lock:
+            conns, self._conns = list(self._conns.values()), {}
+        for conn in conns:
+            try:
+                conn.quit()
+            except (smtplib.SMTPException, OSError):
+                conn.close()
+
+
+class Subscription:
+    __slots__ = ("recipient", "channel", "address", "min_severity", "rules", "node_ids")
+
+    def __init__(self, recipient: str, channel: str, address: str, min_severity: str = "low",
+                 rules: Optional[List[str]] = None, node_ids: Optional[List[str]] = None):
+        self.recipient = recipient
+        self.channel = channel
+        self.address = address
+        self.min_severity = SEVERITY_RANK.get(min_severity, 0)
+        self.rules = tuple(rules) if rules else None       # rule id prefixes
+        self.node_ids = frozenset(node_ids) if node_ids else None
+
+    def matches(self, alert) -> bool:
+        if SEVERITY_RANK.get(alert.severity, 0) < self.min_severity:
+            return False
+        if self.node_ids is not None and alert.node_id not in self.node_ids:
+            return False
+        return self.rules is None or alert.rule.startswith(self.rules)
+
+    def to_dict(self) -> Dict:
+        rank = {v: k for k, v in SEVERITY_RANK.items()}
+        return {
+            "recipient": self.recipient,
+            "channel": self.channel,
+            "address": self.address,
+            "min_severity": rank[self.min_severity],
+            "rules": list(self.rules) if self.rules else None,
+            "node_ids": sorted(self.node_ids) if self.node_ids else None,
+        }
+
+
+def load_subscriptions(path: str = CONFIG_PATH) -> List[Subscription]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    return [Subscription(**entry) for entry in config.get("subscriptions", [])]
+
+
+class Digest:
+    __slots__ = ("id", "recipient", "channel", "address", "alerts", "opened", "attempts", "last_error")
+
+    def __init__(self, digest_id: int, sub: Subscription, opened: float):
+        self.id = digest_id
+        self.recipient = sub.recipient
+        self.channel = sub.channel
+        self.address = sub.address
+        self.alerts: List[Dict] = []
+        self.opened = opened
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+
+    def render(self) -> Tuple[str, str]:
+        high = sum(1 for a in self.alerts if a["severity"] == "high")
+        subject = f"Jalsense: {len(self.alerts)} alert{'s' if len(self.alerts) != 1 else ''}"
+        if high:
+            subject += f" ({high} high)"
+        lines = [f"[{a['severity'].upper()}] {a['node_name']}: {a['message']}" for a in self.alerts]
+        return subject, "\n".join(lines)
+
+
+class NotificationDispatcher:
+    def __init__(self, channels: Dict[str, Channel], subscriptions: List[Subscription],
+                 window: float = DIGEST_WINDOW, workers: int = WORKERS,
+                 dead_letter_path: str = DEAD_LETTER_PATH):
+        self.channels = channels
+        self.subscriptions = subscriptions
+        self.window = window
+        self.workers = workers
+        self.dead_letter_path = dead_letter_path
+        self._queue: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._open: Dict[Tuple[str, str, str], Digest] = {}
+        self._retries: List = []   # heap of (due, seq, digest); touched by the dispatcher thread only
+        self._retry_inbox: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._dead_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.dead_lettered = 0
+        metrics.QUEUE_DEPTH.labels("notification_events").set_function(lambda: self._queue.qsize())
+        metrics.QUEUE_DEPTH.labels("notification_retries").set_function(lambda: len(self._retries))
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="notify")
+        self._thread = threading.Thread(target=self._run, name="notify-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the dispatcher, give queued alerts, open digests and scheduled
+        retries one last attempt, wait for the sends, then close channels.
+        Whatever still fails is dead-lettered.
+        """
+        self._running = False
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=SEND_TIMEOUT)
+            self._thread = None
+        if self._executor is not None:
+            self._flush_all()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            while not self._retry_inbox.empty():
+                _, digest = self._retry_inbox.get()
+                self._dead_letter(digest, "dispatcher stopped")
+        for channel in self.channels.values():
+            channel.close()
+
+    def _flush_all(self):
+        while True:
+            try:
+                alert = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if alert is not None:
+                self._route(alert)
+        while not self._retry_inbox.empty():
+            _, digest = self._retry_inbox.get()
+            self._dispatch(digest)
+        for digest in self._open.values():
+            self._dispatch(digest)
+        for _, _, digest in self._retries:
+            self._dispatch(digest)
+        self._open.clear()
+        self._retries.clear()
+
+    def _wake(self):
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass   # the dispatcher has work queued and will wake anyway
+
+    # ---------- producer side (request path) ----------
+
+    def submit(self, alert):
+        """Never blocks: drops (and counts) the event when the queue is full."""
+        if not self.subscriptions:
+            return
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            NOTIFY_DROPPED.inc()
+
+    # ---------- dispatcher thread ----------
+
+    def _next_deadline(self) -> Optional[float]:
+        deadlines = [d.opened + self.window for d in self._open.values()]
+        if self._retries:
+            deadlines.append(self._retries[0][0])
+        return min(deadlines) if deadlines else None
+
+    def _run(self):
+        while self._running:
+            deadline = self._next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                alert = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                alert = None
+            if alert is not None:
+                self._route(alert)
+            while not self._retry_inbox.empty():
+                due, digest = self._retry_inbox.get()
+                heapq.heappush(self._retries, (due, next(self._seq), digest))
+            self._flush_due(time.monotonic())
+
+    def _route(self, alert):
+        record = None
+        now = time.monotonic()
+        for sub in self.subscriptions:
+            if not sub.matches(alert):
+                continue
+            if record is None:
+                record = json.loads(alert.json())
+            key = (sub.recipient, sub.channel, sub.address)
+            digest = self._open.get(key)
+            if digest is None:
+                digest = self._open[key] = Digest(next(self._ids), sub, now)
+            digest.alerts.append(record)
+            if len(digest.alerts) >= MAX_DIGEST:
+                del self._open[key]
+                self._dispatch(digest)
+
+    def _flush_due(self, now: float):
+        for key in [k for k, d in self._open.items() if d.opened + self.window <= now]:
+            self._dispatch(self._open.pop(key))
+        while self._retries and self._retries[0][0] <= now:
+            _, _, digest = heapq.heappop(self._retries)
+            self._dispatch(digest)
+
+    def _dispatch(self, digest: Digest):
+        try:
+            self._executor.submit(self._deliver, digest)
+        except RuntimeError:   # executor shut down
+            self._dead_letter(digest, "dispatcher stopped")
+
+    # ---------- workers ----------
+
+    def _deliver(self, digest: Digest):
+        digest.attempts += 1
+        channel = self.channels.get(digest.channel)
+        if channel is None:
+            self._dead_letter(digest, f"unknown channel {digest.channel}")
+            return
+        subject, text = digest.render()
+        try:
+            with NOTIFY_LATENCY.labels(digest.channel).time():
+                channel.send(digest.address, subject, text, digest.alerts)
+        except ChannelError as e:
+            digest.last_error = str(e)
+            if e.retryable and digest.attempts < MAX_ATTEMPTS and self._running:
+                NOTIFICATIONS.labels(digest.channel, "retry").inc()
+                delay = RETRY_BASE * (2 ** (digest.attempts - 1)) * random.uniform(0.8, 1.2)
+                self._retry_inbox.put((time.monotonic() + delay, digest))
+                self._wake()
+            else:
+                self._dead_letter(digest, str(e))
+            return
+        except Exception as e:
+            log.exception("channel %s crashed", digest.channel)
+            self._dead_letter(digest, repr(e))
+            return
+        NOTIFICATIONS.labels(digest.channel, "sent").inc()
+        log.debug("sent digest %s (%d alerts) to %s via %s",
+                  digest.id, len(digest.alerts), digest.recipient, digest.channel)
+
+    def _dead_letter(self, digest: Digest, reason: str):
+        NOTIFICATIONS.labels(digest.channel, "dead_letter").inc()
+        entry = {
+            "digest_id": digest.id,
+            "recipient": digest.recipient,
+            "channel": digest.channel,
+            "address": digest.address,
+            "attempts": digest.attempts,
+            "reason": reason,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+            "alerts": digest.alerts,
+        }
+        with self._dead_lock:
+            self.dead_lettered += 1
+            os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        log.warning("notification to %s via %s dead-lettered: %s",
+                    digest.recipient, digest.channel, reason,
+                    extra={"rate_key": ("dead_letter", digest.recipient, digest.channel)})
+
+    def stats(self) -> Dict:
+        return {
+            "subscriptions": [s.to_dict() for s in self.subscriptions],
+            "queued_events": self._queue.qsize(),
+            "open_digests": len(self._open),
+            "scheduled_retries": len(self._retries),
+            "dead_lettered": self.dead_lettered,
+            "dead_letter_path": self.dead_letter_path,
+        }
+
+
+def default_channels() -> Dict[str, Channel]:
+    channels: Dict[str, Channel] = {"email": EmailChannel()}
+    if requests is not None:
+        channels["webhook"] = WebhookChannel()
+        channels["sms"] = SmsChannel()
+    return channels
+
+
+# ---------- local stand-in endpoint ----------
+
+
+class LocalSink:
+    """
+    Minimal HTTP endpoint that records every JSON body POSTed to it. Can fail
+    the first N requests (HTTP 503) and delay responses to exercise retries
+    and slow-endpoint behaviour. Usable as both webhook and SMS gateway URL.
+    """
+
+    def __init__(self, port: int = 0, fail_first: int = 0, delay: float = 0.0, echo: bool = False):
+        self.received: List[Dict] = []
+        self.fail_first = fail_first
+        self.delay = delay
+        self.echo = echo
+        self._lock = threading.Lock()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if sink.delay:
+                    time.sleep(sink.delay)
+                with sink._lock:
+                    failing = sink.fail_first > 0
+                    if failing:
+                        sink.fail_first -= 1
+                    else:
+                        sink.received.append(json.loads(body or b"{}"))
+                        if sink.echo:
+                            print(body.decode("utf-8", "replace"), flush=True)
+                self.send_response(503 if failing else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "LocalSink":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="notify-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "sink":
+        port = int(sys.argv[2]) if len(sys.argv) >= 3 else 9200
+        fail_first = int(sys.argv[sys.argv.index("--fail-first") + 1]) if "--fail-first" in sys.argv else 0
+        sink = LocalSink(port, fail_first=fail_first, echo=True)
+        print(f"Notification sink listening on {sink.url} (Ctrl+C to stop)")
+        try:
+            sink.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        print("usage: python notifications.py sink [port] [--fail-first N]")
+        sys.exit(1)
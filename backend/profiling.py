@@ -0,0 +1,247 @@
+"""
+Opt-in request profiling for the Jalsense backend.
+
+When enabled (``GJJ_PROFILING=1`` or ``POST /api/admin/profiling``) the ASGI
+middleware records per-stage timings for every request; requests slower than
+the threshold are kept, with their full stage breakdown, in a ring buffer.
+When disabled the middleware passes the request straight to the app after one
+flag check (it is plain ASGI, not BaseHTTPMiddleware, so there is no extra
+task or response wrapping), and ``stage()`` is a context-variable read.
+
+A short sampling-profiler capture can also be triggered: a background thread
+samples the stacks of all other threads and aggregates them as collapsed stacks
+(flamegraph.pl / speedscope compatible).
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_SLOW_MS = float(os.environ.get("GJJ_PROFILING_SLOW_MS", "50"))
+RING_SIZE = 200
+MAX_CAPTURE_SECONDS = 30.0
+UNMATCHED = "<unmatched>"   # route of requests no endpoint matched (404 scans, typos)
+
+_NOOP = nullcontext()
+
+
+class RequestProfile:
+    __slots__ = ("method", "path", "route", "status", "started_at", "_t0", "total_ms", "stages")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = UNMATCHED     # the matched route template, set once routing is done
+        self.status = 0
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.total_ms = 0.0
+        # (name, offset from request start, duration) in ms
+        self.stages: List[Tuple[str, float, float]] = []
+
+    def finish(self, status: int):
+        self.status = status
+        self.total_ms = (time.perf_counter() - self._t0) * 1000.0
+        handler = next((s for s in self.stages if s[0] == "handler"), None)
+        if handler is not None:
+            # Everything before the handler is routing + body parsing + pydantic
+            # validation; everything after it is response encoding.
+            _, offset, duration = handler
+            self.stages.append(("validation", 0.0, offset))
+            self.stages.append(("response", offset + duration, self.total_ms - offset - duration))
+
+    def to_dict(self) -> Dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_ms, 3),
+            "stages": [
+                {"stage": name, "offset_ms": round(off, 3), "duration_ms": round(dur, 3)}
+                for name, off, dur in sorted(self.stages, key=lambda s: s[1])
+            ],
+        }
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("gjj_request_profile", default=None)
+
+
+class _Stage:
+    __slots__ = ("profile", "name", "_start")
+
+    def __init__(self, profile: RequestProfile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        p = self.profile
+        p.stages.append(
+            (self.name, (self._start - p._t0) * 1000.0, (end - self._start) * 1000.0)
+        )
+        return False
+
+
+def stage(name: str, detail: Optional[str] = None):
+    """
+    Time a block as a named stage of the current request. Returns a shared
+    no-op context manager when profiling is off or there is no request.
+    """
+    profile = _current.get()
+    if profile is None:
+        return _NOOP
+    return _Stage(profile, f"{name}:{detail}" if detail else name)
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False, slow_ms: float = DEFAULT_SLOW_MS):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.slow_requests: deque = deque(maxlen=RING_SIZE)
+        # (route, stage) -> [count, total_ms, max_ms]
+        self._stats: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+        self._capture_lock = threading.Lock()
+        self.last_capture: Optional[Dict] = None
+
+    def configure(self, enabled: Optional[bool] = None, slow_ms: Optional[float] = None):
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if enabled is not None:
+            self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.slow_requests.clear()
+
+    def record(self, profile: RequestProfile):
+        with self._lock:
+            for name, _, duration in (("total", 0.0, profile.total_ms), *profile.stages):
+                entry = self._stats.get((profile.route, name))
+                if entry is None:
+                    self._stats[(profile.route, name)] = [1, duration, duration]
+                else:
+                    entry[0] += 1
+                    entry[1] += duration
+                    if duration > entry[2]:
+                        entry[2] = duration
+        if profile.total_ms >= self.slow_ms:
+            self.slow_requests.append(profile)  # deque append is thread-safe
+
+    def summary(self) -> Dict:
+        with self._lock:
+            stats = [
+                {
+                    "route": route,
+                    "stage": name,
+                    "count": int(count),
+                    "mean_ms": round(total / count, 3),
+                    "max_ms": round(peak, 3),
+                }
+                for (route, name), (count, total, peak) in sorted(self._stats.items())
+            ]
+        return {
+            "enabled": self.enabled,
+            "slow_ms": self.slow_ms,
+            "stages": stats,
+            "slow_requests": [p.to_dict() for p in list(self.slow_requests)],
+        }
+
+    # ---------- Sampling profiler ----------
+
+    def start_capture(self, seconds: float, interval_ms: float = 5.0) -> bool:
+        """
+        Start a background stack-sampling capture. Returns False if one is
+        already running.
+        """
+        if not self._capture_lock.acquire(blocking=False):
+            return False
+        seconds = max(0.1, min(seconds, MAX_CAPTURE_SECONDS))
+        thread = threading.Thread(
+            target=self._run_capture,
+            args=(seconds, max(interval_ms, 1.0) / 1000.0),
+            name="profiling-capture",
+            daemon=True,
+        )
+        thread.start()
+        return True
+
+    def capture_running(self) -> bool:
+        return self._capture_lock.locked()
+
+    def _run_capture(self, seconds: float, interval: float):
+        own = threading.get_ident()
+        stacks: Dict[str, int] = {}
+        samples = 0
+        started = time.time()
+        deadline = time.perf_counter() + seconds
+        try:
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own:
+                        continue
+                    parts = []
+                    while frame is not None:
+                        code = frame.f_code
+                        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    key = ";".join(reversed(parts))
+                    stacks[key] = stacks.get(key, 0) + 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            top = sorted(stacks.items(), key=lambda kv: kv[1], reverse=True)
+            self.last_capture = {
+                "started_at": started,
+                "seconds": seconds,
+                "samples": samples,
+                "collapsed": [f"{stack} {count}" for stack, count in top],
+            }
+            self._capture_lock.release()
+
+
+PROFILER = Profiler(enabled=os.environ.get("GJJ_PROFILING") == "1")
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILER.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                # group by template so /api/alerts/{alert_id}/ack stays one series;
+                # unmatched paths share one, so scanners can't grow the table
+                profile.route = route.path
+            profile.finish(status)
+            PROFILER.record(profile)
@@ -0,0 +1,194 @@
+"""
+Server-side water-quality compliance for the Jalsense backend.
+
+Every tap reading is checked parameter by parameter against the BIS limits
+below; a sample is compliant when every parameter it reports is in range.
+Compliance is kept per tap and per scheme over 24h / 7d / 30d sliding windows.
+Each window is a ring of fixed-width time buckets with running totals: a
+reading increments one bucket, and buckets that fall out of the window are
+subtracted from the totals as the window advances, so both recording and
+querying are O(1) amortized no matter how many readings a window holds.
+
+Windows are aligned to UTC bucket boundaries: "24h" covers the current hour
+plus the 23 before it, "7d" the current 6-hour block plus 27 more, "30d" the
+current day plus 29 more. Every report carries its exact window_start so the
+figures can be reproduced from raw readings.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Hashable, List, Mapping, Optional, Tuple
+
+# parameter -> (min, max); None means unbounded on that side
+QUALITY_LIMITS: Dict[str, Tuple[Optional[float], Optional[float]]] = {
+    "ph": (6.5, 8.5),
+    "turbidity": (None, 5.0),        # NTU
+    "tds": (None, 1000.0),           # mg/L
+    "freeChlorine": (0.2, 0.8),      # mg/L
+    "iron": (None, 0.3),
+    "fluoride": (None, 1.5),
+    "nitrate": (None, 45.0),
+    "hardness": (None, 600.0),
+    "coliformPresent": (None, 0.0),  # 1 = detected
+}
+PARAMETERS = tuple(QUALITY_LIMITS)
+
+# name -> (bucket width in seconds, number of buckets)
+WINDOWS: Dict[str, Tuple[int, int]] = {
+    "24h": (3600, 24),
+    "7d": (6 * 3600, 28),
+    "30d": (86400, 30),
+}
+
+# counter layout inside a bucket: samples, compliant samples, then
+# (checks, passed) for each parameter
+_SAMPLES, _COMPLIANT = 0, 1
+_WIDTH = 2 + 2 * len(PARAMETERS)
+
+
+def evaluate(metrics: Mapping[str, float]) -> List[Tuple[int, bool]]:
+    """(parameter index, passed) for each quality parameter present in a reading."""
+    checks = []
+    for i, name in enumerate(PARAMETERS):
+        value = metrics.get(name)
+        if value is None:
+            continue
+        low, high = QUALITY_LIMITS[name]
+        checks.append((i, (low is None or value >= low) and (high is None or value <= high)))
+    return checks
+
+
+class WindowCounter:
+    """Fixed-width bucket ring with running totals over the live buckets."""
+
+    __slots__ = ("width", "size", "_ids", "_counts", "totals", "_head")
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self._ids = [-1] * size                       # bucket number held by each slot
+        self._counts = [[0] * _WIDTH for _ in range(size)]
+        self.totals = [0] * _WIDTH
+        self._head: Optional[int] = None              # newest bucket seen
+
+    def advance(self, bucket: int):
+        if self._head is not None and bucket <= self._head:
+            return
+        # expire every slot that the window slides over (at most one revolution)
+        start = bucket - self.size + 1 if self._head is None else max(self._head + 1, bucket - self.size + 1)
+        for b in range(start, bucket + 1):
+            slot = b % self.size
+            if self._ids[slot] != -1:
+                counts = self._counts[slot]
+                for j in range(_WIDTH):
+                    self.totals[j] -= counts[j]
+                    counts[j] = 0
+                self._ids[slot] = -1
+        self._head = bucket
+
+    def add(self, ts: float, checks: List[Tuple[int, bool]]) -> bool:
+        bucket = int(ts // self.width)
+        self.advance(bucket)
+        if bucket <= self._head - self.size:
+            return False  # older than the window
+        slot = bucket % self.size
+        self._ids[slot] = bucket
+        counts, totals = self._counts[slot], self.totals
+        compliant = all(passed for _, passed in checks)
+        counts[_SAMPLES] += 1
+        totals[_SAMPLES] += 1
+        if compliant:
+            counts[_COMPLIANT] += 1
+            totals[_COMPLIANT] += 1
+        for i, passed in checks:
+            base = 2 + 2 * i
+            counts[base] += 1
+            totals[base] += 1
+            if passed:
+                counts[base + 1] += 1
+                totals[base + 1] += 1
+        return True
+
+    def window_start(self) -> float:
+        return (self._head - self.size + 1) * self.width
+
+
+def _percent(passed: int, total: int) -> Optional[float]:
+    return round(100.0 * passed / total, 2) if total else None
+
+
+class ComplianceTracker:
+    """Sliding-window compliance counters keyed by ("tap", id) / ("scheme", id)."""
+
+    def __init__(self):
+        self._windows: Dict[Hashable, Dict[str, WindowCounter]] = {}
+        self._lock = threading.Lock()
+
+    def _counters(self, key: Hashable) -> Dict[str, WindowCounter]:
+        counters = self._windows.get(key)
+        if counters is None:
+            counters = self._windows[key] = {
+                name: WindowCounter(width, size) for name, (width, size) in WINDOWS.items()
+            }
+        return counters
+
+    def record(self, tap_id: str, scheme_id: Optional[str], metrics: Mapping[str, float], ts: datetime) -> Optional[float]:
+        """
+        Count one reading for its tap and scheme. Returns the tap's 24h
+        compliance percent afterwards (None until it has a sample).
+        """
+        return self.record_many(tap_id, scheme_id, [(ts.timestamp(), evaluate(metrics))])
+
+    def record_many(
+        self, tap_id: str, scheme_id: Optional[str], samples: List[Tuple[float, List[Tuple[int, bool]]]]
+    ) -> Optional[float]:
+        """
+        Count a batch of (epoch, evaluate() result) samples for one tap under a
+        single lock. Returns the tap's 24h compliance percent afterwards.
+        """
+        samples = sorted(samples, key=lambda s: s[0])
+        with self._lock:
+            tap = self._counters(("tap", tap_id))
+            keys = [tap] + ([self._counters(("scheme", scheme_id))] if scheme_id else [])
+            for epoch, checks in samples:
+                if checks:
+                    for counters in keys:
+                        for counter in counters.values():
+                            counter.add(epoch, checks)
+            day = tap["24h"]
+            latest = samples[-1][0] if samples else 0.0
+            day.advance(int(max(latest, time.time()) // day.width))
+            return _percent(day.totals[_COMPLIANT], day.totals[_SAMPLES])
+
+    def report(self, key: Hashable, now: Optional[float] = None) -> Dict[str, Dict]:
+        now = time.time() if now is None else now
+        result = {}
+        with self._lock:
+            counters = self._windows.get(key)
+            for name, (width, size) in WINDOWS.items():
+                if counters is None:
+                    totals = [0] * _WIDTH
+                    start = (int(now // width) - size + 1) * width
+                else:
+                    counter = counters[name]
+                    counter.advance(int(now // width))
+                    totals = list(counter.totals)
+                    start = counter.window_start()
+                parameters = {}
+                for i, param in enumerate(PARAMETERS):
+                    checks, passed = totals[2 + 2 * i], totals[3 + 2 * i]
+                    if checks:
+                        parameters[param] = {
+                            "checks": checks,
+                            "passed": passed,
+                            "compliance_percent": _percent(passed, checks),
+                        }
+                result[name] = {
+                    "window_start": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+                    "samples": totals[_SAMPLES],
+                    "compliant_samples": totals[_COMPLIANT],
+                    "compliance_percent": _percent(totals[_COMPLIANT], totals[_SAMPLES]),
+                    "parameters": parameters,
+                }
+        return result
@@ -0,0 +1,123 @@
+"""
+The alert rule table for the Jalsense backend.
+
+RULES is data: ``apply_rules`` in main.py evaluates it live (via
+``matching``) and backtest.py replays it over archived telemetry, so both
+always see the same thresholds:
+
+    "pump.motor_overheat": {"type": "pump", "severity": "high",
+                            "any": [["motorTemperature", ">", 75]]}
+
+A rule fires on a reading when any (or, with "all", every) clause holds.
+A clause is ``[metric, op, value]`` plus an optional fourth element used
+when the node has never reported the metric (apply_rules' ``m.get(x, 0)``);
+without it such readings never match. ``"unless": "<rule>"`` reproduces an
+``elif`` - the rule is suppressed wherever that rule fires.
+
+This module has no dependencies beyond the standard library, so evaluating
+rules on ingest does not pull in numpy or the archive.
+"""
+
+import operator
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+RULES: Dict[str, Dict] = {
+    "pump.dry_run": {"type": "pump", "severity": "high",
+                     "all": [["powerConsumption", ">", 7.5, 0.0], ["pumpDischargeRate", "<", 15, 0.0]]},
+    "pump.efficiency_low": {"type": "pump", "severity": "medium", "any": [["pumpEfficiency", "<", 60]]},
+    "pump.motor_overheat": {"type": "pump", "severity": "high", "any": [["motorTemperature", ">", 75]]},
+    "pump.motor_hot": {"type": "pump", "severity": "medium", "any": [["motorTemperature", ">", 65]],
+                       "unless": "pump.motor_overheat"},
+    "pump.voltage_abnormal": {"type": "pump", "severity": "medium",
+                              "any": [["voltage", "<", 200], ["voltage", ">", 250]]},
+    "pump.leak": {"type": "pump", "severity": "high",
+                  "any": [["flowDropIndicator", "==", 1], ["leakProbabilityScore", ">", 70]]},
+    "pump.service_due": {"type": "pump", "severity": "medium", "any": [["pumpRunningHours", ">", 450]]},
+    "tank.level_critical": {"type": "tank", "severity": "high", "any": [["tankLevel", "<", 15]]},
+    "tank.level_low": {"type": "tank", "severity": "medium", "any": [["tankLevel", "<", 25]],
+                       "unless": "tank.level_critical"},
+    "tank.near_overflow": {"type": "tank", "severity": "medium", "any": [["tankLevel", ">", 95]]},
+    "tank.overflow": {"type": "tank", "severity": "medium", "any": [["tankOverflow", "==", 1]]},
+    "tank.filling_delay": {"type": "tank", "severity": "medium", "any": [["unexpectedFillingDelays", ">", 2]]},
+    "tank.empty_too_long": {"type": "tank", "severity": "high", "any": [["tankEmptinessHours", ">", 10]]},
+    "valve.faulty": {"type": "valve", "severity": "high", "any": [["faultyValveDetection", "==", 1]]},
+    "valve.leakage": {"type": "valve", "severity": "medium", "any": [["valveLeakage", ">", 5]]},
+    "valve.excessive_operations": {"type": "valve", "severity": "medium",
+                                   "any": [["valveOperationCount", ">", 40]]},
+    "tap.coliform": {"type": "tap", "severity": "high", "any": [["coliformPresent", "==", 1]]},
+    "tap.quality_failed": {"type": "tap", "severity": "high", "any": [
+        ["ph", "<", 6.5], ["ph", ">", 8.5], ["turbidity", ">", 5], ["tds", ">", 1000],
+        ["freeChlorine", "<", 0.2], ["freeChlorine", ">", 0.8], ["iron", ">", 0.3],
+        ["fluoride", ">", 1.5], ["nitrate", ">", 45], ["hardness", ">", 600],
+    ]},
+    "tap.compliance_low": {"type": "tap", "severity": "medium",
+                           "any": [["waterQualityCompliancePercent", "<", 80, 100.0]]},
+}
+
+OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+       "==": operator.eq, "!=": operator.ne}
+NODE_TYPES = ("pump", "tank", "valve", "tap")
+
+# (metric, comparison, value, default when never reported)
+Clause = Tuple[str, Callable[[Any, Any], bool], float, Optional[float]]
+
+
+# ---------- validation ----------
+
+
+def validate_rules(rules: Dict[str, Dict]):
+    """Raise ValueError describing the first malformed rule."""
+    for rule_id, spec in rules.items():
+        if not isinstance(spec, dict):
+            raise ValueError(f"{rule_id}: rule must be an object")
+        if spec.get("type") not in NODE_TYPES:
+            raise ValueError(f"{rule_id}: type must be one of {', '.join(NODE_TYPES)}")
+        clauses = spec.get("any", spec.get("all"))
+        if ("any" in spec) == ("all" in spec) or not isinstance(clauses, list) or not clauses:
+            raise ValueError(f"{rule_id}: needs exactly one non-empty 'any' or 'all' clause list")
+        for clause in clauses:
+            if not isinstance(clause, (list, tuple)) or len(clause) not in (3, 4):
+                raise ValueError(f"{rule_id}: clause must be [metric, op, value] or [metric, op, value, default]")
+            if not isinstance(clause[0], str) or clause[1] not in OPS:
+                raise ValueError(f"{rule_id}: bad clause {clause!r}")
+            if not all(isinstance(v, (int, float)) for v in clause[2:]):
+                raise ValueError(f"{rule_id}: clause values must be numbers")
+        unless = spec.get("unless")
+        if unless is not None and unless not in rules:
+            raise ValueError(f"{rule_id}: unless refers to unknown rule {unless}")
+
+
+# ---------- live evaluation ----------
+
+
+def compile_rules(rules: Dict[str, Dict]) -> Dict[str, List[Tuple[str, bool, List[Clause], Optional[str]]]]:
+    """Per node type, in table order: (rule id, all clauses?, clauses, unless)."""
+    compiled: Dict[str, List] = {node_type: [] for node_type in NODE_TYPES}
+    for rule_id, spec in rules.items():
+        clauses = [(c[0], OPS[c[1]], c[2], c[3] if len(c) == 4 else None)
+                   for c in spec.get("any", spec.get("all"))]
+        compiled[spec["type"]].append((rule_id, "all" in spec, clauses, spec.get("unless")))
+    return compiled
+
+
+def clause_holds(metrics: Mapping[str, float], clause: Clause) -> bool:
+    name, op, value, default = clause
+    current = metrics.get(name, default)
+    return current is not None and op(current, value)
+
+
+def matching(node_type: str, metrics: Mapping[str, float], compiled: Optional[Dict] = None) -> List[str]:
+    """Rules that fire on one node's current metrics, in table order; the scalar twin of backtest._rule_masks."""
+    hits = []
+    for rule_id, every, clauses, unless in (compiled if compiled is not None else LIVE_RULES).get(node_type, ()):
+        if every:
+            fired = all(clause_holds(metrics, c) for c in clauses)
+        else:
+            fired = any(clause_holds(metrics, c) for c in clauses)
+        if fired:
+            hits.append((rule_id, unless))
+    fired_ids = {rule_id for rule_id, _ in hits}
+    return [rule_id for rule_id, unless in hits if unless not in fired_ids]
+
+
+LIVE_RULES = compile_rules(RULES)
@@ -0,0 +1,442 @@
+"""
+Service-request (help desk) storage for the Jalsense backend.
+
+Requests are kept in creation order with secondary indexes by status,
+assignee, node and scheme, so list/export filters touch only matching rows and
+created-time ranges are a bisect over the creation timeline. The CSV export
+is a generator: rows are written in small chunks as the client reads them.
+
+Dashboard statistics are maintained incrementally per (scheme, creation day)
+cell: every write removes the request's old contribution and adds the new one,
+so a statistics call sums cells instead of scanning requests.
+"""
+
+import bisect
+import csv
+import io
+import itertools
+import threading
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+STATUSES = ("OPEN", "IN_PROGRESS", "RESOLVED", "CLOSED", "CANCELLED")
+ACTIVE_STATUSES = ("OPEN", "IN_PROGRESS")
+URGENCIES = ("low", "medium", "high")
+CSV_CHUNK_ROWS = 500
+
+CSV_COLUMNS = [
+    "id", "issue_type", "urgency", "status", "node_id", "scheme_id", "location",
+    "reporter_name", "contact", "assignee", "created_at", "updated_at",
+    "resolved_at", "rating", "description",
+]
+# spreadsheet apps evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class Comment(BaseModel):
+    author: Optional[str] = None
+    comment: str
+    created_at: datetime
+
+
+class ServiceRequest(BaseModel):
+    id: str
+    issue_type: str
+    description: str = ""
+    urgency: str = "medium"
+    status: str = "OPEN"
+    node_id: Optional[str] = None
+    scheme_id: Optional[str] = None
+    location: Optional[str] = None
+    reporter_name: Optional[str] = None
+    contact: Optional[str] = None
+    assignee: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    resolved_at: Optional[datetime] = None
+    rating: Optional[int] = None
+    feedback: Optional[str] = None
+    comments: List[Comment] = []
+
+
+class ServiceRequestIn(BaseModel):
+    issue_type: str
+    description: str = ""
+    urgency: str = "medium"
+    node_id: Optional[str] = None
+    scheme_id: Optional[str] = None
+    location: Optional[str] = None
+    reporter_name: Optional[str] = None
+    contact: Optional[str] = None
+
+
+class ServiceRequestUpdate(BaseModel):
+    issue_type: Optional[str] = None
+    description: Optional[str] = None
+    urgency: Optional[str] = None
+    node_id: Optional[str] = None
+    scheme_id: Optional[str] = None
+    location: Optional[str] = None
+    contact: Optional[str] = None
+
+
+class StatusIn(BaseModel):
+    status: str
+    notes: str = ""
+
+
+class AssignIn(BaseModel):
+    technicianId: str
+
+
+class CommentIn(BaseModel):
+    comment: str
+    author: Optional[str] = None
+
+
+class RatingIn(BaseModel):
+    rating: int
+    feedback: Optional[str] = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _epoch(ts: datetime) -> float:
+    """Seconds since the epoch; a time without an offset is taken as UTC, not server local time."""
+    return (ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts).timestamp()
+
+
+def _csv_cell(value):
+    """Quote text a spreadsheet would otherwise run as a formula."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _position(request_id: str) -> int:
+    # REQ-NNNN ids are handed out in creation order, so the number is the
+    # request's position on the creation timeline
+    return int(request_id[4:]) - 1
+
+
+class _StatsCell:
+    """Aggregates for the requests of one scheme created on one day."""
+
+    __slots__ = ("total", "by_status", "by_urgency", "by_issue_type", "resolved",
+                 "resolve_seconds", "tech_active", "tech_total")
+
+    def __init__(self):
+        self.total = 0
+        self.by_status: Counter = Counter()
+        self.by_urgency: Counter = Counter()
+        self.by_issue_type: Counter = Counter()
+        self.resolved = 0
+        self.resolve_seconds = 0.0
+        self.tech_active: Counter = Counter()
+        self.tech_total: Counter = Counter()
+
+    def is_empty(self) -> bool:
+        return self.total == 0
+
+    def as_tuple(self):
+        def clean(counter):
+            return {k: v for k, v in counter.items() if v}
+        return (
+            self.total, clean(self.by_status), clean(self.by_urgency),
+            clean(self.by_issue_type), self.resolved, round(self.resolve_seconds, 3),
+            clean(self.tech_active), clean(self.tech_total),
+        )
+
+
+class ServiceRequestStats:
+    def __init__(self):
+        # scheme_id -> day ordinal -> cell
+        self._cells: Dict[Optional[str], Dict[int, _StatsCell]] = {}
+
+    def apply(self, req: ServiceRequest, sign: int):
+        """Add (sign=1) or remove (sign=-1) one request's contribution."""
+        day = req.created_at.date().toordinal()
+        days = self._cells.setdefault(req.scheme_id, {})
+        cell = days.get(day)
+        if cell is None:
+            cell = days[day] = _StatsCell()
+        cell.total += sign
+        cell.by_status[req.status] += sign
+        cell.by_urgency[req.urgency] += sign
+        cell.by_issue_type[req.issue_type] += sign
+        if req.resolved_at is not None:
+            cell.resolved += sign
+            cell.resolve_seconds += sign * (req.resolved_at - req.created_at).total_seconds()
+        if req.assignee is not None:
+            cell.tech_total[req.assignee] += sign
+            if req.status in ACTIVE_STATUSES:
+                cell.tech_active[req.assignee] += sign
+        if cell.is_empty():
+            del days[day]
+            if not days:
+                del self._cells[req.scheme_id]
+
+    def _select(self, scheme_id, day_from, day_to) -> Iterator[Tuple[Tuple, _StatsCell]]:
+        schemes = [scheme_id] if scheme_id is not None else list(self._cells)
+        for scheme in schemes:
+            for day, cell in self._cells.get(scheme, {}).items():
+                if (day_from is None or day >= day_from) and (day_to is None or day <= day_to):
+                    yield (scheme, day), cell
+
+    def summary(
+        self,
+        scheme_id: Optional[str] = None,
+        created_from: Optional[date] = None,
+        created_to: Optional[date] = None,
+    ) -> Dict:
+        day_from = created_from.toordinal() if created_from else None
+        day_to = created_to.toordinal() if created_to else None
+        total = resolved = 0
+        resolve_seconds = 0.0
+        by_status: Counter = Counter()
+        by_urgency: Counter = Counter()
+        by_issue_type: Counter = Counter()
+        tech_active: Counter = Counter()
+        tech_total: Counter = Counter()
+        buckets = 0
+        for _, cell in self._select(scheme_id, day_from, day_to):
+            buckets += 1
+            total += cell.total
+            resolved += cell.resolved
+            resolve_seconds += cell.resolve_seconds
+            by_status.update(cell.by_status)
+            by_urgency.update(cell.by_urgency)
+            by_issue_type.update(cell.by_issue_type)
+            tech_active.update(cell.tech_active)
+            tech_total.update(cell.tech_total)
+        return {
+            "total": total,
+            "by_status": {s: by_status.get(s, 0) for s in STATUSES},
+            "by_urgency": {u: by_urgency.get(u, 0) for u in URGENCIES},
+            "by_issue_type": {k: v for k, v in by_issue_type.items() if v},
+            "open": sum(by_status.get(s, 0) for s in ACTIVE_STATUSES),
+            "resolved": resolved,
+            "mean_time_to_resolve_hours": (
+                round(resolve_seconds / resolved / 3600.0, 2) if resolved else None
+            ),
+            "technician_load": {
+                tech: {"active": tech_active.get(tech, 0), "total": count}
+                for tech, count in sorted(tech_total.items()) if count
+            },
+            "buckets_scanned": buckets,
+        }
+
+    def snapshot(self) -> Dict[Tuple, Tuple]:
+        return {key: cell.as_tuple() for key, cell in self._select(None, None, None)}
+
+
+class ServiceRequestStore:
+    def __init__(self):
+        self._by_id: Dict[str, ServiceRequest] = {}
+        # creation timeline: ids and their created_at timestamps, append-only
+        self._order: List[str] = []
+        self._created: List[float] = []
+        self._by_status: Dict[str, Set[str]] = {}
+        self._by_assignee: Dict[str, Set[str]] = {}
+        self._by_node: Dict[str, Set[str]] = {}
+        self._by_scheme: Dict[str, Set[str]] = {}
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self.stats = ServiceRequestStats()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    # ---------- index helpers ----------
+
+    @staticmethod
+    def _index_add(index: Dict[str, Set[str]], key: Optional[str], rid: str):
+        if key is not None:
+            index.setdefault(key, set()).add(rid)
+
+    @staticmethod
+    def _index_remove(index: Dict[str, Set[str]], key: Optional[str], rid: str):
+        if key is None:
+            return
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(rid)
+            if not ids:
+                del index[key]
+
+    # ---------- writes ----------
+
+    def create(self, data: ServiceRequestIn) -> ServiceRequest:
+        with self._lock:
+            now = _now()
+            req = ServiceRequest(
+                id=f"REQ-{next(self._seq):04d}",
+                created_at=now,
+                updated_at=now,
+                **data.model_dump(),
+            )
+            self._by_id[req.id] = req
+            self._order.append(req.id)
+            self._created.append(now.timestamp())
+            self._index_add(self._by_status, req.status, req.id)
+            self._index_add(self._by_node, req.node_id, req.id)
+            self._index_add(self._by_scheme, req.scheme_id, req.id)
+            self.stats.apply(req, 1)
+            return req
+
+    def get(self, request_id: str) -> Optional[ServiceRequest]:
+        return self._by_id.get(request_id)
+
+    def update(self, req: ServiceRequest, data: ServiceRequestUpdate) -> ServiceRequest:
+        changes = data.model_dump(exclude_unset=True)
+        with self._lock:
+            self.stats.apply(req, -1)
+            if "node_id" in changes:
+                self._index_remove(self._by_node, req.node_id, req.id)
+                self._index_add(self._by_node, changes["node_id"], req.id)
+            if "scheme_id" in changes:
+                self._index_remove(self._by_scheme, req.scheme_id, req.id)
+                self._index_add(self._by_scheme, changes["scheme_id"], req.id)
+            for field, value in changes.items():
+                setattr(req, field, value)
+            req.updated_at = _now()
+            self.stats.apply(req, 1)
+            return req
+
+    def set_status(self, req: ServiceRequest, status: str, notes: str = "") -> ServiceRequest:
+        with self._lock:
+            self.stats.apply(req, -1)
+            self._index_remove(self._by_status, req.status, req.id)
+            self._index_add(self._by_status, status, req.id)
+            req.status = status
+            req.updated_at = _now()
+            if status == "RESOLVED":
+                req.resolved_at = req.updated_at
+            elif status in ("OPEN", "IN_PROGRESS"):
+                req.resolved_at = None
+            if notes:
+                req.comments.append(Comment(comment=notes, created_at=req.updated_at))
+            self.stats.apply(req, 1)
+            return req
+
+    def assign(self, req: ServiceRequest, technician_id: str) -> ServiceRequest:
+        with self._lock:
+            self.stats.apply(req, -1)
+            self._index_remove(self._by_assignee, req.assignee, req.id)
+            self._index_add(self._by_assignee, technician_id, req.id)
+            req.assignee = technician_id
+            req.updated_at = _now()
+            self.stats.apply(req, 1)
+            return req
+
+    def add_comment(self, req: ServiceRequest, comment: str, author: Optional[str] = None) -> Comment:
+        with self._lock:
+            entry = Comment(author=author, comment=comment, created_at=_now())
+            req.comments.append(entry)
+            req.updated_at = entry.created_at
+            return entry
+
+    def rate(self, req: ServiceRequest, rating: int, feedback: Optional[str]) -> ServiceRequest:
+        with self._lock:
+            req.rating = rating
+            req.feedback = feedback
+            req.updated_at = _now()
+            return req
+
+    # ---------- reads ----------
+
+    def iter_ids(
+        self,
+        status: Optional[str] = None,
+        assignee: Optional[str] = None,
+        node_id: Optional[str] = None,
+        scheme_id: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> Iterator[str]:
+        """
+        Yield matching ids in creation order. Index filters are intersected
+        smallest-first; the created-time window is a bisect on the timeline.
+        """
+        with self._lock:
+            lo = 0 if created_from is None else bisect.bisect_left(self._created, _epoch(created_from))
+            hi = len(self._order) if created_to is None else bisect.bisect_right(self._created, _epoch(created_to))
+            selected = []
+            for index, key in (
+                (self._by_status, status),
+                (self._by_assignee, assignee),
+                (self._by_node, node_id),
+                (self._by_scheme, scheme_id),
+            ):
+                if key is not None:
+                    selected.append(index.get(key, set()))
+            if selected:
+                selected.sort(key=len)
+                ids = set(selected[0]).intersection(*selected[1:])
+                positions = sorted(p for p in map(_position, ids) if lo <= p < hi)
+        if selected:
+            for pos in positions:
+                yield self._order[pos]
+            return
+        # unfiltered (or time-only) scans walk the timeline without copying it
+        for pos in range(lo, hi):
+            yield self._order[pos]
+
+    def statistics(self, **filters) -> Dict:
+        with self._lock:
+            return self.stats.summary(**filters)
+
+    def verify_statistics(self) -> Dict:
+        """
+        Recompute every aggregate from the raw requests and compare with the
+        incrementally maintained ones.
+        """
+        with self._lock:
+            fresh = ServiceRequestStats()
+            for req in self._by_id.values():
+                fresh.apply(req, 1)
+            expected, actual = fresh.snapshot(), self.stats.snapshot()
+        mismatched = sorted(
+            (key for key in set(expected) | set(actual) if expected.get(key) != actual.get(key)),
+            key=lambda k: (k[0] or "", k[1]),
+        )
+        return {
+            "consistent": not mismatched,
+            "cells_checked": len(expected),
+            "mismatched_cells": [
+                {"scheme_id": scheme, "day": date.fromordinal(day).isoformat()}
+                for scheme, day in mismatched
+            ],
+        }
+
+    def query(self, limit: int = 100, offset: int = 0, **filters) -> List[ServiceRequest]:
+        ids = itertools.islice(self.iter_ids(**filters), offset, offset + limit)
+        return [self._by_id[rid] for rid in ids]
+
+    def iter_csv(self, **filters) -> Iterator[str]:
+        """Yield CSV text in chunks of CSV_CHUNK_ROWS rows."""
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(CSV_COLUMNS)
+        rows = 0
+        for rid in self.iter_ids(**filters):
+            req = self._by_id[rid]
+            writer.writerow(map(_csv_cell, [
+                req.id, req.issue_type, req.urgency, req.status, req.node_id or "",
+                req.scheme_id or "", req.location or "", req.reporter_name or "",
+                req.contact or "", req.assignee or "", req.created_at.isoformat(),
+                req.updated_at.isoformat(),
+                req.resolved_at.isoformat() if req.resolved_at else "",
+                "" if req.rating is None else req.rating, req.description,
+            ]))
+            rows += 1
+            if rows % CSV_CHUNK_ROWS == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
@@ -1,9 +1,17 @@
+import os
 import time
 import random
 from datetime import datetime, timezone
 import requests
 
+import logs
+
+log = logs.get_logger("simulator")
+
 BASE_URL = "http://localhost:8000/api/telemetry"
+# Gateway token from `python auth.py gateway-token <name>` (backend auth is on by default)
+GATEWAY_TOKEN = os.environ.get("GJJ_GATEWAY_TOKEN")
+AUTH_HEADERS = {"Authorization": f"Bearer {GATEWAY_TOKEN}"} if GATEWAY_TOKEN else {}
 
 def rand(a, b):
     return random.uniform(a, b)
@@ -142,13 +150,14 @@ def simulate_tap():
 
 def send(payload):
     try:
-        r = requests.post(BASE_URL, json=payload, timeout=3)
+        r = requests.post(BASE_URL, json=payload, headers=AUTH_HEADERS, timeout=3)
         r.raise_for_status()
-        print("OK:", payload["nodeId"], payload["metrics"])
+        log.debug("sent %s: %s", payload["nodeId"], payload["metrics"])
     except Exception as e:
-        print("ERROR sending", payload["nodeId"], e)
+        log.warning("error sending %s: %s", payload["nodeId"], e)
 
 def main():
+    logs.setup_logging()
     print("Starting simulator → posting to", BASE_URL)
     while True:
         send(simulate_pump())
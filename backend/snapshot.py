@@ -0,0 +1,157 @@
+"""
+Materialized per-scheme dashboard snapshots for the Jalsense backend.
+
+The dashboard used to assemble a scheme view from one request per section
+(pumps, tanks, valves, energy, quality, alarms). Instead every scheme keeps a
+view that is updated as telemetry and alerts land: each node and open alarm is
+held as a pre-serialized JSON fragment, and each section's JSON is cached until
+something in it changes. A snapshot read is then a string join of the
+requested sections - no model serialization and no recomputation.
+
+Pump energy is not integrated here: the maintenance engine already integrates
+each pump's kWh (alongside its running hours) once per reading, and the energy
+section adds the growth of that cumulative total to the pump's day.
+
+Quality compliance depends on the wall clock (windows slide), so that section
+is cached for QUALITY_TTL seconds or until a tap in the scheme reports.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+SECTIONS = ("pumps", "tanks", "valves", "taps", "energy", "quality", "alarms")
+NODE_SECTIONS = {"pump": "pumps", "tank": "tanks", "valve": "valves", "tap": "taps"}
+QUALITY_TTL = 30.0   # seconds
+MAX_ALARMS = 100     # most recent open alarms kept per scheme
+
+
+class _SchemeView:
+    __slots__ = ("fragments", "rendered", "alarms", "open_alarms", "energy",
+                 "quality", "quality_at", "version")
+
+    def __init__(self):
+        self.fragments: Dict[str, Dict[str, str]] = {s: {} for s in NODE_SECTIONS.values()}
+        self.rendered: Dict[str, str] = {}             # section -> cached JSON
+        self.alarms: "OrderedDict[int, str]" = OrderedDict()
+        self.open_alarms = 0
+        # pump id -> [power kW, kWh today, UTC day ordinal, cumulative kWh]
+        self.energy: Dict[str, List[float]] = {}
+        self.quality: Optional[str] = None
+        self.quality_at = 0.0
+        self.version = 0
+
+    def changed(self, section: str):
+        self.rendered.pop(section, None)
+        self.version += 1
+
+
+class SnapshotCache:
+    def __init__(self, quality_source: Callable[[str], Dict]):
+        self._quality_source = quality_source
+        self._views: Dict[str, _SchemeView] = {}
+        self._lock = threading.Lock()
+
+    def _view(self, scheme_id: str) -> _SchemeView:
+        view = self._views.get(scheme_id)
+        if view is None:
+            view = self._views[scheme_id] = _SchemeView()
+        return view
+
+    def __contains__(self, scheme_id: str) -> bool:
+        return scheme_id in self._views
+
+    # ---------- incremental updates ----------
+
+    def update_node(self, node):
+        """Re-serialize one node into its scheme's view (call after each change)."""
+        section = NODE_SECTIONS.get(node.type)
+        fragment = node.json()
+        with self._lock:
+            view = self._view(node.scheme_id)
+            if section is None:
+                return
+            view.fragments[section][node.id] = fragment
+            view.changed(section)
+            if node.type == "tap":
+                view.quality = None
+
+    def pump_energy(self, scheme_id: str, node_id: str, ts: datetime, power: Optional[float], energy_kwh: float):
+        """Add the growth of a pump's cumulative kWh (from the maintenance engine) to its day."""
+        if power is None:
+            return
+        day = int(ts.timestamp() // 86400)
+        with self._lock:
+            view = self._view(scheme_id)
+            state = view.energy.get(node_id)
+            if state is None:
+                view.energy[node_id] = [power, 0.0, day, energy_kwh]
+            else:
+                grown = max(0.0, energy_kwh - state[3])
+                today = grown if day > state[2] else state[1] + grown
+                view.energy[node_id] = [power, today, max(day, state[2]), energy_kwh]
+            view.changed("energy")
+
+    def alert_raised(self, scheme_id: str, alert):
+        fragment = alert.json()
+        with self._lock:
+            view = self._view(scheme_id)
+            view.alarms[alert.id] = fragment
+            if len(view.alarms) > MAX_ALARMS:
+                view.alarms.popitem(last=False)
+            view.open_alarms += 1
+            view.changed("alarms")
+
+    def alert_closed(self, scheme_id: str, alert_id: int):
+        with self._lock:
+            view = self._view(scheme_id)
+            view.alarms.pop(alert_id, None)
+            view.open_alarms = max(0, view.open_alarms - 1)
+            view.changed("alarms")
+
+    # ---------- reads ----------
+
+    def _render_section(self, scheme_id: str, view: _SchemeView, section: str, now: float) -> str:
+        if section == "quality":
+            if view.quality is None or now - view.quality_at > QUALITY_TTL:
+                view.quality = json.dumps(self._quality_source(scheme_id))
+                view.quality_at = now
+            return view.quality
+        cached = view.rendered.get(section)
+        if cached is not None:
+            return cached
+        if section == "alarms":
+            cached = '{"open":%d,"recent":[%s]}' % (
+                view.open_alarms, ",".join(reversed(view.alarms.values())))
+        elif section == "energy":
+            pumps = {pid: {"power_kw": s[0], "kwh_today": round(s[1], 3)}
+                     for pid, s in view.energy.items()}
+            cached = json.dumps({
+                "total_power_kw": round(sum(s[0] for s in view.energy.values()), 3),
+                "kwh_today": round(sum(s[1] for s in view.energy.values()), 3),
+                "pumps": pumps,
+            })
+        else:
+            cached = "[%s]" % ",".join(view.fragments[section].values())
+        view.rendered[section] = cached
+        return cached
+
+    def render(self, scheme_id: str, fields: Optional[Iterable[str]] = None) -> Optional[str]:
+        """JSON document with the requested sections, or None for an unknown scheme."""
+        sections = SECTIONS if fields is None else [s for s in SECTIONS if s in set(fields)]
+        now = time.time()
+        with self._lock:
+            view = self._views.get(scheme_id)
+            if view is None:
+                return None
+            parts = [
+                '"schemeId":%s' % json.dumps(scheme_id),
+                '"version":%d' % view.version,
+                '"generatedAt":"%s"' % datetime.fromtimestamp(now, timezone.utc).isoformat(),
+            ]
+            for section in sections:
+                parts.append('"%s":%s' % (section, self._render_section(scheme_id, view, section, now)))
+        return "{%s}" % ",".join(parts)
@@ -0,0 +1,235 @@
+"""
+Per-node-type telemetry schemas for the Jalsense backend.
+
+Each node type lists the metrics it may report with their unit and physically
+plausible range (wide on purpose: anomalies must get through to the rules,
+only sensor garbage is stopped). Older firmware and the demo simulators use
+other names or units for some metrics; ALIASES maps those to the canonical
+name with a scale factor.
+
+Every schema is compiled once into a single lookup table:
+
+    reported name -> (canonical name, scale, low, high)
+
+``validate`` walks a payload once. For each key it does one dict lookup, a
+type check and a range check. The result is a clean {canonical: float} dict
+plus the keys that were rejected and why. Only the clean dict reaches
+node.latest_metrics, the rules and the archive. Names in METADATA, such as
+operator ids, are not measurements and are dropped without complaint.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import metrics
+
+STRICT = os.environ.get("GJJ_TELEMETRY_STRICT", "0") == "1"   # reject the whole reading on any bad key
+MAX_FUTURE = timedelta(minutes=5)   # device clock skew tolerated in reading times
+
+BINARY = ("binary", 0.0, 1.0)
+DAYS = ("days", -3650.0, 3650.0)
+
+SCHEMAS: Dict[str, Dict[str, Tuple[str, float, float]]] = {
+    "pump": {
+        "pumpRunningHours": ("hours", 0.0, 1e6),
+        "pumpEfficiency": ("%", 0.0, 100.0),
+        "pumpDischargeRate": ("L/min", 0.0, 1e5),
+        "powerConsumption": ("kW", 0.0, 1e4),
+        "voltage": ("V", 0.0, 1000.0),
+        "pumpCurrent": ("A", 0.0, 1000.0),
+        "motorTemperature": ("°C", -40.0, 250.0),
+        "flowRate": ("L/min", 0.0, 1e5),
+        "pressure": ("bar", -1.0, 100.0),
+        "flowDropIndicator": BINARY,
+        "pressureLossIndicator": BINARY,
+        "leakIndicator": BINARY,
+        "leakProbabilityScore": ("%", 0.0, 100.0),
+        "pumpStartCount": ("count/day", 0.0, 1e4),
+        "dailyPumpOperatingCost": ("₹", 0.0, 1e7),
+        "estimatedEnergyConsumed": ("kWh", 0.0, 1e6),
+        "dailyWaterProduction": ("liters", 0.0, 1e9),
+        "dailyAverageFlow": ("L/min", 0.0, 1e5),
+        "pumpServiceDueDate": DAYS,
+    },
+    "tank": {
+        "tankLevel": ("%", 0.0, 100.0),
+        "tankLevelLiters": ("L", 0.0, 1e9),
+        "tankFillingTime": ("hours", 0.0, 720.0),
+        "tankEmptinessHours": ("hours", 0.0, 8760.0),
+        "supplyDurationFromTank": ("hours", 0.0, 720.0),
+        "tankTemperature": ("°C", -20.0, 80.0),
+        "tankOverflow": BINARY,
+        "overflowAlerts": ("count/week", 0.0, 1e4),
+        "dailyWaterDistributed": ("liters", 0.0, 1e9),
+        "supplyHoursPerDay": ("hours", 0.0, 24.0),
+        "supplyCyclesPerDay": ("cycles", 0.0, 1000.0),
+        "monthlyOMCost": ("₹", 0.0, 1e8),
+        "tankServiceDueDate": DAYS,
+        "unexpectedFillingDelays": ("count/week", 0.0, 1e4),
+    },
+    "tap": {
+        "valveStatus": BINARY,
+        "valveOperationTime": ("hours", 0.0, 24.0),
+        "faultyValveDetection": BINARY,
+        "ph": ("pH", 0.0, 14.0),
+        "turbidity": ("NTU", 0.0, 4000.0),
+        "tds": ("mg/L", 0.0, 1e5),
+        "freeChlorine": ("mg/L", 0.0, 100.0),
+        "color": ("HCU", 0.0, 1000.0),
+        "temperature": ("°C", -10.0, 80.0),
+        "iron": ("mg/L", 0.0, 1000.0),
+        "fluoride": ("mg/L", 0.0, 100.0),
+        "nitrate": ("mg/L", 0.0, 1e4),
+        "hardness": ("mg/L as CaCO3", 0.0, 1e5),
+        "EC": ("µS/cm", 0.0, 2e5),
+        "coliformPresent": BINARY,
+        "qualityTestTime": ("hour", 0.0, 24.0),
+        "dailyInspectionDone": BINARY,
+        "inspectionTime": ("hour", 0.0, 24.0),
+        "waterQualityCompliancePercent": ("%", 0.0, 100.0),
+        "nextQualityTestDue": DAYS,
+    },
+    "valve": {
+        "valvePosition": ("%", 0.0, 100.0),
+        "valveOpenClosedStatus": BINARY,
+        "valveOperationCount": ("operations/week", 0.0, 1e6),
+        "faultyValveDetection": BINARY,
+        "valveLeakage": ("L/hour", 0.0, 1e5),
+        "valveServiceDueDate": DAYS,
+        "repairEvents": ("count/month", 0.0, 1e4),
+    },
+}
+
+# reported name -> (canonical name, scale to the canonical unit)
+ALIASES: Dict[str, Dict[str, Tuple[str, float]]] = {
+    "pump": {
+        "flow": ("flowRate", 1.0),
+        "pumpDischarge": ("pumpDischargeRate", 1.0),
+        "pumpPower": ("powerConsumption", 1.0),
+    },
+    "tank": {
+        "tankSupplyDuration": ("supplyDurationFromTank", 1.0 / 60.0),   # sim.py reports minutes
+    },
+    "tap": {
+        "waterTemp": ("temperature", 1.0),
+    },
+    "valve": {},
+}
+
+METADATA = frozenset({"qualitySamplingOperator"})
+
+TELEMETRY_REJECTED = metrics.counter(
+    "gjj_telemetry_rejected_total", "Telemetry keys rejected by schema validation", ("node_type", "reason")
+)
+TIMESTAMPS_CLAMPED = metrics.counter(
+    "gjj_telemetry_timestamps_clamped_total", "Reading times too far ahead, replaced by the arrival time",
+    ("node_type",),
+)
+
+_UNKNOWN = object()
+
+
+class CompiledSchema:
+    """
+    ``ranges`` covers canonical names only, so the common reading - known
+    names, JSON numbers, in range - is one lookup and one chained comparison
+    per key. Aliases, metadata, strings and rejects take the slow path.
+    """
+
+    __slots__ = ("node_type", "ranges", "aliases")
+
+    def __init__(self, node_type: str):
+        self.node_type = node_type
+        self.ranges: Dict[str, Tuple[float, float]] = {
+            name: (low, high) for name, (_, low, high) in SCHEMAS[node_type].items()
+        }
+        self.aliases: Dict[str, Optional[Tuple[str, float]]] = dict(ALIASES.get(node_type, {}))
+        for name in METADATA:
+            self.aliases[name] = None
+
+    def validate(self, raw: Dict[str, Any]) -> Tuple[Dict[str, float], Dict[str, str]]:
+        clean: Dict[str, float] = {}
+        ranges = self.ranges
+        slow = None
+        for name, value in raw.items():
+            bounds = ranges.get(name)
+            cls = value.__class__
+            if bounds is not None and (cls is float or cls is int) and bounds[0] <= value <= bounds[1]:
+                clean[name] = float(value)
+            else:
+                if slow is None:
+                    slow = []
+                slow.append(name)
+        rejected: Dict[str, str] = {}
+        if slow is not None:
+            for name in slow:
+                self._slow(name, raw[name], raw, clean, rejected)
+            for reason in rejected.values():
+                TELEMETRY_REJECTED.labels(self.node_type, reason.split(" [")[0]).inc()
+        return clean, rejected
+
+    def _slow(self, name: str, value: Any, raw: Dict[str, Any], clean: Dict[str, float], rejected: Dict[str, str]):
+        canonical, scale = name, 1.0
+        if name not in self.ranges:
+            alias = self.aliases.get(name, _UNKNOWN)
+            if alias is None:
+                return                                  # metadata
+            if alias is _UNKNOWN:
+                rejected[name] = "unknown metric"
+                return
+            canonical, scale = alias
+            if canonical in raw:
+                return                                  # the canonical key wins over its alias
+        try:
+            value = float(value) * scale                # bools and numeric strings from lax gateways
+        except (TypeError, ValueError):
+            rejected[name] = "not a number"
+            return
+        low, high = self.ranges[canonical]
+        if not low <= value <= high:                    # also rejects NaN
+            rejected[name] = f"out of range [{low:g}, {high:g}] {SCHEMAS[self.node_type][canonical][0]}"
+            return
+        clean[canonical] = value
+
+
+COMPILED: Dict[str, CompiledSchema] = {node_type: CompiledSchema(node_type) for node_type in SCHEMAS}
+
+
+def as_utc(ts: datetime) -> datetime:
+    """Reading times without an offset are taken as UTC; others are converted to it."""
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def reading_time(node_type: str, ts: Optional[datetime], now: datetime) -> datetime:
+    """
+    The UTC time to file a reading under. A missing time, or one more than
+    MAX_FUTURE ahead of ``now``, becomes ``now``: one device with a fast clock
+    would otherwise move the compliance windows and the water-balance day
+    ahead and every correctly dated reading after it would be discarded.
+    """
+    if ts is None:
+        return now
+    ts = as_utc(ts)
+    if ts > now + MAX_FUTURE:
+        TIMESTAMPS_CLAMPED.labels(node_type).inc()
+        return now
+    return ts
+
+
+def validate(node_type: str, raw: Dict[str, Any]) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """Clean metrics for a node type, plus {reported key: reason} for rejects."""
+    return COMPILED[node_type].validate(raw)
+
+
+def describe(node_type: str) -> Optional[Dict]:
+    if node_type not in SCHEMAS:
+        return None
+    return {
+        "type": node_type,
+        "metrics": {name: {"unit": unit, "min": low, "max": high}
+                    for name, (unit, low, high) in SCHEMAS[node_type].items()},
+        "aliases": {alias: {"metric": name, "scale": scale}
+                    for alias, (name, scale) in ALIASES.get(node_type, {}).items()},
+        "metadata": sorted(METADATA),
+    }
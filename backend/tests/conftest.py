@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# backend modules are flat, imported by name the way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("GJJ_AUTH_DISABLED", "1")
+os.environ.setdefault("GJJ_TELEMETRY_DIR", tempfile.mkdtemp(prefix="gjj-telemetry-"))
@@ -0,0 +1,136 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import admission
+import main
+import telemetry_schema
+from admission import ADMITTED, COALESCED, CRITICAL, ROUTINE, SHED, AdmissionController, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _controller(**limits):
+    return AdmissionController(lambda payload: None, **limits)
+
+
+def _shed(reason):
+    return admission.INGEST_SHED.labels(reason).value
+
+
+def test_critical_signals_exist_in_schema():
+    for node_type, signals in admission.CRITICAL_SIGNALS.items():
+        assert set(signals) <= set(telemetry_schema.SCHEMAS[node_type]), node_type
+
+
+@pytest.mark.parametrize("node_type, readings, priority", [
+    ("tank", {"tankOverflow": 1, "tankLevel": 50}, CRITICAL),
+    ("tank", {"tankLevel": 10}, CRITICAL),
+    ("tank", {"tankLevel": 50}, ROUTINE),
+    ("tap", {"coliformPresent": 1}, CRITICAL),
+    ("pump", {"motorTemperature": 60}, ROUTINE),
+    ("sensor", {"tankOverflow": 1}, ROUTINE),
+])
+def test_classify(node_type, readings, priority):
+    assert admission.classify(node_type, readings) == priority
+
+
+def test_bucket_refills_at_rate_up_to_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=3.0, now=0.0)
+    assert [bucket.take(0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(0.5) and not bucket.take(0.5)
+    bucket.take(100.0)
+    assert bucket.tokens == 2.0
+
+
+def test_rate_limited_reading_is_coalesced_then_refilled(clock):
+    ctl = _controller(rate=1.0, burst=1.0)
+    assert ctl.admit("gw:a", "n1", ROUTINE, "p1") == ADMITTED
+    assert ctl.admit("gw:a", "n2", ROUTINE, "p2") == COALESCED
+    clock[0] += 1.0
+    assert ctl.admit("gw:a", "n3", ROUTINE, "p3") == ADMITTED
+
+
+def test_buckets_are_per_source(clock):
+    ctl = _controller(rate=1.0, burst=1.0)
+    assert ctl.admit("gw:a", "n1", ROUTINE, "p") == ADMITTED
+    assert ctl.admit("gw:b", "n2", ROUTINE, "p") == ADMITTED
+    assert ctl.admit("gw:a", "n3", ROUTINE, "p") == COALESCED
+    assert ctl.stats()["gateways"] == 2
+
+
+def test_critical_is_admitted_past_every_limit(clock):
+    ctl = _controller(rate=1.0, burst=1.0, max_inflight=1, max_coalesced=0)
+    ctl.admit("gw:a", "n1", ROUTINE, "p")
+    assert ctl.admit("gw:a", "n2", CRITICAL, "p") == ADMITTED
+    assert ctl.stats()["inflight"] == 2
+
+
+def test_max_inflight_defers_until_release(clock):
+    ctl = _controller(max_inflight=1)
+    assert ctl.admit("gw:a", "n1", ROUTINE, "p") == ADMITTED
+    assert ctl.admit("gw:a", "n2", ROUTINE, "p") == COALESCED
+    assert ctl._take_batch() == []
+    ctl.release()
+    assert ctl._take_batch() == ["p"]
+
+
+def test_newer_reading_supersedes_deferred_one(clock):
+    ctl = _controller(max_inflight=0)
+    before = _shed("superseded")
+    ctl.admit("gw:a", "n1", ROUTINE, "old")
+    ctl.admit("gw:a", "n1", ROUTINE, "new")
+    assert _shed("superseded") == before + 1
+    assert ctl.stats()["deferred"] == 1
+    ctl.max_inflight = 1
+    assert ctl.admit("gw:a", "n1", CRITICAL, "critical") == ADMITTED
+    assert _shed("superseded") == before + 2
+    assert ctl.stats()["deferred"] == 0
+
+
+def test_full_coalescing_table_sheds_new_nodes_only(clock):
+    ctl = _controller(max_inflight=0, max_coalesced=1)
+    before = _shed("dropped")
+    assert ctl.admit("gw:a", "n1", ROUTINE, "p") == COALESCED
+    assert ctl.admit("gw:a", "n2", ROUTINE, "p") == SHED
+    assert ctl.admit("gw:a", "n1", ROUTINE, "p") == COALESCED
+    assert _shed("dropped") == before + 1
+    assert ctl.stats()["decisions"] == {"routine.coalesced": 2, "routine.shed": 1}
+
+
+def test_admission_source_keys_by_identity():
+    request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.7"))
+    assert main._admission_source(main.ANONYMOUS, request) == "addr:10.0.0.7"
+    assert main._admission_source({"sub": "north", "role": "gateway"}, request) == "gateway:north"
+    assert main._admission_source({"sub": "P-1", "role": "device"}, request) == "device:P-1"
+
+
+def test_critical_reading_runs_on_reserved_thread(monkeypatch):
+    threads = []
+    monkeypatch.setattr(main, "_apply_telemetry",
+                        lambda node, payload: threads.append(threading.current_thread().name))
+    client = TestClient(main.app)
+    for metrics_in, priority in [({"tankOverflow": 1}, CRITICAL), ({"tankLevel": 50}, ROUTINE)]:
+        response = client.post("/api/telemetry", json={"nodeId": "tank-1", "metrics": metrics_in})
+        assert response.json()["priority"] == priority
+    assert threads[0].startswith("ingest-critical") and not threads[1].startswith("ingest-critical")
+
+
+def test_overtaken_reading_is_not_applied():
+    node = main.NODES["pump-1"]
+    stale = main.INGEST_REQUESTS.labels("pump", "stale")
+    before = stale.value
+    newer = datetime.now(timezone.utc)
+    main.process_telemetry(main.TelemetryIn(nodeId="pump-1", metrics={"flowRate": 10.0}, timestamp=newer))
+    main.process_telemetry(main.TelemetryIn(nodeId="pump-1", metrics={"flowRate": 99.0},
+                                            timestamp=newer - timedelta(seconds=30)))
+    assert node.latest_metrics["flowRate"] == 10.0 and node.last_updated == newer
+    assert stale.value == before + 1
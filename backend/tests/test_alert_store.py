@@ -0,0 +1,47 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from alert_store import AlertArchive, AlertStore
+
+NOW = datetime(2026, 6, 30, 12, tzinfo=timezone.utc)
+
+
+class FakeAlert:
+    def __init__(self, alert_id, age_days, acknowledged):
+        self.id = alert_id
+        self.created_at = NOW - timedelta(days=age_days)
+        self.acknowledged = acknowledged
+
+    def json(self):
+        return json.dumps({"id": self.id, "created_at": self.created_at.isoformat(),
+                           "acknowledged": self.acknowledged})
+
+
+def _store(tmp_path, retention, alerts):
+    store = AlertStore(AlertArchive(str(tmp_path)), retention_days=retention)
+    for alert_id, (age, acked) in enumerate(alerts, 1):
+        store.add(FakeAlert(alert_id, age, acked))
+    return store
+
+
+@pytest.mark.parametrize("retention", [7, 10, 30])
+def test_only_acknowledged_alerts_expire(tmp_path, retention):
+    ages = [40, 35, 20, 12, 9, 8, 5, 1]
+    alerts = [(age, acked) for age in ages for acked in (False, True)]
+    store = _store(tmp_path, retention, alerts)
+    store.compact(NOW)
+    kept = {(round((NOW - a.created_at).days), a.acknowledged) for a in store.values()}
+    assert kept == {(age, acked) for age, acked in alerts if not acked or age < retention}
+    archived = list(store.archive.query())
+    assert archived and all(record["acknowledged"] for record in archived)
+
+
+def test_open_alerts_stay_hot_until_acknowledged(tmp_path):
+    store = _store(tmp_path, retention=7, alerts=[(60, False), (10, True), (1, False)])
+    assert store.compact(NOW)["archived"] == 1
+    assert [a.id for a in store.values(only_open=True)] == [1, 3]
+    assert store.acknowledge(store.get(1)) and not store.acknowledge(store.get(1))
+    assert store.compact(NOW)["archived"] == 1
+    assert [a.id for a in store.values()] == [3]
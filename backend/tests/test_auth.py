@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth
+import main
+
+SECRET = b"test-secret"
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    return now
+
+
+def test_verify_round_trip_and_tamper(clock):
+    authority = auth.TokenAuthority(SECRET)
+    token = authority.issue("u-tech", "technician")
+    assert authority.verify(token)["sub"] == "u-tech"
+    body, _, signature = token.partition(".")
+    with pytest.raises(auth.AuthError, match="Invalid"):
+        authority.verify(f"{body}.{signature[::-1]}")
+    with pytest.raises(auth.AuthError, match="Invalid"):
+        auth.TokenAuthority(b"other").verify(token)
+
+
+def test_cached_token_still_expires(clock):
+    authority = auth.TokenAuthority(SECRET)
+    token = authority.issue("u-tech", "technician", ttl=60)
+    authority.verify(token)
+    clock[0] += 61
+    with pytest.raises(auth.AuthError, match="expired"):
+        authority.verify(token)
+    assert token not in authority._cache
+
+
+def test_revocation_beats_cache(clock):
+    authority = auth.TokenAuthority(SECRET)
+    token = authority.issue("u-tech", "technician")
+    authority.revoke(authority.verify(token))
+    with pytest.raises(auth.AuthError, match="revoked"):
+        authority.verify(token)
+
+
+def test_eviction_drops_expired_then_least_recently_used(clock):
+    authority = auth.TokenAuthority(SECRET, cache_size=2)
+    short = authority.issue("a", "guest", ttl=10)
+    old, recent = authority.issue("b", "guest"), authority.issue("c", "guest")
+    authority.verify(short)
+    authority.verify(old)
+    clock[0] += 11
+    authority.verify(recent)
+    assert list(authority._cache) == [old, recent]
+    authority.verify(old)                          # now most recently used
+    authority.verify(authority.issue("d", "guest"))
+    assert recent not in authority._cache and old in authority._cache
+
+
+@pytest.mark.parametrize("method, path", [
+    ("post", "/api/alerts/1/ack"),
+    ("post", "/api/service-requests"),
+    ("put", "/api/service-requests/SR-1"),
+    ("patch", "/api/service-requests/SR-1/status"),
+    ("post", "/api/service-requests/SR-1/assign"),
+    ("post", "/api/service-requests/SR-1/comments"),
+    ("post", "/api/service-requests/SR-1/rate"),
+])
+def test_mutations_require_operator(monkeypatch, method, path):
+    monkeypatch.setattr(auth, "AUTH_ENABLED", True)
+    client = TestClient(main.app)
+    assert getattr(client, method)(path, json={}).status_code == 401
+    guest = {"Authorization": f"Bearer {auth.AUTHORITY.issue('u-guest', 'guest')}"}
+    assert getattr(client, method)(path, json={}, headers=guest).status_code == 403
+
+
+@pytest.mark.parametrize("path, role", [
+    ("/api/service-requests", "guest"),
+    ("/api/service-requests/export/csv", "guest"),
+    ("/api/service-requests/REQ-0001", "guest"),
+    ("/api/alerts/archive", None),
+    ("/api/commands", None),
+    ("/api/commands/cmd-1", None),
+])
+def test_reads_require_login(monkeypatch, path, role):
+    monkeypatch.setattr(auth, "AUTH_ENABLED", True)
+    client = TestClient(main.app)
+    assert client.get(path).status_code == 401
+    if role is not None:
+        headers = {"Authorization": f"Bearer {auth.AUTHORITY.issue('u-guest', role)}"}
+        assert client.get(path, headers=headers).status_code == 403
+
+
+@pytest.mark.parametrize("password, users", [(None, 0), ("s3cret-demo", 4)])
+def test_demo_users_need_an_explicit_password(password, users):
+    env = {k: v for k, v in os.environ.items() if k != "GJJ_DEMO_PASSWORD"}
+    if password:
+        env["GJJ_DEMO_PASSWORD"] = password
+    out = subprocess.run([sys.executable, "-c", "import auth; print(len(auth.USERS))"],
+                         cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    assert int(out.stdout) == users
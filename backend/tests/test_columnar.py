@@ -0,0 +1,99 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import columnar
+import main
+from columnar import ColumnarReader, ColumnarWriter
+
+DAY0 = datetime(2026, 10, 15, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    writer = ColumnarWriter(root=str(tmp_path))
+    return writer, ColumnarReader(root=str(tmp_path))
+
+
+def _rows(start, count, step=timedelta(minutes=10)):
+    return [(start + i * step, {"motorTemperature": 60.0 + i * 0.5, "pumpStatus": i % 2}) for i in range(count)]
+
+
+def test_seal_and_scan_round_trip(archive):
+    writer, reader = archive
+    rows = _rows(DAY0, 5)
+    for ts, values in reversed(rows):           # out-of-order arrival
+        writer.append("pump-1", "pump", "s1", ts, values)
+    writer.append("pump-1", "pump", "s1", DAY0, {"bad/name": 1.0})
+    assert writer.seal() == 6
+    parts = list(reader.scan(["motorTemperature", "pumpStatus"], start=DAY0, end=DAY0 + timedelta(minutes=30)))
+    assert len(parts) == 1
+    part = parts[0]
+    assert part.ts.tolist() == [columnar._to_ms(DAY0)] * 2 + [columnar._to_ms(ts) for ts, _ in rows[1:3]]
+    assert part.columns["pumpStatus"].dtype == np.float32       # NaN for the unnamed row
+    assert part.meta.columns["motorTemperature"]["max"] == 62.0
+    assert set(part.meta.columns) == {"motorTemperature", "pumpStatus"}
+
+
+def test_where_skips_segments_by_min_max(archive):
+    writer, reader = archive
+    writer.append_many("pump-1", "pump", "s1", _rows(DAY0, 3))
+    writer.seal()
+    assert list(reader.scan(["motorTemperature"], where=("motorTemperature", 70.0, None))) == []
+    assert len(list(reader.scan(["motorTemperature"], where=("motorTemperature", 61.0, None)))) == 1
+
+
+def test_compact_merges_finished_days(archive):
+    writer, reader = archive
+    for offset in (0, 3, 6):
+        writer.append_many("pump-1", "pump", "s1", _rows(DAY0 + timedelta(hours=offset), 2))
+        writer.seal()
+    writer.append_many("pump-1", "pump", "s1", _rows(DAY0 + timedelta(days=1), 2))
+    writer.seal()
+    assert writer.compact(now=DAY0 + timedelta(days=1, hours=1)) == 3
+    assert [meta.rows for meta in reader.segments()] == [6, 2]
+    part = next(reader.scan(["motorTemperature"]))
+    assert np.all(np.diff(part.ts) >= 0)
+    writer.stop()                               # past the grace period: replaced dirs are gone
+    assert len([n for n in os.listdir(os.path.join(writer.root, "pump-1")) if n.startswith("seg-")]) == 2
+
+
+def test_unlisted_segments_are_recovered(archive):
+    writer, reader = archive
+    writer.append_many("tank-1", "tank", "s1", _rows(DAY0, 2))
+    writer.seal()
+    os.remove(os.path.join(writer.root, "tank-1", columnar.MANIFEST))   # crash before the manifest line
+    restarted = ColumnarWriter(root=writer.root)
+    restarted.append_many("tank-1", "tank", "s1", _rows(DAY0 + timedelta(hours=1), 2))
+    restarted.seal()
+    assert [meta.rows for meta in reader.segments(["tank-1"])] == [2, 2]
+
+
+def test_full_buffer_starts_one_seal(archive, monkeypatch):
+    writer, _ = archive
+    writer.seal_rows = 2
+    started = []
+    release = threading.Event()
+
+    def slow_seal(node_id):
+        started.append(node_id)
+        release.wait(5)
+
+    monkeypatch.setattr(writer, "seal", slow_seal)
+    for ts, values in _rows(DAY0, 6):
+        writer.append("pump-1", "pump", "s1", ts, values)
+    writer.append_many("pump-1", "pump", "s1", _rows(DAY0, 2))
+    assert started == ["pump-1"]
+    release.set()
+
+
+def test_export_rejects_unknown_node_ids():
+    client = TestClient(main.app)
+    assert client.get("/api/telemetry/export", params={"node_id": "../pump-1"}).status_code == 404
+    response = client.post("/api/rules/backtest", json={"node_ids": ["pump-1", "/etc"]})
+    assert response.status_code == 404
+    assert client.get("/api/telemetry/export", params={"node_id": "pump-1"}).status_code == 200
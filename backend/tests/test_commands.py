@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from commands import SENT, CommandDispatcher
+
+
+class FakeTransport:
+    def __init__(self):
+        self.on_ack = None
+        self.published = []
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, command):
+        self.published.append(command)
+        return True
+
+
+def test_ack_from_the_target_node_settles_the_command():
+    transport = FakeTransport()
+    dispatcher = CommandDispatcher(transport)
+    command = dispatcher.submit("pump-1", "pump", "start")
+    transport.on_ack("pump-1", {"commandId": command.id, "status": "EXECUTED"})
+    assert dispatcher.get(command.id).status == "EXECUTED"
+    assert dispatcher.pending() == []
+
+
+def test_ack_from_another_node_is_ignored():
+    transport = FakeTransport()
+    dispatcher = CommandDispatcher(transport)
+    command = dispatcher.submit("pump-1", "pump", "stop")
+    transport.on_ack("valve-3", {"commandId": command.id, "status": "EXECUTED"})
+    assert dispatcher.get(command.id).status == SENT
+    assert [c.id for c in dispatcher.pending("pump-1")] == [command.id]
+    assert dispatcher.acknowledge(command.id, "EXECUTED", node_id="valve-3") is None
+    assert dispatcher.acknowledge(command.id, "EXECUTED", node_id="pump-1").status == "EXECUTED"
+
+
+def test_ack_without_node_is_matched_by_id():
+    dispatcher = CommandDispatcher(FakeTransport())
+    command = dispatcher.submit("valve-1", "valve", "open")
+    assert dispatcher.acknowledge(command.id, "rejected", "jammed").status == "REJECTED"
+    assert dispatcher.acknowledge(command.id) is None
+
+
+@pytest.mark.parametrize("reported", ["ERROR", "timeout", ""])
+def test_unknown_or_server_only_status_settles_as_failed(reported):
+    transport = FakeTransport()
+    dispatcher = CommandDispatcher(transport)
+    command = dispatcher.submit("pump-1", "pump", "start")
+    transport.on_ack("pump-1", {"commandId": command.id, "status": reported, "reason": "relay stuck"})
+    settled = dispatcher.get(command.id)
+    assert settled.status == "FAILED"
+    assert settled.reason == f"device reported status {reported.upper()!r}: relay stuck"
+
+
+def test_http_ack_requires_node_and_known_status(monkeypatch):
+    dispatcher = CommandDispatcher(FakeTransport())
+    monkeypatch.setattr(main, "COMMANDS", dispatcher)
+    command = dispatcher.submit("pump-1", "pump", "start")
+    client = TestClient(main.app)
+    url = f"/api/commands/{command.id}/ack"
+    assert client.post(url, json={"status": "EXECUTED"}).status_code == 422
+    assert client.post(url, json={"nodeId": "pump-1", "status": "ERROR"}).status_code == 422
+    assert client.post(url, json={"nodeId": "valve-1", "status": "EXECUTED"}).status_code == 404
+    assert client.post(url, json={"nodeId": "pump-1", "status": "executed"}).json()["status"] == "EXECUTED"
@@ -0,0 +1,71 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import forecasting
+from forecasting import TankForecaster
+
+
+def _feed(tank, start, step, levels):
+    for i, level in enumerate(levels):
+        tank.add(start + i * step, level)
+    return tank.forecast()
+
+
+def test_burst_of_readings_is_not_extrapolated():
+    tank = TankForecaster()
+    result = _feed(tank, 1000.0, 0.001, [50.0, 50.2, 49.9, 50.4, 50.1])
+    assert result["rate_pct_per_hour"] is not None
+    assert result["time_to_overflow_hours"] is None
+    assert result["time_to_empty_hours"] is None
+    assert tank.warning is None
+
+
+def test_steady_drain_forecasts_and_warns():
+    tank = TankForecaster()
+    result = _feed(tank, 1000.0, 5.0, [16.3 - i * 0.005 for i in range(64)])
+    assert result["span_minutes"] >= forecasting.MIN_SPAN / 60.0
+    assert result["r_squared"] > 0.99
+    assert abs(result["rate_pct_per_hour"] + 3.6) < 0.01
+    assert 0 < result["time_to_critical_hours"] <= forecasting.EMPTY_WARNING_HOURS
+    assert tank.warning == "empty"
+
+
+def test_noise_without_trend_is_not_extrapolated():
+    rng = random.Random(3)
+    tank = TankForecaster()
+    result = _feed(tank, 1000.0, 5.0, [90.0 + rng.gauss(0, 2.0) for _ in range(64)])
+    assert result["r_squared"] < forecasting.MIN_R2
+    assert result["time_to_overflow_hours"] is None and result["time_to_empty_hours"] is None
+    assert tank.warning is None
+
+
+def test_flat_level_has_no_forecast():
+    result = _feed(TankForecaster(), 1000.0, 5.0, [50.0] * 200)
+    assert result["rate_pct_per_hour"] == 0.0
+    assert result["time_to_empty_hours"] is None and result["time_to_overflow_hours"] is None
+
+
+def test_window_slides_and_sums_are_rebuilt():
+    tank = TankForecaster()
+    # a long fill, then a drain: after a full window only the drain is fitted
+    _feed(tank, 0.0, 5.0, [20.0 + i * 0.01 for i in range(300)])
+    result = _feed(tank, 2000.0, 5.0, [60.0 - i * 0.01 for i in range(forecasting.WINDOW)])
+    assert result["samples"] == forecasting.WINDOW
+    assert abs(result["rate_pct_per_hour"] + 7.2) < 1e-6
+
+
+def test_out_of_order_reading_is_ignored():
+    tank = TankForecaster()
+    assert tank.add(10.0, 50.0)
+    assert not tank.add(10.0, 51.0)
+    assert not tank.add(5.0, 51.0)
+
+
+def test_registry_reports_warning_once():
+    registry = forecasting.ForecastRegistry()
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    warnings = []
+    for i in range(80):
+        _, new = registry.update("tank-1", start + timedelta(seconds=5 * i), 16.3 - i * 0.005)
+        warnings.append(new)
+    assert warnings.count("empty") == 1
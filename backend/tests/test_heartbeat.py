@@ -0,0 +1,59 @@
+import time
+
+from heartbeat import HeartbeatMonitor, TimerWheel
+
+
+def test_expires_at_deadline_not_before():
+    wheel = TimerWheel(tick=1.0, slots=8, now=100.0)
+    wheel.arm("a", 3.0, now=100.0)
+    assert wheel.advance(102.0) == []
+    assert wheel.advance(103.0) == ["a"]
+    assert len(wheel) == 0
+    assert wheel.advance(120.0) == []
+
+
+def test_timeout_longer_than_a_revolution_waits_for_its_round():
+    wheel = TimerWheel(tick=1.0, slots=8, now=0.0)
+    wheel.arm("far", 20.0, now=0.0)        # 2.5 revolutions away, shares a slot with tick 4 and 12
+    wheel.arm("near", 4.0, now=0.0)
+    assert wheel.advance(4.0) == ["near"]
+    assert wheel.advance(12.0) == []
+    assert wheel.advance(19.0) == []
+    assert wheel.advance(20.0) == ["far"]
+
+
+def test_rearm_moves_the_single_entry():
+    wheel = TimerWheel(tick=1.0, slots=8, now=0.0)
+    wheel.arm("a", 3.0, now=0.0)
+    wheel.arm("a", 3.0, now=2.0)
+    assert len(wheel) == 1
+    assert wheel.advance(4.0) == []
+    assert wheel.advance(5.0) == ["a"]
+
+
+def test_arm_never_lands_behind_the_cursor():
+    wheel = TimerWheel(tick=1.0, slots=8, now=0.0)
+    wheel.advance(10.0)
+    wheel.arm("late", 1.0, now=5.0)        # caller's clock behind the cursor
+    assert wheel.advance(11.0) == ["late"]
+
+
+def test_cancel():
+    wheel = TimerWheel(tick=1.0, slots=8, now=0.0)
+    wheel.arm("a", 2.0, now=0.0)
+    wheel.cancel("a")
+    wheel.cancel("a")
+    assert wheel.advance(5.0) == []
+
+
+def test_node_reporting_before_its_expiry_is_handled_is_not_marked_offline():
+    now = time.monotonic()
+    offline = []
+    monitor = HeartbeatMonitor(lambda node_id: offline.append(node_id) or monitor.touch("b", "tank", now + 10),
+                               default_timeout=5.0)
+    monitor.touch("a", "tank", now)
+    monitor.touch("b", "tank", now)
+    # both expire in the same pass; "a"'s handler stands in for b's reading arriving meanwhile
+    assert monitor.expire(now + 10) == ["a"]
+    assert offline == ["a"]
+    assert monitor.expire(now + 20) == ["b"]
@@ -0,0 +1,107 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+import hierarchy
+from hierarchy import HierarchyRollups
+
+SCHEMES = {
+    "S1": {"district": "Pune", "block": "Haveli", "village": "Khed"},
+    "S2": {"district": "Pune", "block": "Haveli", "village": "Kondhwa"},
+    "S3": {"district": "Pune", "block": "Mulshi", "village": "Paud"},
+}
+T0 = datetime(2026, 10, 18, 6, tzinfo=timezone.utc)
+TODAY = int(T0.timestamp() // 86400)
+
+
+def _rollups():
+    return HierarchyRollups(dict(SCHEMES))
+
+
+def test_schemes_are_placed_and_unknown_ones_unassigned():
+    rollups = _rollups()
+    assert rollups.place("S1") == {"district": "Pune", "block": "Haveli", "village": "Khed", "scheme": "S1"}
+    assert set(rollups.place("S9").values()) == {hierarchy.UNASSIGNED, "S9"}
+    assert [c["name"] for c in rollups.get((), TODAY, children=True)["children"]] == ["Pune", hierarchy.UNASSIGNED]
+
+
+def test_status_changes_move_counts_along_the_path():
+    rollups = _rollups()
+    rollups.node_changed("pump-1", "S1", "OK")
+    rollups.node_changed("tank-1", "S2", "OK")
+    rollups.node_changed("pump-1", "S1", "CRITICAL")
+    rollups.node_changed("pump-1", "S1", "CRITICAL")          # no change, no delta
+    rollups.node_changed("tank-1", "S3", "OK")                 # moved scheme
+    block = rollups.get(("Pune", "Haveli"), TODAY)
+    assert block["nodes"] == {"total": 1, "OK": 0, "WARNING": 0, "CRITICAL": 1, "OFFLINE": 0}
+    assert rollups.get(("Pune",), TODAY)["nodes"]["total"] == 2
+    assert rollups.scheme("S3", TODAY)["nodes"]["OK"] == 1 and rollups.scheme("S4", TODAY) is None
+
+
+def test_alerts_open_and_close_without_going_negative():
+    rollups = _rollups()
+    rollups.alert_opened("S1", "high")
+    rollups.alert_opened("S2", "low")
+    rollups.alert_closed("S1", "high")
+    rollups.alert_closed("S1", "high")
+    assert rollups.get((), TODAY)["open_alerts"] == {"total": 1, "low": 1, "medium": 0, "high": 0}
+    assert rollups.scheme("S1", TODAY)["open_alerts"]["high"] == 0
+
+
+def test_pump_usage_adds_growth_per_day():
+    rollups = _rollups()
+    rollups.pump_usage("pump-1", "S1", T0, 100.0, 5000.0)       # first sighting sets the baseline
+    rollups.pump_usage("pump-1", "S1", T0 + timedelta(hours=1), 101.0, 8000.0)
+    rollups.pump_usage("pump-2", "S3", T0, 10.0, 0.0)
+    rollups.pump_usage("pump-2", "S3", T0 + timedelta(hours=2), 12.0, 1000.0)
+    rollups.pump_usage("pump-1", "S1", T0 + timedelta(days=1), 101.5, 9000.0)
+    district = rollups.get(("Pune",), TODAY)
+    assert (district["supply_hours_today"], district["water_production_litres_today"]) == (3.0, 4000.0)
+    assert rollups.get(("Pune",), TODAY + 1)["supply_hours_7d"] == 3.5
+    assert rollups.get(("Pune",), TODAY + 1)["water_production_litres_today"] == 1000.0
+
+
+def test_usage_history_keeps_a_week():
+    rollups = _rollups()
+    rollups.pump_usage("pump-1", "S1", T0, 0.0, 0.0)
+    for day in range(1, 10):
+        rollups.pump_usage("pump-1", "S1", T0 + timedelta(days=day), float(day), 0.0)
+    scheme = rollups.scheme("S1", TODAY + 9)
+    assert scheme["supply_hours_7d"] == 7.0
+    assert len(rollups._root.days) == hierarchy.HISTORY_DAYS
+
+
+def test_random_deltas_match_recount():
+    rng = random.Random(3)
+    rollups = _rollups()
+    status, alerts = {}, {}
+    for _ in range(500):
+        scheme = rng.choice(list(SCHEMES))
+        if rng.random() < 0.5:
+            node = f"n{rng.randint(1, 20)}"
+            status[node] = (scheme, rng.choice(hierarchy.STATUSES))
+            rollups.node_changed(node, *status[node])
+        else:
+            severity = rng.choice(hierarchy.SEVERITIES)
+            key = (scheme, severity)
+            if rng.random() < 0.6:
+                alerts[key] = alerts.get(key, 0) + 1
+                rollups.alert_opened(scheme, severity)
+            elif alerts.get(key):
+                alerts[key] -= 1
+                rollups.alert_closed(scheme, severity)
+    for path in [(), ("Pune",), ("Pune", "Haveli"), ("Pune", "Haveli", "Khed")]:
+        below = {s for s, place in SCHEMES.items()
+                 if tuple(place[level] for level in ("district", "block", "village"))[:len(path)] == path}
+        rollup = rollups.get(path, TODAY)
+        assert rollup["nodes"]["total"] == sum(s in below for s, _ in status.values())
+        for name in hierarchy.STATUSES:
+            assert rollup["nodes"][name] == sum(s in below and st == name for s, st in status.values())
+        assert rollup["open_alerts"]["total"] == sum(n for (s, _), n in alerts.items() if s in below)
+
+
+def test_config_file_is_loaded(tmp_path):
+    path = tmp_path / "hierarchy.json"
+    path.write_text(json.dumps({"schemes": {"S1": SCHEMES["S1"]}}))
+    assert hierarchy.load_schemes(str(path)) == {"S1": SCHEMES["S1"]}
+    assert hierarchy.load_schemes(str(tmp_path / "missing.json")) == hierarchy.DEFAULT_SCHEMES
@@ -0,0 +1,103 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import lab_results
+import main
+
+NOW = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+TAPS = {"tap-1", "tap-2"}
+
+
+def _import(text, **kwargs):
+    batches = []
+    report, summaries = lab_results.import_csv(
+        io.BytesIO(text.encode("utf-8")), TAPS, batches.append, now=NOW, **kwargs)
+    return report, summaries, batches
+
+
+def test_header_aliases_and_metadata():
+    report, summaries, batches = _import(
+        "﻿TapID,Timestamp,PH,waterTemp,labId,Analyst\n"
+        "tap-1,2026-10-18T09:00:00+05:30,7.1,24.5,DL-1,ravi\n")
+    assert report["accepted"] == 1 and report["ignored_columns"] == ["Analyst"]
+    ts, metrics, _ = batches[0]["tap-1"][0]
+    assert metrics == {"ph": 7.1, "temperature": 24.5}
+    assert ts == datetime(2026, 10, 18, 3, 30, tzinfo=timezone.utc) and ts.tzinfo is timezone.utc
+    assert summaries["tap-1"].latest == (ts, metrics)
+
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_delimiter_is_sniffed_from_header(delimiter):
+    rows = [["tapId", "sampledAt", "ph", "tds"], ["tap-1", "2026-10-18T08:00:00", "7.0", "410"]]
+    report, _, batches = _import("\n".join(delimiter.join(r) for r in rows) + "\n")
+    assert report["accepted"] == 1
+    assert batches[0]["tap-1"][0][1] == {"ph": 7.0, "tds": 410.0}
+
+
+def test_bad_rows_are_rejected_whole_and_reported():
+    report, summaries, _ = _import(
+        "tapId,sampledAt,ph,turbidity\n"
+        "tap-1,2026-10-18T08:00:00Z,7.0,0.5\n"
+        "tap-9,2026-10-18T08:00:00Z,7.0,0.5\n"
+        "tap-1,yesterday,7.0,0.5\n"
+        "tap-1,2026-10-18T08:00:00Z,seven,0.5\n"
+        "tap-1,2026-10-18T08:00:00Z,15,0.5\n"
+        "tap-1,2026-10-18T08:00:00Z,,\n"
+        "\n"
+        "tap-2,2026-10-18T08:00:00Z,9.0,0.5\n")
+    assert (report["rows"], report["accepted"], report["rejected"]) == (7, 2, 5)
+    assert [e["row"] for e in report["errors"]] == [3, 4, 5, 6, 7]
+    assert report["errors"][0]["errors"] == {"tapId": "unknown tap for this scheme"}
+    assert report["errors"][1]["errors"] == {"sampledAt": "not an ISO-8601 time"}
+    assert report["errors"][2]["errors"] == {"ph": "not a number"}
+    assert report["errors"][3]["errors"] == {"ph": "out of range [0, 14]"}
+    assert report["errors"][4]["errors"] == {"row": "no measurements"}
+    assert report["exceedances"] == {"ph": 1} and summaries["tap-2"].failed == 1
+
+
+def test_future_samples_are_rejected_beyond_skew():
+    ok = (NOW + lab_results.MAX_FUTURE - timedelta(seconds=1)).isoformat()
+    late = (NOW + lab_results.MAX_FUTURE + timedelta(seconds=1)).isoformat()
+    report, _, _ = _import(f"tapId,sampledAt,ph\ntap-1,{ok},7.0\ntap-1,{late},7.0\n")
+    assert report["accepted"] == 1
+    assert report["errors"][0]["errors"] == {"sampledAt": "in the future"}
+
+
+def test_rows_are_handed_over_in_batches(monkeypatch):
+    monkeypatch.setattr(lab_results, "BATCH_ROWS", 3)
+    lines = [f"tap-{1 + i % 2},2026-10-18T08:{i:02d}:00Z,7.0" for i in range(7)]
+    report, summaries, batches = _import("tapId,sampledAt,ph\n" + "\n".join(lines) + "\n")
+    assert [sum(map(len, b.values())) for b in batches] == [3, 3, 1]
+    assert report["accepted"] == 7 and summaries["tap-1"].samples == 4
+    assert summaries["tap-1"].latest[0] == datetime(2026, 10, 18, 8, 6, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "empty"),
+    ("sampledAt,ph\n", "tapId"),
+    ("tapId,sampledAt,notes\n", "no water-quality"),
+])
+def test_unusable_header_raises(text, message):
+    with pytest.raises(lab_results.UploadError, match=message):
+        _import(text)
+
+
+def test_upload_after_naive_device_timestamp():
+    client = TestClient(main.app)
+    sampled = datetime.now(timezone.utc) - timedelta(hours=1)
+    response = client.post("/api/telemetry", json={
+        "nodeId": "tap-1", "metrics": {"ph": 7.2},
+        "timestamp": (sampled - timedelta(hours=1)).replace(tzinfo=None).isoformat(),
+    })
+    assert response.status_code == 200
+    assert main.NODES["tap-1"].last_updated.tzinfo is not None
+
+    csv_text = f"tapId,sampledAt,ph\ntap-1,{sampled.isoformat()},7.4\n"
+    response = client.post(f"/api/schemes/{main.DEFAULT_SCHEME}/quality/upload",
+                           files={"file": ("lab.csv", csv_text, "text/csv")})
+    assert response.status_code == 200, response.text
+    assert main.NODES["tap-1"].last_updated == sampled
+    assert main.NODES["tap-1"].latest_metrics["ph"] == 7.4
@@ -0,0 +1,104 @@
+import io
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+
+import pytest
+
+import logs
+from logs import JsonFormatter, RateLimitFilter, TextFormatter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logs.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _record(msg, *args, lineno=10, **extra):
+    record = logging.LogRecord("gjj.test", logging.WARNING, __file__, lineno, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def _dropped(reason):
+    return logs.LOG_DROPPED.labels(reason).value
+
+
+def test_rate_limit_passes_a_burst_then_reports_suppressed(clock):
+    limiter = RateLimitFilter(window=10.0, burst=2)
+    before = _dropped("rate_limited")
+    assert [limiter.filter(_record("pump %s hot", "p1")) for _ in range(5)] == [True, True, False, False, False]
+    assert limiter.filter(_record("pump %s hot", "p2"))          # other arguments, other message
+    assert _dropped("rate_limited") == before + 3
+    clock[0] += 10.0
+    record = _record("pump %s hot", "p1")
+    assert limiter.filter(record) and record.suppressed == 3
+
+
+def test_rate_key_groups_varying_messages(clock):
+    limiter = RateLimitFilter(window=10.0, burst=1)
+    assert limiter.filter(_record("bad reading %s", 1, rate_key="bad-reading"))
+    assert not limiter.filter(_record("bad reading %s", 2, rate_key="bad-reading"))
+    assert limiter.filter(_record("bad reading %s", 2, lineno=11))
+
+
+def test_unhashable_arguments_key_on_template(clock):
+    limiter = RateLimitFilter(window=10.0, burst=1)
+    assert limiter.filter(_record("payload %s", ["a"]))
+    assert not limiter.filter(_record("payload %s", ["b"]))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs._NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = _dropped("queue_full")
+    handler.handle(_record("first"))
+    handler.handle(_record("second"))
+    assert handler.queue.get_nowait().getMessage() == "first"
+    assert _dropped("queue_full") == before + 1
+
+
+def test_listener_formats_on_its_own_thread():
+    threads = []
+
+    class Recording(JsonFormatter):
+        def format(self, record):
+            threads.append(threading.current_thread())
+            return super().format(record)
+
+    out = io.StringIO()
+    stream = logging.StreamHandler(out)
+    stream.setFormatter(Recording())
+    log_queue = queue.Queue()
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    try:
+        logs._NonBlockingQueueHandler(log_queue).handle(
+            _record("alert on %s", "tap-1", fields={"rule": "tap.coliform"}))
+    finally:
+        listener.stop()
+    entry = json.loads(out.getvalue())
+    assert (entry["level"], entry["component"], entry["msg"], entry["rule"]) == \
+        ("WARNING", "test", "alert on tap-1", "tap.coliform")
+    assert threads and threading.current_thread() not in threads
+
+
+def test_text_format_carries_fields_and_suppressed_count():
+    line = TextFormatter().format(_record("slow %s", "x", fields={"ms": 12}, suppressed=4))
+    assert line.endswith("gjj.test: slow x ms=12 (suppressed 4 similar)")
+
+
+def test_setup_updates_component_levels(monkeypatch):
+    component = logs.get_logger("test-levels")
+    monkeypatch.setenv("GJJ_LOG_LEVELS", "test-levels=ERROR, other = debug")
+    try:
+        logs.setup_logging()
+        assert component.level == logging.ERROR
+        assert logs.get_logger("other").level == logging.DEBUG
+        assert logs._listener is not None
+    finally:
+        component.setLevel(logging.NOTSET)
+        logs.get_logger("other").setLevel(logging.NOTSET)
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import maintenance
+from maintenance import MaintenanceEngine, PumpHealth, ValveHealth
+
+T0 = 1_782_000_000 - 1_782_000_000 % 86400   # a UTC midnight
+MINUTE = 60.0
+
+
+def _at(seconds):
+    return datetime.fromtimestamp(T0 + seconds, timezone.utc)
+
+
+def test_pump_integrates_running_hours_and_energy():
+    pump = PumpHealth("pump-1")
+    for i in range(61):                                   # one hour at 2 kW and 100 L/min
+        pump.update(T0 + i * MINUTE, {"powerConsumption": 2.0, "pumpDischargeRate": 100.0})
+    pump.update(T0 + 61 * MINUTE, {"powerConsumption": 0.0})
+    report = pump.report()
+    assert (report["running_hours"], report["starts"]) == (pytest.approx(61 / 60, abs=1e-3), 1)
+    assert report["energy_kwh"] == pytest.approx(2.0 + 1 / 60, abs=1e-3)
+    assert report["litres"] == 6100.0       # discharge holds at its last value
+    assert report["energy_per_kl"] == pytest.approx(report["energy_kwh"] / 6.1, abs=1e-3)
+
+
+def test_pump_ignores_gaps_and_stale_readings():
+    pump = PumpHealth("pump-1")
+    pump.update(T0, {"powerConsumption": 2.0})
+    pump.update(T0 + maintenance.MAX_GAP_SECONDS + 1, {"powerConsumption": 2.0})
+    pump.update(T0 + 10, {"powerConsumption": 2.0})
+    assert pump.running_hours == 0.0 and pump.last_ts == T0 + maintenance.MAX_GAP_SECONDS + 1
+
+
+def test_valve_rate_uses_observed_days():
+    valve = ValveHealth("valve-1")
+    for i in range(20):                                   # 10 operations a day for two days
+        valve.update(T0 + i * 8640.0, {"valveOpenClosedStatus": i % 2})
+    valve.update(T0 + 2 * 86400 - 1, {"valveOpenClosedStatus": 0})
+    report = valve.report()
+    assert report["operations_7d"] == 20
+    assert report["rul_days"] == pytest.approx((maintenance.VALVE_SERVICE_OPS - 20) / 10, abs=0.1)
+
+
+def test_valve_ring_drops_days_older_than_a_week():
+    valve = ValveHealth("valve-1")
+    valve.update(T0, {"valveOpenClosedStatus": 0})
+    valve.update(T0 + 1, {"valveOpenClosedStatus": 1})
+    valve.update(T0 + 8 * 86400, {"valveOpenClosedStatus": 0})
+    assert valve.report()["operations_7d"] == 1 and valve.operations == 2
+
+
+def test_queue_ranks_stored_reports(monkeypatch):
+    engine = MaintenanceEngine()
+    engine.update("valve-1", "valve", _at(0), {"valveOpenClosedStatus": 0, "faultyValveDetection": 1})
+    for i in range(61):
+        engine.update("pump-1", "pump", _at(i * MINUTE), {"powerConsumption": 2.0, "motorTemperature": 90.0})
+    engine.update("tank-1", "tank", _at(0), {"tankLevel": 50.0})
+    monkeypatch.setattr(PumpHealth, "report", lambda self: pytest.fail("queue recomputed a report"))
+    queue = engine.queue()
+    assert [(r["nodeId"], r["rank"]) for r in queue] == [("valve-1", 1), ("pump-1", 2)]
+    assert [r["nodeId"] for r in engine.queue(node_type="pump")] == ["pump-1"]
+    assert "rank" not in engine.get("pump-1")
+
+
+def test_due_report_is_returned_once_until_serviced(monkeypatch):
+    monkeypatch.setattr(maintenance, "PUMP_SERVICE_HOURS", 1.0)
+    engine = MaintenanceEngine()
+    due = [engine.update("pump-1", "pump", _at(i * MINUTE), {"powerConsumption": 2.0}) for i in range(30)]
+    assert sum(report is not None for report in due) == 1
+    assert engine.serviced("pump-1", _at(30 * MINUTE))["wear_hours"] == 0.0
+    assert engine.get("pump-1")["serviced_at"] == _at(30 * MINUTE).isoformat()
+    assert engine.serviced("pump-9") is None
+    assert engine.usage("pump-1")[0] == pytest.approx(29 / 60)
+    assert engine.usage("valve-1") is None and engine.get("tank-1") is None
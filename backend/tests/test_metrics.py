@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import auth
+import main
+import metrics
+from metrics import Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter_exposition(registry):
+    requests = registry.register(metrics.Counter("t_requests_total", "Requests", ("route", "code")))
+    requests.labels("/a", "200").inc()
+    requests.labels("/a", "200").inc(2)
+    requests.labels('/b"\n', "500").inc()
+    assert registry.render().splitlines() == [
+        "# HELP t_requests_total Requests",
+        "# TYPE t_requests_total counter",
+        't_requests_total{route="/a",code="200"} 3',
+        't_requests_total{route="/b\\"\\n",code="500"} 1',
+    ]
+
+
+def test_histogram_exposition(registry):
+    latency = registry.register(metrics.Histogram("t_seconds", "Latency", buckets=(0.1, 1.0)))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value)
+    assert registry.render().splitlines() == [
+        "# HELP t_seconds Latency",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{le="0.1"} 1',
+        't_seconds_bucket{le="1"} 3',
+        't_seconds_bucket{le="+Inf"} 4',
+        "t_seconds_sum 4.05",
+        "t_seconds_count 4",
+    ]
+
+
+def test_gauge_function_and_conflicting_registration(registry):
+    depth = registry.register(metrics.Gauge("t_depth", "Depth", ("queue",)))
+    depth.labels("q").set_function(lambda: 7)
+    assert 't_depth{queue="q"} 7' in registry.render()
+    assert registry.register(metrics.Gauge("t_depth", "Depth", ("queue",))) is depth
+    with pytest.raises(ValueError):
+        registry.register(metrics.Counter("t_depth", "Depth", ("queue",)))
+
+
+def test_list_serialization_is_timed():
+    series = main.SERIALIZATION_LATENCY.labels("nodes")
+    before = series.count
+    response = TestClient(main.app).get("/api/nodes")
+    assert response.status_code == 200 and {n["id"] for n in response.json()} == set(main.NODES)
+    assert series.count == before + 1
+
+
+def test_metrics_require_monitor_or_admin(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_ENABLED", True)
+    client = TestClient(main.app)
+    assert client.get("/metrics").status_code == 401
+    for role, status in (("guest", 403), ("gateway", 403), ("monitor", 200), ("admin", 200)):
+        headers = {"Authorization": f"Bearer {auth.AUTHORITY.issue('u-' + role, role)}"}
+        assert client.get("/metrics", headers=headers).status_code == status, role
+    assert "# TYPE gjj_ingest_requests_total counter" in client.get("/metrics", headers=headers).text
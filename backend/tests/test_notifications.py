@@ -0,0 +1,128 @@
+import json
+import smtplib
+import time
+
+import pytest
+
+import notifications
+from notifications import LocalSink, NotificationDispatcher, Subscription
+
+
+class FakeAlert:
+    def __init__(self, alert_id, node_id="tap-1", rule="tap.coliform", severity="high"):
+        self.id = alert_id
+        self.node_id = node_id
+        self.rule = rule
+        self.severity = severity
+
+    def json(self):
+        return json.dumps({"id": self.id, "node_id": self.node_id, "node_name": self.node_id,
+                           "rule": self.rule, "severity": self.severity, "message": f"alert {self.id}"})
+
+
+@pytest.fixture
+def sink():
+    sink = LocalSink().start()
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def make_dispatcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(notifications, "RETRY_BASE", 0.01)
+    dispatchers = []
+
+    def make(subscriptions, window=0.05):
+        channels = {"webhook": notifications.WebhookChannel()}
+        dispatcher = NotificationDispatcher(channels, subscriptions, window=window, workers=2,
+                                            dead_letter_path=str(tmp_path / "dead.jsonl"))
+        dispatchers.append(dispatcher)
+        dispatcher.start()
+        return dispatcher
+
+    yield make
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_alerts_are_grouped_per_recipient(sink, make_dispatcher):
+    dispatcher = make_dispatcher([
+        Subscription("ops", "webhook", sink.url),
+        Subscription("engineer", "webhook", sink.url, rules=["pump."]),
+    ])
+    for alert in (FakeAlert(1), FakeAlert(2), FakeAlert(3, node_id="pump-1", rule="pump.dry_run")):
+        dispatcher.submit(alert)
+    _wait(lambda: len(sink.received) == 2)
+    by_size = sorted(sink.received, key=lambda body: len(body["alerts"]))
+    assert [a["id"] for a in by_size[0]["alerts"]] == [3]
+    assert [a["id"] for a in by_size[1]["alerts"]] == [1, 2, 3]
+    assert by_size[1]["subject"] == "Jalsense: 3 alerts (3 high)"
+
+
+def test_failed_first_attempt_is_retried(sink, make_dispatcher):
+    sink.fail_first = 1
+    retries = notifications.NOTIFICATIONS.labels("webhook", "retry")
+    before = retries.value
+    dispatcher = make_dispatcher([Subscription("ops", "webhook", sink.url)])
+    dispatcher.submit(FakeAlert(1))
+    _wait(lambda: sink.received)
+    assert [a["id"] for a in sink.received[0]["alerts"]] == [1]
+    assert retries.value == before + 1 and dispatcher.dead_lettered == 0
+
+
+def test_exhausted_retries_are_dead_lettered(sink, make_dispatcher, monkeypatch, tmp_path):
+    monkeypatch.setattr(notifications, "MAX_ATTEMPTS", 2)
+    sink.fail_first = 10
+    dispatcher = make_dispatcher([Subscription("ops", "webhook", sink.url)])
+    dispatcher.submit(FakeAlert(1))
+    _wait(lambda: dispatcher.dead_lettered == 1)
+    entry = json.loads((tmp_path / "dead.jsonl").read_text())
+    assert (entry["recipient"], entry["attempts"], entry["reason"]) == ("ops", 2, "HTTP 503")
+    assert sink.received == []
+
+
+def test_stop_flushes_open_digests(sink, make_dispatcher):
+    dispatcher = make_dispatcher([Subscription("ops", "webhook", sink.url)], window=3600)
+    dispatcher.submit(FakeAlert(1))
+    _wait(lambda: dispatcher.stats()["open_digests"] == 1)
+    dispatcher.stop()
+    assert [a["id"] for a in sink.received[0]["alerts"]] == [1]
+
+
+class FakeSMTP:
+    instances = []
+
+    def __init__(self, host, port, timeout):
+        self.sent = []
+        self.alive = True
+        FakeSMTP.instances.append(self)
+
+    def send_message(self, message):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(message["Subject"])
+
+    def quit(self):
+        self.alive = False
+
+    def close(self):
+        self.alive = False
+
+
+def test_email_reconnects_after_idle_disconnect(monkeypatch):
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    FakeSMTP.instances = []
+    channel = notifications.EmailChannel(host="mail.local")
+    channel.send("a@x", "first", "", [])
+    FakeSMTP.instances[0].alive = False          # server dropped the idle connection
+    channel.send("a@x", "second", "", [])
+    assert [conn.sent for conn in FakeSMTP.instances] == [["first"], ["second"]]
+    channel.close()
+    assert not FakeSMTP.instances[1].alive
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import profiling
+from profiling import ProfilingMiddleware, Profiler
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    profiler = Profiler(enabled=True, slow_ms=0.0)
+    monkeypatch.setattr(profiling, "PROFILER", profiler)
+    return profiler
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with profiling.stage("handler"):
+            with profiling.stage("lookup", "db"):
+                time.sleep(0.001)
+            return {"id": item_id}
+
+    return TestClient(app)
+
+
+def _series(profiler):
+    return {(s["route"], s["stage"]): s["count"] for s in profiler.summary()["stages"]}
+
+
+def test_stages_are_grouped_by_route_template(profiler, client):
+    for item_id in (1, 2):
+        assert client.get(f"/items/{item_id}").status_code == 200
+    series = _series(profiler)
+    for name in ("total", "handler", "lookup:db", "validation", "response"):
+        assert series[("/items/{item_id}", name)] == 2
+    slow = profiler.summary()["slow_requests"][-1]
+    assert (slow["path"], slow["route"], slow["status"]) == ("/items/2", "/items/{item_id}", 200)
+    assert [s["stage"] for s in slow["stages"]][:2] == ["validation", "handler"]
+
+
+def test_unmatched_paths_share_one_series(profiler, client):
+    for path in ("/wp-login.php", "/.env", "/items/1/extra"):
+        assert client.get(path).status_code == 404
+    assert _series(profiler) == {(profiling.UNMATCHED, "total"): 3}
+    assert profiler.summary()["slow_requests"][0]["path"] == "/wp-login.php"
+
+
+def test_disabled_profiler_records_nothing(profiler, client):
+    profiler.configure(enabled=False)
+    assert client.get("/items/1").status_code == 200
+    assert profiler.summary()["stages"] == [] and profiler.summary()["slow_requests"] == []
+
+
+def test_only_slow_requests_are_kept(profiler, client):
+    profiler.configure(slow_ms=60_000)
+    client.get("/items/1")
+    assert profiler.summary()["slow_requests"] == [] and _series(profiler)
+    profiler.reset()
+    assert profiler.summary()["stages"] == []
+
+
+def test_stage_is_a_noop_outside_a_request():
+    assert profiling.stage("handler") is profiling._NOOP
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import quality
+import telemetry_schema
+from quality import ComplianceTracker, WindowCounter, evaluate
+
+HOUR = 3600
+T0 = 1_782_000_000 - 1_782_000_000 % 86400   # a UTC midnight
+GOOD = {"ph": 7.2, "turbidity": 1.0}
+BAD = {"ph": 9.1, "turbidity": 1.0}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [float(T0)]
+    monkeypatch.setattr(quality.time, "time", lambda: now[0])
+    return now
+
+
+def test_evaluate_checks_only_reported_parameters():
+    checks = dict(evaluate({"ph": 6.4, "freeChlorine": 0.5, "unknown": 1}))
+    assert checks == {quality.PARAMETERS.index("ph"): False, quality.PARAMETERS.index("freeChlorine"): True}
+
+
+def test_window_counter_rolls_buckets_out():
+    counter = WindowCounter(HOUR, 3)
+    counter.add(T0, evaluate(GOOD))
+    counter.add(T0 + HOUR, evaluate(BAD))
+    assert counter.totals[:2] == [2, 1]
+    counter.add(T0 + 3 * HOUR, evaluate(GOOD))        # T0's bucket leaves the window
+    assert counter.totals[:2] == [2, 1]
+    assert counter.window_start() == T0 + HOUR
+    counter.advance(int((T0 + 10 * HOUR) // HOUR))    # a gap longer than the window
+    assert counter.totals == [0] * len(counter.totals)
+
+
+def test_window_counter_ignores_samples_older_than_window():
+    counter = WindowCounter(HOUR, 3)
+    counter.add(T0 + 5 * HOUR, evaluate(GOOD))
+    assert not counter.add(T0 + 2 * HOUR, evaluate(GOOD))
+    assert counter.add(T0 + 3 * HOUR, evaluate(BAD))   # late but still inside
+    assert counter.totals[:2] == [2, 1]
+
+
+def test_tracker_windows_roll_over(clock):
+    tracker = ComplianceTracker()
+    clock[0] = T0 + HOUR
+    assert tracker.record_many("tap-1", "s1", [(T0, evaluate(GOOD)), (T0 + 60, evaluate(BAD))]) == 50.0
+    report = tracker.report(("scheme", "s1"), now=T0 + 25 * HOUR)
+    assert report["24h"]["samples"] == 0
+    assert report["7d"]["samples"] == 2
+    assert report["7d"]["parameters"]["ph"] == {"checks": 2, "passed": 1, "compliance_percent": 50.0}
+    assert tracker.report(("tap", "tap-1"), now=T0 + 31 * 86400)["30d"]["samples"] == 0
+
+
+def test_record_many_skips_readings_without_quality_parameters(clock):
+    tracker = ComplianceTracker()
+    assert tracker.record_many("tap-1", None, [(T0, evaluate({"flowRate": 3.0}))]) is None
+    assert tracker.report(("tap", "tap-1"), now=T0)["24h"]["samples"] == 0
+    assert tracker.report(("scheme", None), now=T0)["24h"]["samples"] == 0
+
+
+def test_stale_batch_reports_current_window(clock):
+    tracker = ComplianceTracker()
+    clock[0] = T0 + 2 * 86400
+    assert tracker.record_many("tap-1", "s1", [(T0, evaluate(GOOD))]) is None
+    assert tracker.report(("tap", "tap-1"), now=clock[0])["7d"]["compliant_samples"] == 1
+
+
+def test_future_dated_reading_does_not_freeze_windows():
+    client = TestClient(main.app)
+    sent = datetime.now(timezone.utc)
+    before = main.QUALITY_COMPLIANCE.report(("tap", "tap-1"))["24h"]["samples"]
+    response = client.post("/api/telemetry", json={
+        "nodeId": "tap-1", "metrics": {"ph": 7.0}, "timestamp": (sent + timedelta(days=3)).isoformat()})
+    assert datetime.fromisoformat(response.json()["timestamp"]) - sent < timedelta(minutes=1)
+    assert client.post("/api/telemetry", json={"nodeId": "tap-1", "metrics": {"ph": 7.1}}).status_code == 200
+    assert main.QUALITY_COMPLIANCE.report(("tap", "tap-1"))["24h"]["samples"] == before + 2
+
+
+def test_reading_time_clamps_beyond_skew():
+    now = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+    ahead = now + telemetry_schema.MAX_FUTURE
+    assert telemetry_schema.reading_time("tap", None, now) == now
+    assert telemetry_schema.reading_time("tap", ahead, now) == ahead
+    assert telemetry_schema.reading_time("tap", ahead + timedelta(seconds=1), now) == now
+    assert telemetry_schema.reading_time("tap", datetime(2026, 10, 18, 8), now).tzinfo is timezone.utc
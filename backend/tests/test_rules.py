@@ -0,0 +1,90 @@
+import random
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import backtest
+import main
+import rules
+
+
+def _readings(node_type, count, seed=7):
+    """Random readings around every threshold the rule table uses for a node type."""
+    thresholds = {}
+    for spec in rules.RULES.values():
+        if spec["type"] == node_type:
+            for clause in spec.get("any", spec.get("all")):
+                thresholds.setdefault(clause[0], []).append(clause[2])
+    rng = random.Random(seed)
+    readings = []
+    for _ in range(count):
+        m = {}
+        for name, values in thresholds.items():
+            if rng.random() < 0.7:
+                value = rng.choice(values)
+                m[name] = float(rng.choice([value, value - 1, value + 1, value * 0.5, value * 1.5, 0, 1]))
+        readings.append(m)
+    return readings
+
+
+def test_every_rule_has_an_action():
+    assert set(main.RULE_ACTIONS) == set(rules.RULES)
+
+
+@pytest.mark.parametrize("node_type", rules.NODE_TYPES)
+def test_live_matching_agrees_with_backtest_masks(node_type):
+    readings = _readings(node_type, 2000)
+    names = backtest.rule_metrics(rules.RULES)
+    columns = {name: np.array([m.get(name, np.nan) for m in readings]) for name in names}
+    masks = backtest._rule_masks(rules.RULES, node_type, columns, len(readings), {})
+    for row, m in enumerate(readings):
+        expected = [rule_id for rule_id, mask in masks.items() if mask[row]]
+        assert rules.matching(node_type, m) == expected, m
+
+
+@pytest.mark.parametrize("node_type", rules.NODE_TYPES)
+def test_apply_rules_raises_exactly_the_matching_rules(monkeypatch, node_type):
+    raised = []
+    monkeypatch.setattr(main, "create_alert",
+                        lambda node, alert_type, severity, message, rule="generic": raised.append((rule, severity)))
+    for m in _readings(node_type, 500, seed=11):
+        raised.clear()
+        node = main.Node(id="n", name="n", type=node_type, location="test", latest_metrics=m)
+        main.apply_rules(node)
+        fired = rules.matching(node_type, m)
+        assert [rule for rule, _ in raised] == fired
+        assert all(severity == rules.RULES[rule]["severity"] for rule, severity in raised)
+        assert node.status == (main.RULE_ACTIONS[fired[-1]][0] if fired else "OK")
+
+
+def test_unless_reproduces_elif():
+    assert rules.matching("pump", {"motorTemperature": 80.0}) == ["pump.motor_overheat"]
+    assert rules.matching("pump", {"motorTemperature": 70.0}) == ["pump.motor_hot"]
+    assert rules.matching("tank", {"tankLevel": 10.0}) == ["tank.level_critical"]
+
+
+def test_default_applies_when_metric_never_reported():
+    # compliance defaults to 100 (never low); dry run defaults power/discharge to 0
+    assert rules.matching("tap", {}) == []
+    assert rules.matching("pump", {"powerConsumption": 8.0}) == ["pump.dry_run"]
+
+
+def test_candidate_thresholds_leave_live_rules_alone():
+    candidate = backtest.candidate_rules(thresholds={"pump.motor_overheat.motorTemperature": 70})
+    assert rules.matching("pump", {"motorTemperature": 72.0}, rules.compile_rules(candidate)) \
+        == ["pump.motor_overheat"]
+    assert rules.matching("pump", {"motorTemperature": 72.0}) == ["pump.motor_hot"]
+
+
+@pytest.mark.parametrize("override", [
+    {"pump.motor_overheat": "bad"},
+    {"pump.motor_overheat": {"type": "pump", "severity": "high", "any": [["motorTemperature"]]}},
+])
+def test_malformed_override_is_rejected_before_thresholds(override):
+    thresholds = {"pump.motor_overheat.motorTemperature": 70}
+    with pytest.raises(ValueError):
+        backtest.candidate_rules(override, thresholds)
+    response = TestClient(main.app).post("/api/rules/backtest",
+                                         json={"rules": override, "thresholds": thresholds})
+    assert response.status_code == 422
@@ -0,0 +1,94 @@
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import service_requests as sr
+
+
+def _store_with(n):
+    store = sr.ServiceRequestStore()
+    for i in range(n):
+        store.create(sr.ServiceRequestIn(issue_type=f"type-{i % 3}", urgency=sr.URGENCIES[i % 3],
+                                         scheme_id=f"s{i % 2}"))
+    return store
+
+
+def test_statistics_track_lifecycle(monkeypatch):
+    now = [datetime(2026, 6, 30, 8, tzinfo=timezone.utc)]
+    monkeypatch.setattr(sr, "_now", lambda: now[0])
+    store = _store_with(4)
+    req = store.get("REQ-0001")
+    store.assign(req, "tech-1")
+    store.set_status(req, "IN_PROGRESS")
+    stats = store.statistics()
+    assert stats["total"] == 4 and stats["open"] == 4
+    assert stats["technician_load"] == {"tech-1": {"active": 1, "total": 1}}
+
+    now[0] += timedelta(hours=3)
+    store.set_status(req, "RESOLVED")
+    stats = store.statistics()
+    assert stats["by_status"]["RESOLVED"] == 1 and stats["open"] == 3
+    assert stats["technician_load"] == {"tech-1": {"active": 0, "total": 1}}
+    assert stats["mean_time_to_resolve_hours"] == 3.0
+
+    store.set_status(req, "OPEN")            # reopening clears the resolution
+    assert store.statistics()["resolved"] == 0
+
+
+def test_update_moves_request_between_schemes():
+    store = _store_with(2)
+    store.update(store.get("REQ-0001"), sr.ServiceRequestUpdate(scheme_id="s1", urgency="high"))
+    assert store.statistics(scheme_id="s0")["total"] == 0
+    assert store.statistics(scheme_id="s1")["total"] == 2
+    assert store.statistics(scheme_id="s1")["by_urgency"] == {"low": 0, "medium": 1, "high": 1}
+    assert store.stats.snapshot().keys() == {("s1", store.get("REQ-0001").created_at.date().toordinal())}
+
+
+def test_random_mutations_match_full_recompute():
+    rng = random.Random(7)
+    store = _store_with(30)
+    for _ in range(300):
+        req = store.get(f"REQ-{rng.randint(1, 30):04d}")
+        action = rng.randrange(3)
+        if action == 0:
+            store.set_status(req, rng.choice(sr.STATUSES))
+        elif action == 1:
+            store.assign(req, f"tech-{rng.randint(1, 4)}")
+        else:
+            store.update(req, sr.ServiceRequestUpdate(scheme_id=f"s{rng.randint(0, 3)}",
+                                                      urgency=rng.choice(sr.URGENCIES)))
+    assert store.verify_statistics()["consistent"]
+
+    reqs = [store.get(rid) for rid in store.iter_ids()]
+    stats = store.statistics()
+    assert stats["total"] == len(reqs)
+    assert stats["by_status"] == {s: sum(r.status == s for r in reqs) for s in sr.STATUSES}
+    assert stats["open"] == sum(r.status in sr.ACTIVE_STATUSES for r in reqs)
+    assert stats["resolved"] == sum(r.resolved_at is not None for r in reqs)
+    assert sum(load["total"] for load in stats["technician_load"].values()) == sum(
+        r.assignee is not None for r in reqs)
+
+
+def test_csv_export_neutralises_formulas():
+    store = sr.ServiceRequestStore()
+    store.create(sr.ServiceRequestIn(issue_type="=HYPERLINK(\"http://x\")", description="-2+3",
+                                     reporter_name="@ravi", location="Ward 5"))
+    rows = list(csv.reader(io.StringIO("".join(store.iter_csv()))))
+    row = dict(zip(rows[0], rows[1]))
+    assert row["issue_type"] == "'=HYPERLINK(\"http://x\")"
+    assert (row["description"], row["reporter_name"], row["location"]) == ("'-2+3", "'@ravi", "Ward 5")
+
+
+def test_naive_created_window_is_utc(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        monkeypatch.setattr(sr, "_now", lambda: datetime(2026, 6, 30, 8, tzinfo=timezone.utc))
+        store = _store_with(1)
+        assert list(store.iter_ids(created_from=datetime(2026, 6, 30, 7, 59))) == ["REQ-0001"]
+        assert list(store.iter_ids(created_to=datetime(2026, 6, 30, 7, 59))) == []
+    finally:
+        monkeypatch.undo()
+        time.tzset()
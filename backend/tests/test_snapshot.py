@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import main
+import snapshot
+from snapshot import SnapshotCache
+
+T0 = datetime(2026, 10, 18, 6, tzinfo=timezone.utc)
+
+
+class FakeNode:
+    def __init__(self, node_id, node_type, scheme_id="s1", **metrics):
+        self.id = node_id
+        self.type = node_type
+        self.scheme_id = scheme_id
+        self.latest_metrics = metrics
+
+    def json(self):
+        return json.dumps({"id": self.id, **self.latest_metrics})
+
+
+class FakeAlert:
+    def __init__(self, alert_id):
+        self.id = alert_id
+
+    def json(self):
+        return json.dumps({"id": self.id})
+
+
+@pytest.fixture
+def cache():
+    calls = []
+
+    def quality(scheme_id):
+        calls.append(scheme_id)
+        return {"samples": len(calls)}
+
+    cache = SnapshotCache(quality)
+    cache.quality_calls = calls
+    return cache
+
+
+def _render(cache, fields=None, scheme_id="s1"):
+    return json.loads(cache.render(scheme_id, fields))
+
+
+def test_field_selection_keeps_section_order(cache):
+    cache.update_node(FakeNode("pump-1", "pump", flowRate=10.0))
+    cache.update_node(FakeNode("tank-1", "tank", tankLevel=50.0))
+    doc = _render(cache, ["tanks", "pumps", "bogus"])
+    assert list(doc) == ["schemeId", "version", "generatedAt", "pumps", "tanks"]
+    assert doc["pumps"] == [{"id": "pump-1", "flowRate": 10.0}]
+    assert cache.render("s9") is None and "s1" in cache
+
+
+def test_sections_are_cached_until_they_change(cache):
+    pump = FakeNode("pump-1", "pump", flowRate=10.0)
+    cache.update_node(pump)
+    first = _render(cache, ["pumps"])
+    assert cache._views["s1"].rendered["pumps"] == '[{"id": "pump-1", "flowRate": 10.0}]'
+    pump.latest_metrics["flowRate"] = 12.0
+    cache.update_node(pump)
+    second = _render(cache, ["pumps"])
+    assert second["pumps"][0]["flowRate"] == 12.0 and second["version"] == first["version"] + 1
+
+
+def test_alarms_track_open_count_and_recent(cache, monkeypatch):
+    monkeypatch.setattr(snapshot, "MAX_ALARMS", 2)
+    for alert_id in (1, 2, 3):
+        cache.alert_raised("s1", FakeAlert(alert_id))
+    cache.alert_closed("s1", 3)
+    assert _render(cache, ["alarms"])["alarms"] == {"open": 2, "recent": [{"id": 2}]}
+
+
+def test_quality_is_cached_for_ttl_or_until_a_tap_reports(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(snapshot.time, "time", lambda: now[0])
+    cache.update_node(FakeNode("tap-1", "tap", ph=7.0))
+    assert _render(cache, ["quality"])["quality"] == {"samples": 1}
+    now[0] += snapshot.QUALITY_TTL
+    assert _render(cache, ["quality"])["quality"] == {"samples": 1}
+    now[0] += 1
+    assert _render(cache, ["quality"])["quality"] == {"samples": 2}
+    cache.update_node(FakeNode("tap-1", "tap", ph=7.1))
+    assert _render(cache, ["quality"])["quality"] == {"samples": 3}
+
+
+def test_pump_energy_adds_growth_per_day(cache):
+    cache.pump_energy("s1", "pump-1", T0, 2.0, 5.0)
+    cache.pump_energy("s1", "pump-3", T0, None, 1.0)        # never reported power
+    cache.pump_energy("s1", "pump-1", T0 + timedelta(hours=1), 2.0, 7.0)
+    cache.pump_energy("s1", "pump-2", T0, 1.5, 0.0)
+    energy = _render(cache, ["energy"])["energy"]
+    assert (energy["total_power_kw"], energy["kwh_today"]) == (3.5, 2.0)
+    cache.pump_energy("s1", "pump-1", T0 + timedelta(days=1), 0.0, 7.5)
+    assert _render(cache, ["energy"])["energy"]["pumps"]["pump-1"] == {"power_kw": 0.0, "kwh_today": 0.5}
+
+
+def test_ingest_feeds_snapshot_energy_from_maintenance():
+    node = main.Node(id="pump-energy", name="Test pump", type="pump", location="Test", scheme_id="s-energy")
+    for minute, power in ((0, 6.0), (10, 6.0), (20, 3.0)):
+        node.latest_metrics = {"powerConsumption": power}
+        main.update_derived_state(node, node.latest_metrics, T0 + timedelta(minutes=minute))
+    kwh = main.MAINTENANCE.usage(node.id)[2]
+    assert kwh == pytest.approx(1.0 + 0.75)
+    energy = _render(main.SNAPSHOTS, ["energy"], scheme_id="s-energy")["energy"]
+    assert energy["pumps"][node.id] == {"power_kw": 3.0, "kwh_today": round(kwh, 3)}
@@ -0,0 +1,101 @@
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import telemetry_schema
+from telemetry_schema import validate
+
+
+def _rejected(node_type, reason):
+    return telemetry_schema.TELEMETRY_REJECTED.labels(node_type, reason).value
+
+
+def test_every_alias_and_metadata_name_is_consistent():
+    for node_type, aliases in telemetry_schema.ALIASES.items():
+        for alias, (canonical, scale) in aliases.items():
+            assert alias not in telemetry_schema.SCHEMAS[node_type], alias
+            assert canonical in telemetry_schema.SCHEMAS[node_type], canonical
+            assert scale > 0
+    assert not telemetry_schema.METADATA & {m for s in telemetry_schema.SCHEMAS.values() for m in s}
+
+
+def test_canonical_numbers_pass_as_floats():
+    clean, rejected = validate("pump", {"flowRate": 120, "motorTemperature": 61.5, "leakIndicator": 0})
+    assert clean == {"flowRate": 120.0, "motorTemperature": 61.5, "leakIndicator": 0.0}
+    assert rejected == {} and all(type(v) is float for v in clean.values())
+
+
+def test_aliases_are_renamed_and_scaled():
+    assert validate("tank", {"tankSupplyDuration": 90})[0] == {"supplyDurationFromTank": 1.5}
+    assert validate("tap", {"waterTemp": 24.0, "qualitySamplingOperator": "op-7"}) == ({"temperature": 24.0}, {})
+
+
+def test_canonical_key_wins_over_its_alias():
+    assert validate("pump", {"flow": 10.0, "flowRate": 12.0}) == ({"flowRate": 12.0}, {})
+    assert validate("pump", {"flowRate": 12.0, "flow": 10.0}) == ({"flowRate": 12.0}, {})
+
+
+def test_lax_gateway_values_are_coerced():
+    clean, rejected = validate("tap", {"ph": "7.2", "coliformPresent": True})
+    assert clean == {"ph": 7.2, "coliformPresent": 1.0} and rejected == {}
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf, "nan", "inf"])
+def test_non_finite_values_are_rejected(value):
+    clean, rejected = validate("tap", {"ph": value, "turbidity": 1.0})
+    assert clean == {"turbidity": 1.0}
+    assert rejected == {"ph": "out of range [0, 14] pH"}
+
+
+def test_rejects_carry_a_reason_and_are_counted():
+    before = _rejected("pump", "out of range")
+    clean, rejected = validate("pump", {
+        "motorTemperature": 400, "pumpEfficiency": 101, "voltage": "high", "tankLevel": 50, "flowRate": None,
+    })
+    assert clean == {}
+    assert rejected == {
+        "motorTemperature": "out of range [-40, 250] °C",
+        "pumpEfficiency": "out of range [0, 100] %",
+        "voltage": "not a number",
+        "tankLevel": "unknown metric",
+        "flowRate": "not a number",
+    }
+    assert _rejected("pump", "out of range") == before + 2
+
+
+def test_range_bounds_are_inclusive():
+    assert validate("tank", {"tankLevel": 0, "supplyHoursPerDay": 24})[1] == {}
+    assert validate("tank", {"tankLevel": -0.1})[1] == {"tankLevel": "out of range [0, 100] %"}
+
+
+def test_alias_range_applies_after_scaling():
+    assert validate("tank", {"tankSupplyDuration": 720 * 60})[1] == {}
+    assert "tankSupplyDuration" in validate("tank", {"tankSupplyDuration": 720 * 60 + 1})[1]
+
+
+def test_describe_lists_units_and_aliases():
+    schema = telemetry_schema.describe("tank")
+    assert schema["metrics"]["tankLevel"] == {"unit": "%", "min": 0.0, "max": 100.0}
+    assert schema["aliases"]["tankSupplyDuration"] == {"metric": "supplyDurationFromTank", "scale": 1 / 60}
+    assert telemetry_schema.describe("boiler") is None
+
+
+@pytest.mark.parametrize("strict, status", [(False, 200), (True, 422)])
+def test_ingest_drops_or_rejects_bad_keys(monkeypatch, strict, status):
+    monkeypatch.setattr(telemetry_schema, "STRICT", strict)
+    client = TestClient(main.app)
+    response = client.post("/api/telemetry", content='{"nodeId": "tap-1", "metrics": {"ph": 7.0, "turbidity": NaN}}',
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == status
+    if strict:
+        assert response.json()["detail"]["rejected"] == {"turbidity": "out of range [0, 4000] NTU"}
+    else:
+        assert response.json()["rejected"] == {"turbidity": "out of range [0, 4000] NTU"}
+        assert main.NODES["tap-1"].latest_metrics["ph"] == 7.0
+
+
+def test_ingest_with_only_bad_keys_is_rejected():
+    response = TestClient(main.app).post("/api/telemetry", json={"nodeId": "tap-1", "metrics": {"ph": 99}})
+    assert response.status_code == 422
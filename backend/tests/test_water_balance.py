@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+import main
+from water_balance import COUNTER_RESETS, WaterBalance
+
+T0 = datetime(2026, 6, 30, 8, tzinfo=timezone.utc)
+
+
+def _today(balance):
+    return balance.report("s1")["today"]
+
+
+def _resets(node_type, counter):
+    return COUNTER_RESETS.labels(node_type, counter).value
+
+
+def test_counter_reset_counts_from_zero():
+    balance = WaterBalance()
+    before = _resets("pump", "dailyWaterProduction")
+    for minutes, value in [(0, 1000.0), (10, 5000.0), (20, 300.0), (30, 800.0)]:
+        balance.update("s1", "p1", "pump", T0 + timedelta(minutes=minutes), {"dailyWaterProduction": value})
+    assert _today(balance)["produced_litres"] == 5800.0
+    assert _resets("pump", "dailyWaterProduction") == before + 1
+
+
+def test_small_backwards_step_is_not_a_reset():
+    balance = WaterBalance()
+    before = _resets("tank", "dailyWaterDistributed")
+    for minutes, value in [(0, 4000.0), (10, 3999.5), (20, 4100.0)]:
+        balance.update("s1", "t1", "tank", T0 + timedelta(minutes=minutes), {"dailyWaterDistributed": value})
+    assert _today(balance)["distributed_litres"] == 4100.0
+    assert _resets("tank", "dailyWaterDistributed") == before
+
+
+def test_integrated_volume_survives_restart():
+    balance = WaterBalance()
+    for minutes, pumped in [(0, 10000.0), (10, 12000.0), (20, 500.0), (30, 900.0)]:
+        balance.update("s1", "p1", "pump", T0 + timedelta(minutes=minutes), {}, pumped_litres=pumped)
+    assert _today(balance)["produced_litres"] == 2900.0
+
+
+def test_counter_continues_across_day_close():
+    balance = WaterBalance()
+    balance.update("s1", "p1", "pump", T0, {"dailyWaterProduction": 2000.0})
+    balance.update("s1", "p1", "pump", T0 + timedelta(hours=17), {"dailyWaterProduction": 2600.0})
+    assert _today(balance)["produced_litres"] == 600.0
+    assert balance.report("s1")["yesterday"]["produced_litres"] == 2000.0
+
+
+def test_future_dated_node_does_not_close_the_scheme_day():
+    client = TestClient(main.app)
+    future = datetime.now(timezone.utc) + timedelta(days=2)
+    client.post("/api/telemetry", json={"nodeId": "tank-1", "metrics": {"dailyWaterDistributed": 100.0},
+                                        "timestamp": future.isoformat()})
+    produced = []
+    for counter in (50_000.0, 50_700.0):
+        client.post("/api/telemetry", json={"nodeId": "pump-1", "metrics": {"dailyWaterProduction": counter}})
+        produced.append(main.WATER_BALANCE.report(main.DEFAULT_SCHEME)["today"]["produced_litres"])
+    report = main.WATER_BALANCE.report(main.DEFAULT_SCHEME)
+    assert report["day"] == datetime.now(timezone.utc).date().isoformat()
+    assert produced[1] - produced[0] == 700.0
@@ -0,0 +1,251 @@
+"""
+Per-scheme water balance and non-revenue water (NRW) for the Jalsense backend.
+
+For every scheme and UTC day:
+
+    produced      sum over pumps of dailyWaterProduction (the device's
+                  day-to-date counter), or the litres integrated from the
+                  discharge rate for pumps that do not report it
+    distributed   sum over tanks of dailyWaterDistributed
+    storage       change in water held in tanks since the start of the day,
+                  tankLevelLiters, or tankLevel x the capacity learned from
+                  an earlier reading that carried both
+    NRW           produced - distributed - storage change (unaccounted water)
+
+Each reading changes one node's day-to-date figure, and the scheme's totals
+move by that delta, so an update is O(1). Deltas come from successive values
+of a node's counter. When a counter goes backwards - a device restart, its
+own midnight reset, or a rollover - the new value is counted from zero and
+the reset is recorded in gjj_water_counter_resets_total. A smaller backwards
+step (staying above RESET_RATIO of the previous value) is jitter and counts as
+no change, so a rounding wobble is never mistaken for a reset. When a scheme's first reading of a
+new day arrives, the day is closed into a ring of HISTORY_DAYS daily totals.
+Window figures (7d, 30d) are sums over that fixed-size ring, so a fleet-wide
+report is O(schemes). Readings timestamped before a scheme's current day are
+ignored.
+
+Closing a day also checks for two alert conditions. The first is an NRW
+share of the closed day above NRW_ALERT_PERCENT. The second is a 7-day share
+that has risen NRW_TREND_POINTS above the scheme's earlier baseline.
+"""
+
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+import metrics
+
+HISTORY_DAYS = 30
+NRW_ALERT_PERCENT = 30.0     # closed-day NRW share that raises an alert
+NRW_TREND_POINTS = 10.0      # 7d share this far above the baseline raises an alert
+MIN_BASELINE_DAYS = 7        # closed days before the 7d window needed for a trend
+MIN_PRODUCED_LITRES = 1000.0  # days producing less are too small to judge
+RESET_RATIO = 0.5            # a counter falling below this share of its last value was reset
+
+COUNTER_RESETS = metrics.counter(
+    "gjj_water_counter_resets_total", "Volume counters that went backwards (restart, reset, rollover)",
+    ("node_type", "counter"),
+)
+
+
+def _day_iso(day: int) -> str:
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=day)).date().isoformat()
+
+
+def _advance(last: Optional[float], value: float, node_type: str, counter: str) -> Tuple[float, float]:
+    """
+    Volume added since ``last`` for a cumulative counter now reading
+    ``value``, and the counter value to compare the next reading against.
+    """
+    if last is None or value >= last:
+        return value - (last or 0.0), value
+    if value < last * RESET_RATIO:
+        COUNTER_RESETS.labels(node_type, counter).inc()
+        return value, value          # restarted from zero
+    return 0.0, last                 # jitter: keep the high-water mark
+
+
+def _nrw(produced: float, distributed: float, storage: float) -> Dict:
+    nrw = produced - distributed - storage
+    return {
+        "produced_litres": round(produced, 1),
+        "distributed_litres": round(distributed, 1),
+        "storage_change_litres": round(storage, 1),
+        "nrw_litres": round(nrw, 1),
+        "nrw_percent": round(nrw / produced * 100.0, 2) if produced > 0 else None,
+    }
+
+
+class _NodeFlow:
+    __slots__ = ("day_value", "uses_counter", "counter", "pumped",
+                 "stored", "stored_start", "capacity")
+
+    def __init__(self):
+        self.day_value = 0.0       # produced (pump) or distributed (tank) so far today
+        self.uses_counter = False  # pump reports dailyWaterProduction itself
+        self.counter: Optional[float] = None   # last device counter value
+        self.pumped: Optional[float] = None    # last integrated cumulative litres
+        self.stored: Optional[float] = None
+        self.stored_start: Optional[float] = None
+        self.capacity: Optional[float] = None
+
+
+class _SchemeBalance:
+    __slots__ = ("day", "produced", "distributed", "storage", "nodes", "history")
+
+    def __init__(self, day: int):
+        self.day = day
+        self.produced = 0.0
+        self.distributed = 0.0
+        self.storage = 0.0
+        self.nodes: Dict[str, _NodeFlow] = {}
+        # closed days, oldest first: (day, produced, distributed, storage change)
+        self.history: Deque[Tuple[int, float, float, float]] = deque(maxlen=HISTORY_DAYS)
+
+    def close_day(self, new_day: int):
+        self.history.append((self.day, self.produced, self.distributed, self.storage))
+        self.day = new_day
+        self.produced = self.distributed = self.storage = 0.0
+        for flow in self.nodes.values():
+            flow.day_value = 0.0
+            flow.stored_start = flow.stored
+
+    def window(self, days: int) -> Dict:
+        recent = [h for h in self.history if h[0] > self.day - 1 - days]
+        return _nrw(sum(h[1] for h in recent), sum(h[2] for h in recent), sum(h[3] for h in recent))
+
+
+class WaterBalance:
+    def __init__(self):
+        self._schemes: Dict[str, _SchemeBalance] = {}
+        self._lock = threading.Lock()
+
+    def update(
+        self,
+        scheme_id: str,
+        node_id: str,
+        node_type: str,
+        ts: datetime,
+        metrics_in: Dict[str, float],
+        pumped_litres: Optional[float] = None,
+    ) -> List[Dict]:
+        """
+        Feed one pump or tank reading. ``pumped_litres`` is the pump's
+        cumulative integrated volume, used when it has no daily counter.
+        Returns alert events for a day this reading closed, if any.
+        """
+        if node_type not in ("pump", "tank"):
+            return []
+        day = int(ts.timestamp() // 86400)
+        events: List[Dict] = []
+        with self._lock:
+            scheme = self._schemes.get(scheme_id)
+            if scheme is None:
+                scheme = self._schemes[scheme_id] = _SchemeBalance(day)
+            if day < scheme.day:
+                return []
+            if day > scheme.day:
+                closed = scheme.day
+                scheme.close_day(day)
+                events = self._check(scheme_id, scheme, closed)
+            flow = scheme.nodes.get(node_id)
+            if flow is None:
+                flow = scheme.nodes[node_id] = _NodeFlow()
+            if node_type == "pump":
+                self._pump(scheme, flow, metrics_in, pumped_litres)
+            else:
+                self._tank(scheme, flow, metrics_in)
+        return events
+
+    def _pump(self, scheme: _SchemeBalance, flow: _NodeFlow, m: Dict[str, float], pumped: Optional[float]):
+        delta = 0.0
+        if pumped is not None:
+            if flow.pumped is None:
+                flow.pumped = pumped
+            else:
+                step, flow.pumped = _advance(flow.pumped, pumped, "pump", "integrated")
+                if not flow.uses_counter:
+                    delta = step
+        if "dailyWaterProduction" in m:
+            value = m["dailyWaterProduction"]
+            if flow.uses_counter:
+                delta, flow.counter = _advance(flow.counter, value, "pump", "dailyWaterProduction")
+            else:
+                # the device's own figure replaces today's integrated estimate
+                flow.uses_counter = True
+                delta, flow.counter = value - flow.day_value, value
+        scheme.produced += delta
+        flow.day_value += delta
+
+    def _tank(self, scheme: _SchemeBalance, flow: _NodeFlow, m: Dict[str, float]):
+        if "dailyWaterDistributed" in m:
+            value = m["dailyWaterDistributed"]
+            delta, flow.counter = _advance(flow.counter, value, "tank", "dailyWaterDistributed")
+            scheme.distributed += delta
+            flow.day_value += delta
+        level = m.get("tankLevel")
+        stored = m.get("tankLevelLiters")
+        if stored is not None and level:
+            flow.capacity = stored / (level / 100.0)
+        elif stored is None and level is not None and flow.capacity:
+            stored = level / 100.0 * flow.capacity
+        if stored is None:
+            return
+        if flow.stored_start is None:
+            flow.stored_start = stored
+        else:
+            scheme.storage += stored - flow.stored
+        flow.stored = stored
+
+    def _check(self, scheme_id: str, scheme: _SchemeBalance, closed_day: int) -> List[Dict]:
+        events = []
+        day = scheme.history[-1]
+        closed = _nrw(day[1], day[2], day[3])
+        on = _day_iso(closed_day)
+        if day[1] >= MIN_PRODUCED_LITRES and closed["nrw_percent"] > NRW_ALERT_PERCENT:
+            events.append({"kind": "nrw_high", "schemeId": scheme_id, "day": on, **closed})
+        recent = [h for h in scheme.history if h[0] > closed_day - 7]
+        earlier = [h for h in scheme.history if h[0] <= closed_day - 7]
+        if len(earlier) >= MIN_BASELINE_DAYS:
+            week = _nrw(*(sum(h[i] for h in recent) for i in (1, 2, 3)))
+            baseline = _nrw(*(sum(h[i] for h in earlier) for i in (1, 2, 3)))
+            if week["nrw_percent"] is not None and baseline["nrw_percent"] is not None \
+                    and week["produced_litres"] >= MIN_PRODUCED_LITRES \
+                    and week["nrw_percent"] - baseline["nrw_percent"] > NRW_TREND_POINTS:
+                events.append({
+                    "kind": "nrw_rising", "schemeId": scheme_id, "day": on,
+                    "nrw_percent_7d": week["nrw_percent"], "nrw_percent_baseline": baseline["nrw_percent"],
+                })
+        return events
+
+    # ---------- reads ----------
+
+    def _report(self, scheme_id: str, scheme: _SchemeBalance) -> Dict:
+        last = scheme.history[-1] if scheme.history and scheme.history[-1][0] == scheme.day - 1 else None
+        week, month = scheme.window(7), scheme.window(HISTORY_DAYS)
+        trend = None
+        if week["nrw_percent"] is not None and month["nrw_percent"] is not None:
+            trend = round(week["nrw_percent"] - month["nrw_percent"], 2)
+        return {
+            "schemeId": scheme_id,
+            "day": _day_iso(scheme.day),
+            "today": _nrw(scheme.produced, scheme.distributed, scheme.storage),
+            "yesterday": _nrw(*last[1:]) if last else None,
+            "7d": week,
+            "30d": month,
+            "trend_points": trend,     # 7d share minus 30d share
+            "days_recorded": len(scheme.history),
+        }
+
+    def report(self, scheme_id: str) -> Optional[Dict]:
+        with self._lock:
+            scheme = self._schemes.get(scheme_id)
+            return self._report(scheme_id, scheme) if scheme is not None else None
+
+    def fleet(self) -> List[Dict]:
+        """Every scheme's balance, worst 7-day NRW share first."""
+        with self._lock:
+            reports = [self._report(sid, s) for sid, s in self._schemes.items()]
+        reports.sort(key=lambda r: -(r["7d"]["nrw_percent"] if r["7d"]["nrw_percent"] is not None else float("-inf")))
+        return reports
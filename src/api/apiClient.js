@@ -141,13 +141,18 @@ class APIClient {
   async request(method, endpoint, body = null, customHeaders = {}) {
     const url = `${this.baseURL}${endpoint}`;
     const headers = this.getHeaders(customHeaders);
+    const isForm = typeof FormData !== 'undefined' && body instanceof FormData;
+    if (isForm) {
+      // let the browser set the multipart boundary
+      delete headers['Content-Type'];
+    }
 
     const makeRequest = async () => {
       try {
         const response = await this.fetchWithTimeout(url, {
           method,
           headers,
-          body: body ? JSON.stringify(body) : null,
+          body: isForm ? body : body ? JSON.stringify(body) : null,
         });
 
         // Handle non-JSON responses
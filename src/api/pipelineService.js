@@ -18,6 +18,34 @@ class PipelineService {
     }
   }
 
+  /**
+   * Get a scheme's pumps, tanks, valves, taps, energy, quality and alarms in one request.
+   * Pass `fields` (e.g. ['pumps', 'alarms']) to fetch only some sections.
+   */
+  static async getSchemeSnapshot(schemeId, fields = null) {
+    try {
+      const query = fields && fields.length ? `?fields=${fields.join(',')}` : '';
+      const response = await apiClient.get(`/schemes/${schemeId}/snapshot${query}`);
+      return response;
+    } catch (error) {
+      throw error;
+    }
+  }
+
+  /**
+   * Get status and KPI rollups for a level of the administrative hierarchy.
+   * `path` is [] for the state, [district], [district, block] or [district, block, village].
+   */
+  static async getHierarchyRollup(path = [], children = true) {
+    try {
+      const segments = path.map(encodeURIComponent).join('/');
+      const response = await apiClient.get(`/hierarchy${segments ? `/${segments}` : ''}?children=${children}`);
+      return response;
+    } catch (error) {
+      throw error;
+    }
+  }
+
   /**
    * Get pipeline details
    */
@@ -161,6 +189,21 @@ class PipelineService {
     }
   }
 
+  /**
+   * Upload a lab results CSV (tapId, sampledAt, one column per parameter).
+   * Resolves to the import report with row-level errors.
+   */
+  static async uploadQualityResults(schemeId, file) {
+    try {
+      const form = new FormData();
+      form.append('file', file);
+      const response = await apiClient.post(`/schemes/${schemeId}/quality/upload`, form);
+      return response;
+    } catch (error) {
+      throw error;
+    }
+  }
+
   /**
    * Get alarms and events
    */